@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'test'))
+sys.path.append(script_dir)
+
+from compare_rotdir import compare_trees, main
+from test_grib2_index import message
+
+
+def write_nc(path, temp):
+    with Dataset(path, 'w') as nc:
+        nc.createDimension('time', None)
+        nc.createDimension('lat', temp.shape[1])
+        nc.createDimension('lon', temp.shape[2])
+        nc.createVariable('time', 'f8', ('time',))[:] = np.arange(temp.shape[0])
+        nc.createVariable('temp', 'f4', ('time', 'lat', 'lon'), fill_value=-999.)[:] = temp
+
+
+@pytest.fixture
+def trees(tmp_path):
+    dirA, dirB = tmp_path / 'a', tmp_path / 'b'
+    for root in dirA, dirB:
+        (root / 'model' / 'atmos' / 'history').mkdir(parents=True)
+        (root / 'products').mkdir()
+        (root / 'same.txt').write_text('identical\n')
+
+    (dirA / 'gfs.t00z.log').write_text('one\ntwo\nthree\n')
+    (dirB / 'gfs.t00z.log').write_text('one\n2\nthree\n')
+    (dirA / 'input.nml').write_text("&fv_core_nml\n  npx = 97\n  k_split = 2\n/\n")
+    (dirB / 'input.nml').write_text("&fv_core_nml\n  npx = 97\n  k_split = 1\n  n_split = 6\n/\n")
+
+    temp = np.random.default_rng(1).random((2, 3, 4)).astype('f4')
+    write_nc(dirA / 'model' / 'atmos' / 'history' / 'atmf000.nc', temp)
+    write_nc(dirB / 'model' / 'atmos' / 'history' / 'atmf000.nc', temp + np.float32(1.e-6))
+    write_nc(dirA / 'model' / 'atmos' / 'history' / 'atmf003.nc', temp)
+    bumped = temp.copy()
+    bumped[1, 2, 3] += 1.
+    write_nc(dirB / 'model' / 'atmos' / 'history' / 'atmf003.nc', bumped)
+
+    (dirA / 'products' / 'gfs.t00z.pgrb2.0p25.f006').write_bytes(message([(0, 0, 6, 103, 2)]) + message([(2, 2, 6, 100, 50000)]))
+    (dirB / 'products' / 'gfs.t00z.pgrb2.0p25.f006').write_bytes(message([(0, 0, 6, 103, 2)]) + message([(2, 2, 6, 100, 85000)]))
+
+    (dirA / 'only_a.txt').write_text('a\n')
+    (dirB / 'only_b.bin').write_bytes(b'\x00\xff')
+    return dirA, dirB
+
+
+def test_compare_trees(trees):
+    dirA, dirB = trees
+    report = compare_trees(str(dirA), str(dirB), jobs=2, options={'netcdf': {'atol': 1.e-5}})
+    files = report['files']
+
+    assert files['same.txt'] == {**files['same.txt'], 'status': 'identical', 'method': 'hash'}
+    assert files['only_a.txt']['status'] == 'only_in_a'
+    assert files['only_b.bin']['status'] == 'only_in_b'
+
+    assert files['gfs.t00z.log']['status'] == 'different'
+    assert files['gfs.t00z.log']['details']['diff'] == ['-two', '+2']
+
+    nml = files['input.nml']
+    assert nml['method'] == 'namelist' and nml['status'] == 'different'
+    assert nml['details']['a_vs_b'] == {'fv_core_nml': {'k_split': [2, 1]}}
+    assert nml['details']['b_vs_a'] == {'fv_core_nml': {'k_split': [1, 2], 'n_split': [6, 'UNDEFINED']}}
+
+    # within the absolute tolerance
+    assert files['model/atmos/history/atmf000.nc']['status'] == 'equivalent'
+    diff = files['model/atmos/history/atmf003.nc']['details']['variables']
+    assert list(diff) == ['temp']
+    assert diff['temp']['ndiff'] == 1 and diff['temp']['max_abs_diff'] == pytest.approx(1., rel=1.e-6)
+
+    grib = files['products/gfs.t00z.pgrb2.0p25.f006']
+    assert grib['method'] == 'grib2' and grib['status'] == 'different'
+    assert grib['details']['records'] == [2, 2]
+    assert [record['record'] for record in grib['details']['different']] == [2]
+
+    assert report['summary'] == {'identical': 1, 'equivalent': 1, 'different': 4, 'only_in_a': 1, 'only_in_b': 1}
+
+
+def test_main_report(trees, tmp_path):
+    dirA, dirB = trees
+    report_file = tmp_path / 'report.json'
+    assert main([str(dirA), str(dirB), '--report', str(report_file), '--jobs', '1', '--include', '*.txt']) == 1
+    report = json.loads(report_file.read_text())
+    assert sorted(report['files']) == ['only_a.txt', 'same.txt']
+    assert main([str(dirA), str(dirA), '--report', str(report_file), '--jobs', '1']) == 0
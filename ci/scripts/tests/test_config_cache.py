@@ -0,0 +1,80 @@
+import os
+import sys
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+from applications.config_cache import ConfigCache
+from wxflow import Configuration
+
+
+@pytest.fixture
+def expdir(tmp_path):
+    configs = {
+        'config.base': 'export EXPDIR="{expdir}"\nexport machine="HERA"\nexport CASE="C96_${{RUN}}"\n'
+                       'export HPSS_PROJECT="${{ACCOUNT:-fv3-cpu}}"\nsource "${{EXPDIR}}/config.com"\n',
+        'config.com': 'export COM_ATMOS="${{RUN}}/atmos"\n',
+        'config.fcst': 'export FHMAX=120\n. $EXPDIR/config.resources fcst\n',
+        'config.resources': 'export walltime="00:30:00"\nsource "${{EXPDIR}}/config.resources.${{machine}}"\n',
+        'config.resources.HERA': 'export walltime="01:00:00"\n',
+        'config.resources.WCOSS2': 'export walltime="02:00:00"\n',
+        'config.prep': 'export DO_MAKEPREPBUFR="YES"\n',
+    }
+    for name, text in configs.items():
+        (tmp_path / name).write_text(text.format(expdir=tmp_path))
+    return tmp_path
+
+
+def test_cache_hits_and_invalidation(expdir):
+    conf = Configuration(str(expdir))
+    cache = ConfigCache(conf)
+    fcst = cache.parse_config(['config.base', 'config.fcst'], RUN='gdas')
+    prep = cache.parse_config(['config.base', 'config.prep'], RUN='gdas')
+    assert fcst == conf.parse_config(['config.base', 'config.fcst'], RUN='gdas')
+    assert fcst['walltime'] == '01:00:00' and fcst['COM_ATMOS'] == 'gdas/atmos'
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # a new instance reads everything back, a different RUN is a different entry
+    cache = ConfigCache(conf)
+    assert cache.parse_config(['config.base', 'config.fcst'], RUN='gdas') == fcst
+    assert cache.parse_config(['config.base', 'config.prep'], RUN='gdas') == prep
+    assert cache.parse_config(['config.base', 'config.prep'], RUN='gfs')['CASE'] == 'C96_gfs'
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # configs sourced indirectly are part of the key, unrelated configs are not affected
+    (expdir / 'config.resources.WCOSS2').write_text('export walltime="03:00:00"\n')
+    cache = ConfigCache(conf)
+    cache.parse_config(['config.base', 'config.fcst'], RUN='gdas')
+    assert cache.parse_config(['config.base', 'config.prep'], RUN='gdas') == prep
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    (expdir / 'config.com').write_text('export COM_ATMOS="${RUN}/model/atmos"\n')
+    cache = ConfigCache(conf)
+    assert cache.parse_config(['config.base', 'config.prep'], RUN='gdas')['COM_ATMOS'] == 'gdas/model/atmos'
+    assert cache.misses == 1
+
+    # only the entries of this instance are kept
+    assert cache.prune() == 4
+    assert len(os.listdir(cache.cache_dir)) == 1
+
+
+def test_environment_and_disabled(expdir, monkeypatch):
+    conf = Configuration(str(expdir))
+    ConfigCache(conf).parse_config('config.base', RUN='gfs')
+
+    # only the environment variables the configs reference are part of the key
+    monkeypatch.setenv('PWD', '/somewhere/else')
+    cache = ConfigCache(conf)
+    cache.parse_config('config.base', RUN='gfs')
+    assert cache.hits == 1
+
+    monkeypatch.setenv('ACCOUNT', 'da-cpu')
+    cache = ConfigCache(conf)
+    assert cache.parse_config('config.base', RUN='gfs')['HPSS_PROJECT'] == 'da-cpu'
+    assert cache.misses == 1
+
+    cache = ConfigCache(conf, enabled=False)
+    cache.parse_config('config.base', RUN='gfs')
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'test'))
+sys.path.append(script_dir)
+
+import diff_grib_files
+from diff_grib_files import compare_files, compare_records, parse_stats, values_differ
+from test_grib2_index import message
+
+
+def test_identical_records_are_skipped(tmp_path, monkeypatch):
+    decoded = []
+    monkeypatch.setattr(diff_grib_files, 'decode_records', lambda a, b: decoded.append((a, b)))
+
+    fileA, fileB = tmp_path / 'a.grib2', tmp_path / 'b.grib2'
+    fileA.write_bytes(message([(0, 0, 6, 103, 2)]) + message([(2, 2, 6, 100, 50000)]) + message([(0, 1, 6, 1, 0)]))
+    fileB.write_bytes(message([(0, 0, 6, 103, 2)]) + message([(2, 2, 6, 100, 85000)]) + message([(0, 1, 6, 1, 0)]))
+
+    result = compare_records(str(fileA), str(fileB))
+    assert result['records'] == [3, 3]
+    assert result['identical'] == 2
+    assert [record['record'] for record in result['different']] == [2]
+    assert result['different'][0]['field'] == 'UGRD:500 mb:6 hour fcst'
+    # only the differing record is decoded, undecoded records count as different
+    assert [len(messages) for messages in decoded[0]] == [1, 1]
+    assert result['nonidentical'] == 1
+
+    assert compare_records(str(fileA), str(fileA))['different'] == []
+    results = compare_files([(str(fileA), str(fileB)), (str(fileA), str(fileA))], max_workers=2)
+    assert [result['identical'] for result in results] == [2, 3]
+
+
+def test_parse_stats():
+    output = ('1:0:TMP:2 m above ground:min=250:max=300:min=250:max=300:rpn_corr=1\n'
+              '2:120:UGRD:500 mb:min=-20:max=40:min=-19:max=41:rpn_corr=1\n'
+              '3:240:VGRD:500 mb:min=-20:max=40:min=-20:max=40:rpn_corr=0.98\n')
+    stats = parse_stats(output)
+    assert [stat['field'] for stat in stats] == ['TMP:2 m above ground', 'UGRD:500 mb', 'VGRD:500 mb']
+    assert stats[1]['min'] == [-20., -19.] and stats[2]['corr'] == 0.98
+    # a constant offset keeps a correlation of 1 but changes the extrema
+    assert [values_differ(stat) for stat in stats] == [False, True, True]
@@ -0,0 +1,143 @@
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'ush', 'python', 'pygfs', 'utils'))
+
+from grib2_index import index_file, index_files, INDEX_HEADER_LENGTH, RECORD_HEADER
+
+grb2index = os.environ.get('GRB2INDEX', shutil.which('grb2index'))
+
+# GRIB2 file (the grbfile fixture) and its version 1 index in the layout of grb2index
+data_dir = os.path.join(script_dir, 'data', 'grib2_index')
+
+
+def section(number, payload):
+    return struct.pack('>IB', 5 + len(payload), number) + payload
+
+
+def ids():
+    # center 7, subcenter 0, master table 2, local table 1, significance 1, 2024-01-01 06:00:00
+    return section(1, struct.pack('>HHBBBHBBBBBBB', 7, 0, 2, 1, 1, 2024, 1, 1, 6, 0, 0, 0, 1))
+
+
+def pds(category, number, ftime, surface, value):
+    return section(4, struct.pack('>HHBBBBBHBBIBbIBbI', 0, 0, category, number, 2, 0, 96, 0, 0, 1, ftime,
+                                  surface, 0, value, 255, 0, 0))
+
+
+def message(fields, discipline=0, local=False):
+    body = ids() + (section(2, b'\x01\x02\x03') if local else b'') + section(3, bytes(67))
+    for ii, (category, number, ftime, surface, value) in enumerate(fields):
+        bitmap = b'\xff' if ii == 0 else b'\xfe'
+        body += pds(category, number, ftime, surface, value) + section(5, bytes(16)) + \
+            section(6, bitmap + b'\x00' * 8) + section(7, bytes(10 + ii))
+    length = 16 + len(body) + 4
+    return b'GRIB' + struct.pack('>HBBQ', 0, discipline, 2, length) + body + b'7777'
+
+
+@pytest.fixture
+def grbfile(tmp_path):
+    path = tmp_path / 'GFSPRS.GrbF06'
+    # the second message holds two fields, the second one reusing the bit-map of the first
+    path.write_bytes(message([(0, 0, 6, 103, 2)]) +
+                     message([(2, 2, 6, 100, 50000), (2, 3, 6, 100, 50000)], local=True) +
+                     message([(0, 0, 0, 1, 0)], discipline=10))
+    return path
+
+
+def read_records(idxfile):
+    data = idxfile.read_bytes()
+    assert data[:7] == b'!GFHDR!'
+    assert data[81:89] == b'IX1FORM:'
+    nskip, nlen, nnum = (int(data[89 + 10 * ii:99 + 10 * ii]) for ii in range(3))
+    assert nskip == INDEX_HEADER_LENGTH
+    assert len(data) == nskip + nlen
+    records, position = [], nskip
+    for _ in range(nnum):
+        length = struct.unpack('>I', data[position:position + 4])[0]
+        records.append(data[position:position + length])
+        position += length
+    assert position == len(data)
+    return records
+
+
+def test_index_file(grbfile, tmp_path):
+    invfile = tmp_path / 'GFSPRS.GrbF06.inv'
+    assert index_file(grbfile, tmp_path / 'GFSPRS.GrbF06.idx', invfile) == 4
+
+    records = read_records(tmp_path / 'GFSPRS.GrbF06.idx')
+    headers = [struct.unpack(RECORD_HEADER, record[:44]) for record in records]
+    grib = grbfile.read_bytes()
+    offsets = [hdr[1] for hdr in headers]
+    assert offsets[0] == 0 and offsets[1] == offsets[2] and grib[offsets[3]:offsets[3] + 4] == b'GRIB'
+    # local use section, field numbers and discipline
+    assert headers[0][2] == 0 and headers[1][2] > 0
+    assert [hdr[11] for hdr in headers] == [1, 1, 2, 1]
+    assert headers[3][10] == 10
+    # the second field of the second message points at the bit-map of the first field
+    assert headers[2][6] == headers[1][6]
+    assert records[2][-6:][5] == 254
+    # sections are found at their offsets in the message
+    for record, hdr in zip(records, headers):
+        assert grib[hdr[1] + hdr[4] + 4] == 4
+        assert grib[hdr[1] + hdr[7] + 4] == 7
+        assert record[44:65] == grib[hdr[1] + 16:hdr[1] + 37]
+
+    assert invfile.read_text().splitlines() == [
+        '1:0:d=2024010106:TMP:2 m above ground:6 hour fcst:',
+        f'2:{offsets[1]}:d=2024010106:UGRD:500 mb:6 hour fcst:',
+        f'2.2:{offsets[1]}:d=2024010106:VGRD:500 mb:6 hour fcst:',
+        f'3:{offsets[3]}:d=2024010106:var discipline=10 center=7 local_table=1 parmcat=0 parm=0:surface:anl:']
+
+
+def test_reference_index(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(data_dir, 'sample.grb2'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    assert index_file('sample.grb2', 'sample.grb2.idx') == 4
+
+    with open(os.path.join(data_dir, 'sample.grb2.idx'), 'rb') as fh:
+        reference = fh.read()
+    result = (tmp_path / 'sample.grb2.idx').read_bytes()
+    # the first header holds the date, time and host name
+    assert result[:7] == reference[:7] and len(result) == len(reference)
+    assert result[81:] == reference[81:]
+
+
+def test_reference_index_path(tmp_path):
+    # UPP indexes the files by their full path, the header only holds the file name
+    grbfile = tmp_path / 'a' / 'long' / 'directory' / 'path' / 'of' / 'the' / 'GRIB2' / 'file' / 'sample.grb2'
+    grbfile.parent.mkdir(parents=True)
+    shutil.copy(os.path.join(data_dir, 'sample.grb2'), grbfile)
+    index_file(str(grbfile), str(tmp_path / 'sample.grb2.idx'))
+
+    with open(os.path.join(data_dir, 'sample.grb2.idx'), 'rb') as fh:
+        reference = fh.read()
+    assert (tmp_path / 'sample.grb2.idx').read_bytes()[81:] == reference[81:]
+
+
+def test_index_files(grbfile, tmp_path):
+    copy = tmp_path / 'GFSFLX.GrbF06'
+    shutil.copy(grbfile, copy)
+    index_files([(str(grbfile), f'{grbfile}.idx'), (str(copy), f'{copy}.idx')], max_workers=2)
+    assert read_records(tmp_path / 'GFSPRS.GrbF06.idx') == read_records(tmp_path / 'GFSFLX.GrbF06.idx')
+
+
+def test_corrupt_message(tmp_path):
+    path = tmp_path / 'bad.grb2'
+    path.write_bytes(message([(0, 0, 6, 103, 2)])[:-4] + b'0000')
+    with pytest.raises(ValueError):
+        index_file(path, tmp_path / 'bad.grb2.idx')
+
+
+@pytest.mark.skipif(grb2index is None, reason="grb2index is not available")
+def test_against_grb2index(grbfile, tmp_path):
+    subprocess.run([grb2index, str(grbfile), str(tmp_path / 'ref.idx')], check=True)
+    index_file(grbfile, tmp_path / 'py.idx')
+    # the first header holds the date, time and host name
+    assert (tmp_path / 'py.idx').read_bytes()[81:] == (tmp_path / 'ref.idx').read_bytes()[81:]
@@ -0,0 +1,83 @@
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'ush'))
+
+from job_orchestrator import Step, run_steps
+from launcher import Launcher, FAKE_ALLOCATION
+
+
+def fake_launcher():
+    return Launcher('fake', {FAKE_ALLOCATION: 'n1:2,n2:2,n3:2'})
+
+
+def launch(launched, mpi, executable):
+    # setup hook: build the command once the hosts are assigned, as calcanl_gfs does
+    def setup(step):
+        launched.append((step.name, list(step.hosts)))
+        placement = mpi.place(step.name, 2 * len(step.hosts), step.hosts)
+        cmd, env = mpi.command(placement.ntasks, 1, placement, os.path.join(step.cwd, f'{step.name}.hosts'))
+        step.cmd = f'{cmd} {executable}'.strip()
+        step.env = dict(os.environ, **env)
+    return setup
+
+
+def overlapping(steps):
+    # largest number of hosts used at once by the steps, from their start and end times
+    events = sorted([(step.start, len(step.hosts)) for step in steps if step.start is not None] +
+                    [(step.end, -len(step.hosts)) for step in steps if step.start is not None],
+                    key=lambda event: (event[0], event[1]))
+    in_use, peak = 0, 0
+    for _, nhosts in events:
+        in_use += nhosts
+        peak = max(peak, in_use)
+    return peak
+
+
+def test_run_steps(tmp_path):
+    mpi = fake_launcher()
+    launched = []
+    cwd = str(tmp_path)
+    sleep = 'sh -c "sleep 0.2; true"'
+    steps = [Step('a', '', cwd, setup=launch(launched, mpi, sleep)),
+             Step('b', '', cwd, setup=launch(launched, mpi, sleep)),
+             Step('c', '', cwd, setup=launch(launched, mpi, 'true')),
+             Step('d', '', cwd, nhosts=2, deps=['a'], setup=launch(launched, mpi, sleep)),
+             Step('e', '', cwd, nhosts=0, deps=['b', 'c', 'd'], setup=launch(launched, mpi, 'true'))]
+
+    assert run_steps(steps, mpi.allocation.hosts) == 0
+    assert [name for name, _ in launched] == ['a', 'b', 'c', 'd', 'e']
+    assert all(step.returncode == 0 for step in steps)
+
+    # the first steps share the allocation, the last one uses all of it
+    assert sorted(host for _, hosts in launched[:3] for host in hosts) == ['n1', 'n2', 'n3']
+    assert len(launched[3][1]) == 2 and sorted(launched[4][1]) == ['n1', 'n2', 'n3']
+    assert overlapping(steps) <= 3
+
+    # dependencies start after the steps they depend on
+    by_name = {step.name: step for step in steps}
+    assert by_name['d'].start >= by_name['a'].end
+    assert by_name['e'].start >= max(by_name[name].end for name in 'bcd')
+
+
+def test_run_steps_failure(tmp_path):
+    mpi = fake_launcher()
+    launched = []
+    cwd = str(tmp_path)
+    steps = [Step('fails', '', cwd, setup=launch(launched, mpi, 'sh -c "exit 3"')),
+             Step('independent', '', cwd, setup=launch(launched, mpi, 'sh -c "sleep 0.2; true"')),
+             Step('dependent', '', cwd, deps=['fails'], setup=launch(launched, mpi, 'true')),
+             Step('later', '', cwd, deps=['independent'], setup=launch(launched, mpi, 'true'))]
+
+    # the exit code of the failed step is returned, the running steps finish, no step starts after the failure
+    assert run_steps(steps, mpi.allocation.hosts) == 3
+    assert [name for name, _ in launched] == ['fails', 'independent']
+    assert steps[1].returncode == 0
+    assert steps[2].start is None and steps[3].start is None
+
+
+def test_run_steps_false(tmp_path):
+    steps = [Step('false', 'false', str(tmp_path)), Step('true', 'true', str(tmp_path), deps=['false'])]
+    assert run_steps(steps, ['localhost']) != 0
+    assert steps[1].returncode is None
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'ush'))
+
+from launcher import Allocation, Launcher, discover_allocation, pack, slurm_tasks_per_node, FAKE_ALLOCATION
+
+
+def test_lsf_pbs_hostfiles(tmp_path):
+    hostfile = tmp_path / 'hostfile'
+    hostfile.write_text(''.join(f'{host}\n' for host in ['n2'] * 3 + ['n1'] * 2 + ['n2', '']))
+    for launcher, var in [('mpirun', 'LSB_DJOB_HOSTFILE'), ('mpiexec', 'PBS_NODEFILE'), ('aprun', 'LSB_DJOB_HOSTFILE')]:
+        allocation = discover_allocation(launcher, {var: str(hostfile)})
+        assert allocation.hosts == ['n2', 'n1']
+        assert allocation.slots == {'n2': 4, 'n1': 2}
+        assert allocation.nslots == 6
+
+
+def test_slurm_tasks_per_node():
+    assert slurm_tasks_per_node('40(x2),20', 3) == [40, 40, 20]
+    assert slurm_tasks_per_node('40', 2) == []
+
+
+def test_fake_allocation():
+    allocation = discover_allocation('fake', {FAKE_ALLOCATION: 'a:4,b:4,c:2'})
+    assert allocation.slots == {'a': 4, 'b': 4, 'c': 2}
+    with pytest.raises(KeyError):
+        discover_allocation('qsub', {})
+
+
+def test_pack_best_fit():
+    allocation = Allocation({'a': 4, 'b': 4, 'c': 2})
+    placements = pack(allocation, [('small', 2), ('medium', 3), ('tiny', 1), ('pair', 2)])
+    # placements are returned in the order of the jobs, on disjoint slots
+    assert list(placements) == ['small', 'medium', 'tiny', 'pair']
+    used = {}
+    for placement in placements.values():
+        for host in placement.task_hosts:
+            used[host] = used.get(host, 0) + 1
+    assert all(used[host] <= allocation.slots[host] for host in used)
+    assert sum(used.values()) == 8
+    assert len(placements['medium'].hosts) == 1
+
+
+def test_pack_spanning_and_exclusive():
+    allocation = Allocation({'a': 4, 'b': 4, 'c': 4})
+    placements = pack(allocation, [('big', 6), ('one', 1)])
+    assert placements['big'].hosts == ['a', 'b']
+    assert placements['one'].hosts == ['b']
+
+    placements = pack(allocation, [('x', 1), ('y', 1), ('z', 1)], exclusive=True)
+    assert sorted(host for placement in placements.values() for host in placement.hosts) == ['a', 'b', 'c']
+
+    with pytest.raises(ValueError):
+        pack(allocation, [('x', 1), ('y', 1), ('z', 1), ('w', 1)], exclusive=True)
+    with pytest.raises(ValueError):
+        pack(allocation, [('huge', 13)])
+
+
+def test_commands(tmp_path):
+    hostfile = tmp_path / 'nodes'
+    hostfile.write_text('n1\n' * 4 + 'n2\n' * 4)
+    env = {'LSB_DJOB_HOSTFILE': str(hostfile), 'PBS_NODEFILE': str(hostfile)}
+
+    mpirun = Launcher('mpirun', env)
+    placement = mpirun.place('job', 6, ['n1', 'n2'])
+    cmd, extra = mpirun.command(6, 2, placement, str(tmp_path / 'hosts'))
+    assert cmd == f'mpirun -np 6 --hostfile {tmp_path / "hosts"}' and extra == {}
+    assert (tmp_path / 'hosts').read_text() == 'n1\n' * 4 + 'n2\n' * 2
+    assert mpirun.command(64)[0] == 'mpirun -np 64'
+
+    # PBS sub-jobs are bound to the hosts of their placement
+    mpiexec = Launcher('mpiexec', env)
+    cmd, _ = mpiexec.command(6, 2, placement, str(tmp_path / 'hosts'))
+    assert cmd == 'mpiexec -l -n 6 --hosts n1,n2 -ppn 4 --cpu-bind depth --depth 2'
+    cmd, _ = mpiexec.command(4, 2, mpiexec.place('other', 4, ['n2']), str(tmp_path / 'other.hosts'))
+    assert '--hosts n2 -ppn 4 ' in cmd
+    assert mpiexec.command(64)[0] == 'mpiexec -l -n 64'
+
+    aprun = Launcher('aprun', env)
+    assert aprun.command(6, 2, placement, str(tmp_path / 'hosts'))[0] == f'aprun -l {tmp_path / "hosts"} -d 2 -n 6'
+    assert aprun.command(64, 2)[0] == 'aprun -d 2 -n 64'
+
+    # oversubscription of too few slots
+    assert mpirun.place('job', 10, ['n1']).task_hosts == ['n1'] * 10
+    assert mpirun.nhosts_for(6) == 2
+
+
+def test_fake_scheduler_runs_locally(tmp_path):
+    fake = Launcher('fake', {FAKE_ALLOCATION: 'localhost:2,remote:2'})
+    placements = fake.pack([('first', 2), ('second', 2)])
+    procs = []
+    for name, placement in placements.items():
+        cmd, extra = fake.command(placement.ntasks, 1, placement, str(tmp_path / f'{name}.hosts'))
+        script = f'{cmd} sh -c "cat $PYGFS_FAKE_HOSTFILE > {tmp_path / name}.out; echo $PYGFS_FAKE_NTASKS >> {tmp_path / name}.out"'
+        procs.append(subprocess.Popen(script, shell=True, env=dict(os.environ, **extra)))
+    assert [proc.wait() for proc in procs] == [0, 0]
+    outputs = sorted((tmp_path / f'{name}.out').read_text() for name in placements)
+    assert outputs == ['localhost\nlocalhost\n2\n', 'remote\nremote\n2\n']
@@ -0,0 +1,70 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from netCDF4 import Dataset
+from wxflow import parse_yaml
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'ush', 'python', 'pygfs', 'utils'))
+
+from marine_bkg_catalog import MarineBkgCatalog, hist_date
+
+WINDOW_BEGIN = datetime(2021, 3, 22, 3)
+
+
+def write_hist(path, units, value):
+    with Dataset(path, 'w') as ncf:
+        ncf.createDimension('time', None)
+        time = ncf.createVariable('time', 'f8', ('time',))
+        time.units = units
+        time[0] = value
+
+
+@pytest.fixture
+def bkg_dir(tmp_path):
+    (tmp_path / 'INPUT').mkdir()
+    (tmp_path / 'bkg').mkdir()
+    write_hist(tmp_path / 'INPUT' / 'MOM.res.nc', 'days since 2021-03-22 00:00:00', 0.125)
+    for fcst_hr, hours in [(6, 6), (9, 9)]:
+        write_hist(tmp_path / 'bkg' / f'ocean.bkg.f{fcst_hr:03d}.nc', 'hours since 2021-03-22 00:00:00', hours)
+        write_hist(tmp_path / 'bkg' / f'ice.bkg.f{fcst_hr:03d}.nc', 'seconds since 2021-03-22 00:00:00', hours * 3600)
+    return tmp_path
+
+
+def catalog(bkg_dir):
+    return MarineBkgCatalog(str(bkg_dir / 'bkg'), WINDOW_BEGIN, [6, 9], ocn_filename_ic=str(bkg_dir / 'INPUT' / 'MOM.res.nc'))
+
+
+def test_hist_date():
+    assert hist_date('hours since 2021-03-22 00:00:00', 6.) == datetime(2021, 3, 22, 6)
+    assert hist_date('days since 2021-03-22', 0.5) == datetime(2021, 3, 22, 12)
+    with pytest.raises(ValueError):
+        hist_date('months since 2021-03-22', 1.)
+
+
+def test_validate(bkg_dir, tmp_path):
+    bkg_catalog = catalog(bkg_dir)
+    bkg_catalog.validate()
+    assert bkg_catalog.dates[str(bkg_dir / 'bkg' / 'ice.bkg.f009.nc')] == datetime(2021, 3, 22, 9)
+    assert [bkg['date'] for bkg in bkg_catalog.bkg_list()] == ['2021-03-22T06:00:00Z', '2021-03-22T09:00:00Z']
+    assert bkg_catalog.bkg_list()[1]['ice_filename'] == 'ice.bkg.f009.nc'
+
+    # the catalog is saved with the dates read from the files
+    bkg_catalog.save(str(tmp_path / 'bkg_catalog.yaml'))
+    saved = parse_yaml(str(tmp_path / 'bkg_catalog.yaml'))
+    assert saved['dates'][str(bkg_dir / 'bkg' / 'ice.bkg.f009.nc')] == '2021-03-22T09:00:00'
+    assert saved['errors'] == []
+
+
+def test_validate_reports_every_error(bkg_dir):
+    write_hist(bkg_dir / 'bkg' / 'ocean.bkg.f009.nc', 'hours since 2021-03-22 00:00:00', 12)
+    os.remove(bkg_dir / 'bkg' / 'ice.bkg.f006.nc')
+    bkg_catalog = catalog(bkg_dir)
+    with pytest.raises(ValueError) as error:
+        bkg_catalog.validate()
+    message = str(error.value)
+    assert 'in 2 file(s)' in message
+    assert 'ocean.bkg.f009.nc: date 2021-03-22 12:00:00 does not match the expected date 2021-03-22 09:00:00' in message
+    assert 'ice.bkg.f006.nc: unable to read time' in message
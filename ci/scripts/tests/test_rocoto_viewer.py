@@ -0,0 +1,199 @@
+import collections
+import os
+import sqlite3
+import sys
+from multiprocessing import Process, Queue
+from datetime import datetime, timedelta
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+import rocoto_viewer
+from rocoto_viewer import CycleDefGroup, RocotoStatus
+
+CYCLES = [datetime(2024, 1, 1) + ii * timedelta(hours=6) for ii in range(12)]
+
+
+def timestamp(cycle):
+    return int(cycle.timestamp())
+
+
+@pytest.fixture
+def workflow():
+    tasks_ordered = [(f'task{ii:02d}', ['gdas', 'gfs', 'gdas,gfs'][ii % 3], f'/logs/CYCLE/task{ii:02d}.log')
+                     for ii in range(30)]
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
+    cycledef_group_cycles['gdas'].add(CYCLES[0], CYCLES[-1], timedelta(hours=6))
+    cycledef_group_cycles['gfs'].add(CYCLES[0], CYCLES[-1], timedelta(hours=24))
+    return tasks_ordered, cycledef_group_cycles
+
+
+@pytest.fixture
+def db_file(tmp_path, workflow):
+    tasks_ordered, _ = workflow
+    db_file = str(tmp_path / 'test.db')
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE cycles (id INTEGER PRIMARY KEY, cycle DATETIME, activated DATETIME, '
+                    'expired DATETIME, done DATETIME)')
+        con.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR, taskname VARCHAR, cycle DATETIME, '
+                    'cores INTEGER, state VARCHAR, exit_status INTEGER, tries INTEGER, nunknowns INTEGER, '
+                    'duration REAL)')
+        con.executemany('INSERT INTO cycles (cycle, activated, expired, done) VALUES (?, ?, 0, 0)',
+                        [(timestamp(cycle), timestamp(cycle)) for cycle in CYCLES[:6]])
+        jobs = []
+        for icycle, cycle in enumerate(CYCLES[:6]):
+            for name, _, _ in tasks_ordered[:25]:
+                state = 'RUNNING' if icycle == 5 else 'SUCCEEDED'
+                jobs.append((str(1000 + len(jobs)), name, timestamp(cycle), state, 0, 1, 60.))
+        # a job id the scheduler used twice is only shown once
+        jobs.append(('1003', 'task29', timestamp(CYCLES[0]), 'SUCCEEDED', 0, 1, 60.))
+        con.executemany('INSERT INTO jobs (jobid, taskname, cycle, state, exit_status, tries, duration) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', jobs)
+    return db_file
+
+
+def test_cycledef_group():
+    group = CycleDefGroup()
+    group.add(datetime(2024, 1, 1), datetime(2024, 1, 2, 18), timedelta(hours=6))
+    group.add(datetime(2024, 1, 1, 3), datetime(2024, 1, 2), timedelta(hours=12))
+    assert list(group) == ['202401010000', '202401010600', '202401011200', '202401011800', '202401020000',
+                           '202401020600', '202401021200', '202401021800', '202401010300', '202401011500']
+    assert len(group) == 10 and all(cycle in group for cycle in group)
+    assert '202401010100' not in group and '202401030000' not in group and '' not in group
+
+    # months are added one at a time: from the 31st, the day is cut at the end of February and stays there
+    group = CycleDefGroup()
+    group.add(datetime(2024, 1, 31), datetime(2024, 12, 31), months=2)
+    assert list(group) == ['202401310000', '202403310000', '202405310000', '202407310000', '202409300000',
+                           '202411300000']
+    assert len(group) == 6 and all(cycle in group for cycle in group)
+    assert '202402290000' not in group and '202411310000' not in group and '202409310000' not in group
+
+    # a decade of hourly cycles is neither listed nor scanned
+    group = CycleDefGroup()
+    group.add(datetime(2020, 1, 1), datetime(2030, 1, 1), timedelta(hours=1))
+    assert len(group) == 87673 and '202912312300' in group and '202912312330' not in group
+
+
+def full_read(db_file, workflow):
+    return RocotoStatus(db_file).update(*workflow)
+
+
+def test_incremental_updates(db_file, workflow):
+    status = RocotoStatus(db_file)
+    stat = status.update(*workflow)
+    assert len(stat) == 6 and stat == full_read(db_file, workflow)
+    assert stat[0][0].split()[1:4] == ['task00', '1000', 'SUCCEEDED']
+    assert not any(line.split()[1] == 'task29' and line.split()[2] == '1003' for line in stat[0])
+    assert status.incremental()
+
+    # nothing changed: nothing is read nor assembled
+    lines = dict(status.cycle_lines)
+    assert status.update(*workflow) == stat
+    assert all(status.cycle_lines[cycle] is lines[cycle] for cycle in lines)
+
+    # jobs finish, new jobs and cycles start: only their cycles are assembled again
+    with sqlite3.connect(db_file) as con:
+        con.execute("UPDATE jobs SET state = 'SUCCEEDED', duration = 120. WHERE cycle = ? AND taskname = 'task03'",
+                    (timestamp(CYCLES[5]),))
+        con.execute('INSERT INTO cycles (cycle, activated, expired, done) VALUES (?, ?, 0, 0)',
+                    (timestamp(CYCLES[6]), timestamp(CYCLES[6])))
+        con.execute("INSERT INTO jobs (jobid, taskname, cycle, state, exit_status, tries, duration) "
+                    "VALUES ('2000', 'task00', ?, 'QUEUED', '-', 1, 0.)", (timestamp(CYCLES[6]),))
+    stat = status.update(*workflow)
+    assert stat == full_read(db_file, workflow) and len(stat) == 7
+    assert status.cycle_lines[timestamp(CYCLES[0])] is lines[timestamp(CYCLES[0])]
+    assert status.cycle_lines[timestamp(CYCLES[5])] is not lines[timestamp(CYCLES[5])]
+    assert 'task03 1128 SUCCEEDED 0 1 120' in ' '.join(stat[5])
+
+    # a rewind removes jobs: everything is read again
+    with sqlite3.connect(db_file) as con:
+        con.execute("DELETE FROM jobs WHERE jobid = '1001'")
+    stat = status.update(*workflow)
+    assert stat == full_read(db_file, workflow)
+    assert stat[0][1].split()[1:] == ['task01', '-', '-', '-', '-', '-']
+
+
+def test_get_rocoto_stat(db_file, workflow):
+    tasks_ordered, cycledef_group_cycles = workflow
+    metatask_list = collections.defaultdict(list)
+    metatask_list['task00'] = ['task00']
+    rocoto_viewer.use_multiprocessing = False
+    rocoto_viewer.rocoto_status = None
+
+    params = (None, db_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+    rocoto_stat = rocoto_viewer.get_rocoto_stat(params, None)[0]
+    assert rocoto_stat == full_read(db_file, workflow)
+    assert rocoto_viewer.rocoto_status.polls == 1
+    # the viewer reads the whole database again after a rewind or a boot
+    rocoto_viewer.rocoto_status.reload()
+    assert not rocoto_viewer.rocoto_status.incremental()
+
+
+def test_get_rocoto_stat_multiprocessing(db_file, workflow, monkeypatch):
+    tasks_ordered, cycledef_group_cycles = workflow
+    metatask_list = collections.defaultdict(list)
+    metatask_list['task00'] = ['task00']
+    monkeypatch.setattr(rocoto_viewer, 'use_multiprocessing', True)
+    monkeypatch.setattr(rocoto_viewer, 'rocoto_status', None)
+
+    # the first read runs in a child process, which sends the status back through the queue
+    queue_stat = Queue()
+    params = (None, db_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+    process = Process(target=rocoto_viewer.get_rocoto_stat, args=[params, queue_stat])
+    process.start()
+    rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, status = queue_stat.get(timeout=60)
+    process.join()
+    assert process.exitcode == 0
+    assert rocoto_stat == full_read(db_file, (tasks_ordered, cycledef_group_cycles))
+    assert rocoto_viewer.rocoto_status is None and status.incremental()
+
+    # the next polls run in the viewer: nothing changed, nothing is read again
+    monkeypatch.setattr(rocoto_viewer, 'rocoto_status', status)
+    lines = dict(status.cycle_lines)
+    params = (None, db_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+    assert rocoto_viewer.get_rocoto_stat(params, None)[0] == rocoto_stat
+    assert all(status.cycle_lines[cycle] is lines[cycle] for cycle in lines)
+
+    # a change is read incrementally with the indexes rebuilt from the rows
+    with sqlite3.connect(db_file) as con:
+        con.execute("UPDATE jobs SET state = 'SUCCEEDED' WHERE cycle = ? AND taskname = 'task03'",
+                    (timestamp(CYCLES[5]),))
+    rocoto_stat = rocoto_viewer.get_rocoto_stat(params, None)[0]
+    assert rocoto_stat == full_read(db_file, (tasks_ordered, cycledef_group_cycles))
+    assert status.cycle_lines[timestamp(CYCLES[0])] is lines[timestamp(CYCLES[0])]
+    assert 'task03 1128 SUCCEEDED' in ' '.join(rocoto_stat[5])
+
+
+def xml_task(name):
+    return f'<task name="{name}" cycledefs="gefs"><join><cyclestr>/logs/@Y@m@d@H/{name}.log</cyclestr></join></task>'
+
+
+def test_get_tasklist(tmp_path, monkeypatch):
+    monkeypatch.setattr(rocoto_viewer, 'PACKAGE', 'gefs', raising=False)
+    members = [f'{member:03d}' for member in range(31)]
+    fhrs = [f'{fhr:03d}' for fhr in range(0, 385, 3)]
+    workflow_file = tmp_path / 'gefs.xml'
+    workflow_file.write_text(
+        '<workflow>\n<cycledef group="gefs">202401010000 202401020000 06:00:00</cycledef>\n'
+        f"{xml_task('stage_ic')}\n"
+        f'<metatask name="atmos_prod"><var name="member">{" ".join(members)}</var>\n'
+        f'<metatask name="atmos_prod_mem#member#"><var name="fhr">{" ".join(fhrs)}</var>\n'
+        f"{xml_task('atmos_prod_mem#member#_f#fhr#')}\n</metatask></metatask>\n"
+        f'<metatask name="atmos_ensstat"><var name="fhr">{" ".join(fhrs)}</var>\n'
+        f"{xml_task('atmos_ensstat_f#fhr#')}{xml_task('stage_ic')}\n</metatask>\n</workflow>\n")
+
+    tasks_ordered, metatask_list, cycledef_group_cycles = rocoto_viewer.get_tasklist(str(workflow_file))
+
+    # the members of the outer metatask vary slowest, the tasks already listed are not repeated
+    prod_tasks = [f'atmos_prod_mem{member}_f{fhr}' for member in members for fhr in fhrs]
+    ensstat_tasks = [f'atmos_ensstat_f{fhr}' for fhr in fhrs]
+    assert [task[0] for task in tasks_ordered] == ['stage_ic'] + prod_tasks + ensstat_tasks
+    assert tasks_ordered[1] == ('atmos_prod_mem000_f000', 'gefs', '/logs/CYCLE/atmos_prod_mem000_f000.log')
+    assert tasks_ordered[-1] == ('atmos_ensstat_f384', 'gefs', '/logs/CYCLE/atmos_ensstat_f384.log')
+    # a metatask is listed under its first task
+    assert dict(metatask_list) == {'atmos_prod_mem000_f000': ['atmos_prod_mem#member#'] + prod_tasks,
+                                   'atmos_ensstat_f000': ['atmos_ensstat'] + ensstat_tasks}
+    assert len(cycledef_group_cycles['gefs']) == 5
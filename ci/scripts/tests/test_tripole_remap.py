@@ -0,0 +1,177 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'ush', 'python', 'pygfs', 'utils'))
+
+from tripole_remap import TripoleRemapper, FILL_VALUE, read_var_list
+
+# Directory with the inputs and the ocnicepost.x output of a forecast hour for the regression test:
+#   ocean.nc, tripole.<model_grid>.*.nc weight files and ocean.<product_grid>.nc from ocnicepost.x
+regression_path = os.environ.get('OCNICEPOST_TESTDATA')
+regression_grids = ('mx100', '1p00')
+
+
+def write_weights(path, n_a, dst_nlat, dst_nlon, row, col, S):
+    with Dataset(path, 'w') as ncf:
+        ncf.createDimension('n_a', n_a)
+        ncf.createDimension('n_b', dst_nlat * dst_nlon)
+        ncf.createDimension('n_s', len(S))
+        ncf.createDimension('dst_grid_rank', 2)
+        ncf.createVariable('row', 'i4', ('n_s',))[:] = row
+        ncf.createVariable('col', 'i4', ('n_s',))[:] = col
+        ncf.createVariable('S', 'f8', ('n_s',))[:] = S
+        ncf.createVariable('dst_grid_dims', 'i4', ('dst_grid_rank',))[:] = [dst_nlon, dst_nlat]
+        lat, lon = np.meshgrid(np.linspace(-45., 45., dst_nlat), np.linspace(0., 270., dst_nlon), indexing='ij')
+        ncf.createVariable('yc_b', 'f8', ('n_b',))[:] = lat.ravel()
+        ncf.createVariable('xc_b', 'f8', ('n_b',))[:] = lon.ravel()
+
+
+@pytest.fixture
+def synthetic(tmp_path):
+    # 4x4 tripole grid averaged in 2x2 blocks onto a 2x2 lat/lon grid
+    ny, nx = 4, 4
+    row, col, S = [], [], []
+    for jj in range(ny):
+        for ii in range(nx):
+            row.append((jj // 2) * 2 + ii // 2 + 1)
+            col.append(jj * nx + ii + 1)
+            S.append(0.25)
+    write_weights(tmp_path / 'tripole.mx999.Ct.to.rect.9p99.bilinear.nc', ny * nx, 2, 2, row, col, S)
+
+    temp = np.arange(2 * ny * nx, dtype=np.float64).reshape(1, 2, ny, nx)
+    temp[0, :, 0, 0] = np.nan  # land point
+    temp[0, 1, :2, :2] = np.nan  # deeper land covering a whole destination cell
+    with Dataset(tmp_path / 'ocean.nc', 'w') as ncf:
+        for dim, size in [('time', None), ('z_l', 2), ('yh', ny), ('xh', nx)]:
+            ncf.createDimension(dim, size)
+        ncf.createVariable('time', 'f8', ('time',))[:] = [6.0]
+        var = ncf.createVariable('temp', 'f4', ('time', 'z_l', 'yh', 'xh'), fill_value=1.0e20)
+        var.units = 'degC'
+        var[:] = np.ma.masked_invalid(temp)
+        ncf.createVariable('SST', 'f4', ('time', 'yh', 'xh'), fill_value=1.0e20)[:] = np.ma.masked_invalid(temp[:, 0])
+
+    return tmp_path, temp
+
+
+@pytest.mark.filterwarnings("ignore:Mean of empty slice")
+def test_remap_synthetic(synthetic):
+    tmp_path, temp = synthetic
+    remapper = TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(tmp_path / 'cache'), chunk_size=1)
+    remapper.remap_file(str(tmp_path / 'ocean.nc'), str(tmp_path / 'ocean.9p99.nc'), 'ocean', 'temp')
+
+    with Dataset(tmp_path / 'ocean.9p99.nc', 'r') as ncf:
+        out = np.ma.filled(ncf.variables['temp'][:], np.nan)
+        sst = np.ma.filled(ncf.variables['SST'][:], np.nan)
+        assert ncf.variables['temp'].units == 'degC'
+        assert ncf.variables['temp']._FillValue == np.float32(FILL_VALUE)
+
+    # block means over the valid points only
+    expected = np.nanmean(temp.reshape(1, 2, 2, 2, 2, 2), axis=(3, 5))
+    np.testing.assert_allclose(out[0, 0], expected[0, 0], rtol=1e-6)
+    np.testing.assert_allclose(out[0, 1, 1], expected[0, 1, 1], rtol=1e-6)
+    assert np.isnan(out[0, 1, 0, 0])
+    np.testing.assert_allclose(sst[0], expected[0, 0], rtol=1e-6)
+
+
+def test_remap_weights_cache(synthetic):
+    tmp_path, _ = synthetic
+    cache_dir = tmp_path / 'cache'
+    TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(cache_dir)).remap_file(
+        str(tmp_path / 'ocean.nc'), str(tmp_path / 'first.nc'), 'ocean', 'temp')
+    assert len(list(cache_dir.glob('mx999.Ct.to.9p99.bilinear.*.npz'))) == 1
+
+    # the cached weights are used without the ESMF weight file
+    os.remove(tmp_path / 'tripole.mx999.Ct.to.rect.9p99.bilinear.nc')
+    TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(cache_dir)).remap_file(
+        str(tmp_path / 'ocean.nc'), str(tmp_path / 'second.nc'), 'ocean', 'temp')
+
+    with Dataset(tmp_path / 'first.nc', 'r') as first, Dataset(tmp_path / 'second.nc', 'r') as second:
+        np.testing.assert_array_equal(first.variables['temp'][:], second.variables['temp'][:])
+
+
+def test_remap_varlist(synthetic):
+    tmp_path, temp = synthetic
+    (tmp_path / 'ocean.csv').write_text("variable,dims,method,vector,stagger\nSST,2,bilinear,,\n")
+    varlist = read_var_list(str(tmp_path / 'ocean.csv'))
+    assert varlist == {'SST': 'bilinear'}
+
+    remapper = TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(tmp_path / 'cache'))
+    remapper.remap_file(str(tmp_path / 'ocean.nc'), str(tmp_path / 'ocean.9p99.nc'), 'ocean', 'temp',
+                        varlist=list(varlist), methods=varlist)
+
+    with Dataset(tmp_path / 'ocean.9p99.nc', 'r') as ncf:
+        assert 'temp' not in ncf.variables
+        sst = np.ma.filled(ncf.variables['SST'][:], np.nan)
+    # the land points of the mask variable are excluded although it is not remapped
+    np.testing.assert_allclose(sst[0], np.nanmean(temp[:, 0].reshape(1, 2, 2, 2, 2), axis=(2, 4))[0], rtol=1e-6)
+
+
+def test_remap_methods(synthetic):
+    tmp_path, temp = synthetic
+    # the conservative weights take the last point of each 2x2 block
+    row = [1, 2, 3, 4]
+    col = [6, 8, 14, 16]
+    write_weights(tmp_path / 'tripole.mx999.Ct.to.rect.9p99.conserve.nc', 16, 2, 2, row, col, [1.0] * 4)
+    (tmp_path / 'ocean.csv').write_text("variable,dims,method,vector,stagger\nSST,2,conserve,,\ntemp,3,bilinear,,\n")
+    methods = read_var_list(str(tmp_path / 'ocean.csv'))
+    assert methods == {'SST': 'conserve', 'temp': 'bilinear'}
+
+    cache_dir = tmp_path / 'cache'
+    remapper = TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(cache_dir))
+    remapper.remap_file(str(tmp_path / 'ocean.nc'), str(tmp_path / 'ocean.9p99.nc'), 'ocean', 'temp',
+                        varlist=list(methods), methods=methods)
+    assert len(list(cache_dir.glob('mx999.Ct.to.9p99.conserve.*.npz'))) == 1
+    assert len(list(cache_dir.glob('mx999.Ct.to.9p99.bilinear.*.npz'))) == 1
+
+    with Dataset(tmp_path / 'ocean.9p99.nc', 'r') as ncf:
+        sst = np.ma.filled(ncf.variables['SST'][:], np.nan)
+        out = np.ma.filled(ncf.variables['temp'][:], np.nan)
+    np.testing.assert_allclose(sst[0], temp[0, 0, 1::2, 1::2], rtol=1e-6)
+    np.testing.assert_allclose(out[0, 0], np.nanmean(temp[:, 0].reshape(1, 2, 2, 2, 2), axis=(2, 4))[0], rtol=1e-6)
+
+
+def test_remap_ice_mask(synthetic):
+    tmp_path, _ = synthetic
+    ny, nx = 4, 4
+    tmask = np.ones((ny, nx))
+    tmask[:2, :2] = 0.0  # land covering a whole destination cell
+    aice = np.full((1, ny, nx), 0.5)
+    aice[0][tmask == 0.0] = 0.0  # CICE writes zeros, not missing values, over land
+    with Dataset(tmp_path / 'ice.nc', 'w') as ncf:
+        for dim, size in [('time', None), ('nj', ny), ('ni', nx)]:
+            ncf.createDimension(dim, size)
+        ncf.createVariable('time', 'f8', ('time',))[:] = [6.0]
+        ncf.createVariable('tmask', 'f4', ('nj', 'ni'))[:] = tmask
+        ncf.createVariable('aice_h', 'f4', ('time', 'nj', 'ni'))[:] = aice
+
+    remapper = TripoleRemapper(str(tmp_path), 'mx999', '9p99', cache_dir=str(tmp_path / 'cache'))
+    remapper.remap_file(str(tmp_path / 'ice.nc'), str(tmp_path / 'ice.9p99.nc'), 'ice', 'tmask', varlist=['aice_h'])
+
+    with Dataset(tmp_path / 'ice.9p99.nc', 'r') as ncf:
+        out = np.ma.filled(ncf.variables['aice_h'][:], np.nan)
+    assert np.isnan(out[0, 0, 0])
+    np.testing.assert_allclose(out[0][~np.isnan(out[0])], 0.5, rtol=1e-6)
+
+
+@pytest.mark.skipif(regression_path is None, reason="OCNICEPOST_TESTDATA is not set")
+def test_remap_against_ocnicepost(tmp_path):
+    model_grid, product_grid = regression_grids
+    output_file = str(tmp_path / f'ocean.{product_grid}.nc')
+    remapper = TripoleRemapper(regression_path, model_grid, product_grid, cache_dir=str(tmp_path / 'cache'))
+    remapper.remap_file(os.path.join(regression_path, 'ocean.nc'), output_file, 'ocean', 'temp',
+                        sinvar='sin_rot', cosvar='cos_rot')
+
+    with Dataset(os.path.join(regression_path, f'ocean.{product_grid}.nc'), 'r') as ref, Dataset(output_file, 'r') as out:
+        for name in ['SST', 'SSH', 'SSU', 'SSV', 'temp', 'uo', 'vo']:
+            expected = np.ma.masked_greater(np.abs(ref.variables[name][:]), 1.0e10)
+            result = np.ma.masked_greater(np.abs(out.variables[name][:]), 1.0e10)
+            common = ~(np.ma.getmaskarray(expected) | np.ma.getmaskarray(result))
+            # the sea points agree, the coastline may differ by the renormalization of the weights
+            assert common.sum() > 0.95 * (~np.ma.getmaskarray(expected)).sum()
+            np.testing.assert_allclose(np.asarray(out.variables[name][:])[common],
+                                       np.asarray(ref.variables[name][:])[common], rtol=1e-4, atol=1e-5)
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+
+import pytest
+from wxflow import Template, TemplateConstants
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+HOMEgfs = os.path.dirname(os.path.dirname(os.path.dirname(script_dir)))
+sys.path.append(os.path.join(HOMEgfs, 'ush', 'python', 'pygfs', 'ufswm'))
+
+from ufs import UFS, UFSTemplate
+
+
+def ufs_templates():
+    templates = []
+    for root, _, files in os.walk(os.path.join(HOMEgfs, 'parm', 'ufs')):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'r') as fhi:
+                    if '@[' in fhi.read():
+                        templates.append(path)
+            except UnicodeDecodeError:
+                continue
+    return templates
+
+
+def wxflow_parse(input_template, ctx):
+    # the per-file parse UFS.parse_ufs_templates did before the templates were split once
+    with open(input_template, 'r') as fhi:
+        file_out = Template.substitute_structure(fhi.read(), TemplateConstants.AT_SQUARE_BRACES, ctx.get)
+    missing = list(dict.fromkeys(re.findall(r"@\[.*?\]+", file_out)))
+    return file_out, missing
+
+
+def contexts(input_template, members=3):
+    with open(input_template, 'r') as fhi:
+        names = sorted({match[2:-1] for match in UFSTemplate.PATTERN.findall(fhi.read())})
+    # leave the first variable out so that it stays unrendered
+    return [{name: f"{name.lower()}_mem{mem:03d}" for name in names[1:]} for mem in range(members)]
+
+
+@pytest.mark.parametrize('input_template', ufs_templates(), ids=os.path.basename)
+def test_render(input_template):
+    template = UFSTemplate.from_file(input_template)
+    ctxs = contexts(input_template)
+    assert template.render_many(ctxs) == [wxflow_parse(input_template, ctx) for ctx in ctxs]
+    assert template.render(ctxs[0])[1], 'a variable is expected to be left unrendered'
+
+
+@pytest.mark.parametrize('input_template', ufs_templates(), ids=os.path.basename)
+def test_parse_ufs_templates(input_template, tmp_path):
+    ctxs = contexts(input_template)
+    outputs = {str(tmp_path / f'many_mem{mem:03d}'): ctx for mem, ctx in enumerate(ctxs)}
+    UFS.parse_ufs_templates_many(input_template, outputs)
+
+    for mem, (output_file, ctx) in enumerate(outputs.items()):
+        single = str(tmp_path / f'single_mem{mem:03d}')
+        UFS.parse_ufs_templates(input_template, single, ctx)
+        with open(output_file, 'r') as fh_many, open(single, 'r') as fh_single:
+            rendered = fh_many.read()
+            assert rendered == fh_single.read()
+        assert rendered == wxflow_parse(input_template, ctx)[0]
+
+
+def test_from_file_changed(tmp_path):
+    input_template = tmp_path / 'model_configure.IN'
+    input_template.write_text('start_year: @[SYEAR]\n')
+    assert UFSTemplate.from_file(str(input_template)).render({'SYEAR': 2021}) == ('start_year: 2021\n', [])
+    assert UFSTemplate.from_file(str(input_template)) is UFSTemplate.from_file(str(input_template))
+
+    # a changed template is split again
+    input_template.write_text('start_year: @[SYEAR]\nstart_month: @[SMONTH]\n')
+    assert UFSTemplate.from_file(str(input_template)).render({'SYEAR': 2021}) == \
+        ('start_year: 2021\nstart_month: @[SMONTH]\n', ['@[SMONTH]'])
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+from rocoto.walltime_history import (apply_walltimes, propose_walltimes, read_job_logs, read_rocoto_jobs,
+                                     seconds_to_hms)
+
+TASKS = '''\t<task name="gdas_anal" cycledefs="gdas" maxtries="&MAXTRIES;">
+\t\t<command>&HOMEgfs;/jobs/rocoto/anal.sh</command>
+\t\t<walltime>01:00:00</walltime>
+\t</task>
+\t<metatask name="gdas_atmos_prod">
+\t\t<var name="fhr">f003 f006</var>
+\t\t<task name="gdas_atmos_prod_#fhr#" cycledefs="gdas">
+\t\t\t<walltime>00:15:00</walltime>
+\t\t</task>
+\t</metatask>
+\t<task name="gdas_fcst" cycledefs="gdas">
+\t\t<walltime>00:40:00</walltime>
+\t</task>
+'''
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    rows = [('gdas_anal', 'SUCCEEDED', 'COMPLETED', 0, 1, duration) for duration in range(1500, 1800, 50)]
+    rows += [('gdas_fcst', 'SUCCEEDED', 'COMPLETED', 0, 1, 2300)] * 3
+    rows += [('gdas_fcst', 'DEAD', 'TIMEOUT', 15, 2, 2400), ('gdas_fcst', 'FAILED', 'FAILED', 1, 1, 2390)]
+    rows += [('gdas_atmos_prod_f003', 'SUCCEEDED', 'COMPLETED', 0, 1, 200)]
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR, taskname VARCHAR, cycle DATETIME, '
+                    'cores INTEGER, state VARCHAR, native_state VARCHAR, exit_status INTEGER, tries INTEGER, '
+                    'nunknowns INTEGER, duration REAL)')
+        con.executemany('INSERT INTO jobs (taskname, state, native_state, exit_status, tries, duration) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', rows)
+    return db_file
+
+
+def test_propose_walltimes(db_file, tmp_path):
+    history = read_rocoto_jobs(db_file)
+    assert history['gdas_fcst'].timeouts == 1 and history['gdas_fcst'].count_timeouts(2400) == 2
+    assert history['gdas_anal'].exit_statuses == {0: 6}
+
+    # job logs complete the history of the tasks with few jobs in the database
+    for cycle, elapsed in enumerate(['00:03:20', '00:04:10', '00:03:50', '00:03:30']):
+        log_dir = tmp_path / 'logs' / f'20240101{cycle * 6:02d}'
+        log_dir.mkdir(parents=True)
+        (log_dir / 'gdas_atmos_prod_f003.log').write_text(
+            'Begin atmos_products.sh\n'
+            'End exglobal_atmos_products.sh at 00:04:00 with error code 0 (time elapsed: 00:02:00)\n'
+            f'End atmos_products.sh at 00:05:00 with error code 0 (time elapsed: {elapsed})\n')
+    history = read_job_logs(str(tmp_path), history, ['gdas_atmos_prod_f003'])
+    assert sorted(history['gdas_atmos_prod_f003'].elapsed) == [200., 210., 230., 250.]
+
+    walltimes = {'gdas_anal': '01:00:00', 'gdas_fcst': '00:40:00',
+                 'gdas_atmos_prod_f003': '00:15:00', 'gdas_atmos_prod_f006': '00:15:00'}
+    proposals = propose_walltimes(history, walltimes, percentile=99., margin=0.1, min_samples=5, granularity=300)
+    # p99 of 1500..1750 s plus 10% is 32 min, rounded up to 35 min
+    assert proposals['gdas_anal']['proposed'] == '00:35:00' and proposals['gdas_anal']['flag'] == ''
+    # jobs killed at the walltime: flagged and not shortened
+    assert proposals['gdas_fcst']['flag'] == 'hits walltime'
+    assert proposals['gdas_fcst']['proposed'] == '00:45:00'
+    assert proposals['gdas_atmos_prod_f003']['samples'] == 5
+    assert proposals['gdas_atmos_prod_f003']['proposed'] == '00:05:00'
+    assert 'gdas_atmos_prod_f006' not in proposals
+
+
+def test_apply_walltimes():
+    assert seconds_to_hms(5400) == '01:30:00'
+    xml = apply_walltimes(TASKS, {'gdas_anal': '00:35:00', 'gdas_atmos_prod_#fhr#': '00:10:00',
+                                  'gdas_atmos_prod_f003': '00:05:00'})
+    assert xml == TASKS.replace('01:00:00', '00:35:00').replace('00:15:00', '00:10:00')
+    assert apply_walltimes(TASKS, {}) == TASKS
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+from rocoto.workflow_dag import WorkflowDAG, durations_from_rocoto_db, hms_to_seconds
+
+WORKFLOW = '''<?xml version="1.0"?>
+<!DOCTYPE workflow
+[
+    <!ENTITY PSLOT "test">
+    <!ENTITY ROTDIR "/rotdir/test">
+]>
+<workflow realtime="F" scheduler="slurm" cyclethrottle="2" taskthrottle="25">
+    <cycledef group="first">202401010000 202401010000 06:00:00</cycledef>
+    <cycledef group="gdas">202401010600 202401050000 06:00:00</cycledef>
+    <task name="stage_ic" cycledefs="first">
+        <walltime>00:10:00</walltime>
+    </task>
+    <task name="prep" cycledefs="gdas">
+        <walltime>00:20:00</walltime>
+        <dependency>
+            <and>
+                <taskdep task="post_f006" cycle_offset="-06:00:00"/>
+                <datadep><cyclestr>&ROTDIR;/obs.@Y@m@d@H</cyclestr></datadep>
+            </and>
+        </dependency>
+    </task>
+    <task name="anal" cycledefs="gdas">
+        <walltime>01:00:00</walltime>
+        <dependency><taskdep task="prep"/></dependency>
+    </task>
+    <task name="fcst" cycledefs="first,gdas">
+        <walltime>00:30:00</walltime>
+        <dependency>
+            <or>
+                <taskdep task="anal"/>
+                <taskdep task="stage_ic"/>
+            </or>
+        </dependency>
+    </task>
+    <metatask name="post">
+        <var name="fhr">f003 f006</var>
+        <task name="post_#fhr#" cycledefs="first,gdas">
+            <walltime>00:05:00</walltime>
+            <dependency>
+                <or>
+                    <datadep age="120"><cyclestr>&ROTDIR;/atm#fhr#.nc</cyclestr></datadep>
+                    <taskdep task="fcst"/>
+                </or>
+            </dependency>
+        </task>
+    </metatask>
+    <task name="arch" cycledefs="gdas">
+        <walltime>03:00:00</walltime>
+        <dependency>
+            <and>
+                <metataskdep metatask="post"/>
+                <or>
+                    <taskdep task="arch" cycle_offset="-06:00:00"/>
+                    <not><cycleexistdep cycle_offset="-06:00:00"/></not>
+                </or>
+            </and>
+        </dependency>
+    </task>
+</workflow>
+'''
+
+
+@pytest.fixture
+def dag():
+    return WorkflowDAG.from_string(WORKFLOW)
+
+
+def test_model(dag):
+    assert hms_to_seconds('-06:00:00') == -21600 and hms_to_seconds('01:00:00:00') == 86400
+    assert list(dag.cycledefs) == ['first', 'gdas']
+    assert dag.attributes['cyclethrottle'] == '2'
+    assert dag.metatasks['post'] == ['post_f003', 'post_f006']
+    assert dag.tasks['fcst'].cycledefs == ['first', 'gdas']
+    assert dag.tasks['post_f006'].walltime == 300
+    assert '/rotdir/test/atmf006.nc' in [leaf.text for leaf in dag.tasks['post_f006'].dependency.leaves()]
+    assert dag.predecessors('prep', None) == [('post_f006', -21600)]
+    assert dag.successors('fcst') == [('post_f003', 0), ('post_f006', 0)]
+
+
+def test_critical_path(dag):
+    # stage_ic does not run in the gdas cycles, the forecast waits for the analysis
+    assert dag.critical_path({}, 'gdas') == (295 * 60, ['prep', 'anal', 'fcst', 'post_f003', 'arch'])
+    assert dag.critical_path({}, 'first') == (45 * 60, ['stage_ic', 'fcst', 'post_f003'])
+    assert dag.critical_path({'post_f006': 600.}, 'first') == (50 * 60, ['stage_ic', 'fcst', 'post_f006'])
+
+
+def test_max_cycle_ratio(dag):
+    # prep -> anal -> fcst -> post_f006 -> prep of the next cycle: 1h55 per cycle,
+    # the archive loop (3h per cycle) is longer
+    period, loop = dag.max_cycle_ratio({}, 6 * 3600, 'gdas')
+    assert period == pytest.approx(3 * 3600, abs=1.)
+    assert loop == [('arch', 'arch')]
+
+    period, loop = dag.max_cycle_ratio({'arch': 600.}, 6 * 3600, 'gdas')
+    assert period == pytest.approx(115 * 60, abs=1.)
+    assert set(loop) == {('post_f006', 'prep')}
+
+    assert dag.max_cycle_ratio({}, 6 * 3600, 'first') == (0., [])
+
+
+def test_durations_from_rocoto_db(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE jobs (taskname VARCHAR, cycle DATETIME, state VARCHAR, duration INTEGER)')
+        con.executemany('INSERT INTO jobs VALUES (?, ?, ?, ?)',
+                        [('fcst', 0, 'SUCCEEDED', 100), ('fcst', 21600, 'SUCCEEDED', 300),
+                         ('fcst', 43200, 'DEAD', 3600), ('anal', 0, 'SUCCEEDED', 60)])
+    assert durations_from_rocoto_db(db_file) == {'fcst': 200., 'anal': 60.}
+    assert durations_from_rocoto_db(db_file, 'max')['fcst'] == 300.
+    assert durations_from_rocoto_db(db_file, 'p50')['fcst'] == 200.
+    with pytest.raises(ValueError):
+        durations_from_rocoto_db(db_file, 'mode')
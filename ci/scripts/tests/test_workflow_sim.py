@@ -0,0 +1,105 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+from rocoto.workflow_dag import WorkflowDAG
+from rocoto.workflow_sim import ThroughputSimulator, TimingModel, cycle_times, recommend
+
+# prep waits for the forecast of the previous cycle: the cycles can overlap by the
+# post-processing and the archive, one cycle takes 120 min and the run advances by
+# one cycle every 70 min
+WORKFLOW = '''<?xml version="1.0"?>
+<!DOCTYPE workflow
+[
+    <!ENTITY ROTDIR "/rotdir/test">
+]>
+<workflow realtime="F" scheduler="slurm" cyclethrottle="3" taskthrottle="25">
+    <cycledef group="gdas">202401010000 202401020000 06:00:00</cycledef>
+    <task name="prep" cycledefs="gdas">
+        <walltime>00:10:00</walltime>
+        <dependency>
+            <or>
+                <taskdep task="fcst" cycle_offset="-06:00:00"/>
+                <not><cycleexistdep cycle_offset="-06:00:00"/></not>
+            </or>
+        </dependency>
+    </task>
+    <task name="fcst" cycledefs="gdas">
+        <walltime>01:00:00</walltime>
+        <dependency><taskdep task="prep"/></dependency>
+    </task>
+    <metatask name="post">
+        <var name="grp">01 02 03</var>
+        <task name="post#grp#" cycledefs="gdas">
+            <walltime>00:20:00</walltime>
+            <dependency>
+                <or>
+                    <datadep age="120"><cyclestr>&ROTDIR;/atm#grp#.nc</cyclestr></datadep>
+                    <taskdep task="fcst"/>
+                </or>
+            </dependency>
+        </task>
+    </metatask>
+    <task name="arch" cycledefs="gdas">
+        <walltime>00:30:00</walltime>
+        <dependency><metataskdep metatask="post"/></dependency>
+    </task>
+</workflow>
+'''
+
+
+@pytest.fixture
+def simulator():
+    return ThroughputSimulator(WorkflowDAG.from_string(WORKFLOW), TimingModel())
+
+
+def test_cycle_times():
+    assert cycle_times('202401010000 202401011200 06:00:00') == [datetime(2024, 1, 1, hour) for hour in (0, 6, 12)]
+    with pytest.raises(ValueError):
+        cycle_times('0 0,12 * * 2024 *')
+
+
+def test_throttles(simulator):
+    assert len(simulator.cycles) == 5
+
+    result = simulator.run(cyclethrottle=5, taskthrottle=25)
+    assert result.completed == [60. * (120 + 70 * ii) for ii in range(5)]
+    assert result.cycles_per_day == pytest.approx(5 * 1440 / 400)
+    assert result.steady_cycles_per_day == pytest.approx(1440 / 70)
+    assert result.occupancy['max_in_flight'] == 4  # the posts of a cycle and the prep of the next one
+    assert result.gaps == [] and result.stalled == 0
+
+    # one cycle at a time
+    assert simulator.run(cyclethrottle=1, taskthrottle=25).makespan == 5 * 120 * 60.
+    # one task at a time: the work of the whole run end to end, always at the throttle
+    result = simulator.run(cyclethrottle=5, taskthrottle=1)
+    assert result.makespan == 5 * 160 * 60.
+    assert result.occupancy['at_taskthrottle'] == pytest.approx(1.)
+
+
+def test_poll_and_queue_waits():
+    dag = WorkflowDAG.from_string(WORKFLOW)
+    samples = {'fcst': {'duration': [1800.], 'queue': [600.]}}
+    result = ThroughputSimulator(dag, TimingModel(samples), ncycles=2, poll=900.).run(cyclethrottle=1, taskthrottle=25)
+    # cycle 1: prep 0-10, (rocotorun at 15) fcst queued 15-25 and runs 25-55, (60) posts 60-80,
+    # (90) arch 90-120; cycle 2 starts at the rocotorun of 120
+    assert result.completed == [120 * 60., 240 * 60.]
+    assert result.gaps[:3] == [(600., 300.), (3300., 300.), (4800., 600.)]
+    assert result.queue_waits.count(600.) == 2 and result.occupancy['queued'] > 0
+
+
+def test_stalled_and_recommend(simulator):
+    broken = WORKFLOW.replace('<not><cycleexistdep cycle_offset="-06:00:00"/></not>', '<false/>')
+    result = ThroughputSimulator(WorkflowDAG.from_string(broken), TimingModel()).run(cyclethrottle=5, taskthrottle=25)
+    assert result.stalled == 5 and result.completed == []
+
+    summaries = simulator.sweep([1, 2, 3], [1, 4, 25])
+    assert len(summaries) == 9
+    best = recommend(summaries)
+    # two cycles in flight and four jobs at once are enough
+    assert (best['cyclethrottle'], best['taskthrottle']) == (2, 4)
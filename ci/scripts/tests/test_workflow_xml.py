@@ -0,0 +1,60 @@
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(script_dir))), 'workflow'))
+
+import rocoto.rocoto as rocoto
+from rocoto.workflow_xml import merge_xml_sections, split_xml_sections
+
+HEADER = '<?xml version="1.0"?>\n<!-- This workflow was automatically generated at {} -->\n<workflow>\n'
+
+
+def task_xml(name, walltime='00:10:00'):
+    return rocoto.create_task({'task_name': name, 'resources': {'walltime': walltime}})
+
+
+def workflow_xml(tasks, generated='2024-01-01 00:00:00'):
+    return HEADER.format(generated) + '\n'.join(tasks) + '\n</workflow>\n'
+
+
+def test_create_task():
+    task_dict = {'task_name': 'post', 'var_dict': {'mem': '001 002'},
+                 'task_dict': {'task_name': 'post_mem#mem#', 'var_dict': {'fhr': '000 006'},
+                               'task_dict': {'task_name': 'post_mem#mem#_f#fhr#', 'resources': {},
+                                             'envars': [rocoto.create_envar('CMD', 'a && b')],
+                                             'dependency': ['<taskdep task="fcst"/>']}}}
+    lines = rocoto.create_task(task_dict).splitlines()
+    assert lines[:3] == ['<metatask name="post" mode="parallel">', '', '\t<var name="mem">001 002</var>']
+    # the nested metatask and task are indented once per level, the empty lines stay empty
+    assert '\t<metatask name="post_mem#mem#" mode="parallel">' in lines
+    assert '\t\t<var name="fhr">000 006</var>' in lines
+    assert '\t\t<task name="post_mem#mem#_f#fhr#" cycledefs="democycle" maxtries="3">' in lines
+    assert '\t\t\t<dependency>' in lines and '\t\t\t\t<taskdep task="fcst"/>' in lines
+    assert lines[-3:] == ['\t</metatask>', '', '</metatask>']
+    assert all(line == line.rstrip() for line in lines)
+    # ampersands that do not start an entity are escaped
+    assert '\t\t\t<envar><name>CMD</name><value>a &amp;&amp; b</value></envar>' in lines
+    assert rocoto.create_envar('ROTDIR', '&ROTDIR;/logs') == '<envar><name>ROTDIR</name><value>&ROTDIR;/logs</value></envar>'
+
+
+def test_split_and_merge_sections():
+    old = workflow_xml([task_xml('prep'), task_xml('fcst'), task_xml('post')])
+    head, sections, tail = split_xml_sections(old)
+    assert list(sections) == ['prep', 'fcst', 'post'] and tail == '\n</workflow>\n'
+    assert head + ''.join(sections.values()) + tail == old
+
+    # nothing changed but the generation time: the existing XML is kept as is
+    regenerated = workflow_xml([task_xml('prep'), task_xml('fcst'), task_xml('post')], generated='2024-06-01 00:00:00')
+    assert ''.join(merge_xml_sections(old, regenerated)) == old
+
+    new = workflow_xml([task_xml('prep'), task_xml('fcst', '01:00:00'), task_xml('arch')], generated='2024-06-01')
+    assert ''.join(merge_xml_sections(old, new)) == new.replace('2024-06-01', '2024-01-01 00:00:00')
+
+    # only the selected tasks are replaced, added or removed
+    merged = ''.join(merge_xml_sections(old, new, ['fcst']))
+    assert merged == workflow_xml([task_xml('prep'), task_xml('fcst', '01:00:00'), task_xml('post')])
+    merged = ''.join(merge_xml_sections(old, new, ['post', 'arch']))
+    assert merged == workflow_xml([task_xml('prep'), task_xml('fcst'), task_xml('arch')])
+    merged = ''.join(merge_xml_sections(old, new, ['a*']))
+    assert merged == workflow_xml([task_xml('prep'), task_xml('fcst'), task_xml('post'), task_xml('arch')])
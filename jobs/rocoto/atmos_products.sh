@@ -4,7 +4,8 @@ source "${HOMEgfs}/ush/preamble.sh"
 
 ###############################################################
 ## atmosphere products driver script
-## FHRLST : forecast hour list to post-process (e.g. -f001, f000, f000_f001_f002, ...)
+## FHR3     : forecast hour to post-process (e.g. -001, 000, 003, ...)
+## FHR_LIST : forecast hours of the job when it processes a group of them (e.g. 000_003_006)
 ###############################################################
 
 # Source FV3GFS workflow modules
@@ -13,15 +14,21 @@ status=$?
 if (( status != 0 )); then exit "${status}"; fi
 
 export job="atmos_products"
-export jobid="${job}.$$"
+fhr_list="${FHR_LIST:-${FHR3}}"
+for FHR3 in ${fhr_list//_/ }; do
+  export FHR3
+  # Negatation needs to be before the base
+  fhr3_base="10#${FHR3}"
+  export FORECAST_HOUR=$(( ${fhr3_base/10#-/-10#} ))
+  # Each forecast hour has its own working directory
+  export jobid="${job}.$$.f${FHR3}"
 
-# Negatation needs to be before the base
-fhr3_base="10#${FHR3}"
-export FORECAST_HOUR=$(( ${fhr3_base/10#-/-10#} ))
+  ###############################################################
+  # Execute the JJOB
+  ###############################################################
+  "${HOMEgfs}/jobs/JGLOBAL_ATMOS_PRODUCTS"
+  status=$?
+  if (( status != 0 )); then exit "${status}"; fi
+done
 
-###############################################################
-# Execute the JJOB
-###############################################################
-"${HOMEgfs}/jobs/JGLOBAL_ATMOS_PRODUCTS"
-
-exit $?
+exit 0
@@ -4,7 +4,8 @@ source "${HOMEgfs}/ush/preamble.sh"
 
 ###############################################################
 ## ocean ice products driver script
-## FHRLST : forecast hour list to post-process (e.g. f000, f000_f001_f002, ...)
+## FHR3     : forecast hour to post-process (e.g. 003, 006, ...)
+## FHR_LIST : forecast hours of the job when it processes a group of them (e.g. 006_012_018)
 ###############################################################
 
 # Source FV3GFS workflow modules
@@ -13,13 +14,19 @@ status=$?
 if (( status != 0 )); then exit "${status}"; fi
 
 export job="oceanice_products"
-export jobid="${job}.$$"
+fhr_list="${FHR_LIST:-${FHR3}}"
+for FHR3 in ${fhr_list//_/ }; do
+  export FHR3
+  export FORECAST_HOUR=$(( 10#${FHR3} ))
+  # Each forecast hour has its own working directory
+  export jobid="${job}.$$.f${FHR3}"
 
-export FORECAST_HOUR=$(( 10#${FHR3} ))
+  ###############################################################
+  # Execute the JJOB
+  ###############################################################
+  "${HOMEgfs}/jobs/JGLOBAL_OCEANICE_PRODUCTS"
+  status=$?
+  if (( status != 0 )); then exit "${status}"; fi
+done
 
-###############################################################
-# Execute the JJOB
-###############################################################
-"${HOMEgfs}/jobs/JGLOBAL_OCEANICE_PRODUCTS"
-
-exit $?
+exit 0
@@ -5,7 +5,8 @@ source "${HOMEgfs}/ush/preamble.sh"
 ###############################################################
 ## Offline UPP driver script
 ## UPP_RUN: analysis, forecast, goes, wafs.  See upp.yaml for valid options
-## FHRLST : forecast hourlist to be post-process (e.g. f000, f000_f001_f002, ...)
+## FHR3 : last forecast hour to be post-processed (e.g. 006)
+## FHR_LIST : forecast hours to be post-processed in this job (e.g. 000_003_006), FHR3 if not set
 ###############################################################
 
 # Source FV3GFS workflow modules
@@ -45,6 +46,12 @@ export job="upp"
 export jobid="${job}.$$"
 
 export FORECAST_HOUR=$(( 10#${FHR3} ))
+FORECAST_HOURS=""
+fhr_list="${FHR_LIST:-${FHR3}}"
+for fhr in ${fhr_list//_/ }; do
+  FORECAST_HOURS="${FORECAST_HOURS:+${FORECAST_HOURS} }$(( 10#${fhr} ))"
+done
+export FORECAST_HOURS
 
 ###############################################################
 # Execute the JJOB
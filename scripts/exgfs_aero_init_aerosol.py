@@ -16,8 +16,8 @@ STEP_GFS: 	Forecast cadence (frequency) in hours
 FHMAX_GFS: 	Forecast length in hours
 RUN: 		Forecast phase (gfs or gdas). Currently always expected to be gfs.
 ROTDIR: 	Rotating (COM) directory
-USHgfs: 	Path to global-workflow `ush` directory
 PARMgfs: 	Path to global-workflow `parm` directory
+AERO_INIT_MAX_WORKERS:	Number of tiles merged at once (optional, default: 6)
 
 Additionally, the following data files are used:
 
@@ -35,11 +35,13 @@ The tiled atmospheric intial condition files will be updated with conservation-a
 '''
 
 import os
-import subprocess
 import typing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from functools import partial
 
+from merge_fv3_aerosol_tile import merge_tile
+
 # Constants
 atm_base_pattern = "{rot_dir}/{run}.%Y%m%d/%H/model/atmos/input"         # Location of atmosphere ICs
 atm_file_pattern = "{path}/gfs_data.{tile}.nc"                                # Atm IC file names
@@ -49,7 +51,6 @@ restart_file_pattern = "{file_base}/{timestamp}fv_core.res.{tile}.nc"         #
 tracer_file_pattern = "{file_base}/{timestamp}fv_tracer.res.{tile}.nc"        # Name of restart tracer files (time when restart is valid)
 dycore_file_pattern = "{file_base}/{timestamp}fv_core.res.nc"                 # Name of restart dycore file (time when restart is valid)
 tracer_list_file_pattern = "{parm_gfs}/ufs/gocart/gocart_tracer.list"         # Text list of tracer names to copy
-merge_script_pattern = "{ush_gfs}/merge_fv3_aerosol_tile.py"
 n_tiles = 6
 max_lookback = 4                                                              # Maximum number of past cycles to look for for tracer data
 debug = True
@@ -70,26 +71,25 @@ def main() -> None:
     fcst_length = int(get_env_var('FHMAX_GFS'))
     run = get_env_var("RUN")
     rot_dir = get_env_var("ROTDIR")
-    ush_gfs = get_env_var("USHgfs")
     parm_gfs = get_env_var("PARMgfs")
+    max_workers = int(os.environ.get("AERO_INIT_MAX_WORKERS", n_tiles))
 
     # os.chdir(data)
 
-    merge_script = merge_script_pattern.format(ush_gfs=ush_gfs)
     tracer_list_file = tracer_list_file_pattern.format(parm_gfs=parm_gfs)
 
     time = datetime.strptime(cdate, "%Y%m%d%H")
     atm_source_path = time.strftime(atm_base_pattern.format(**locals()))
 
     if (debug):
-        for var in ['merge_script', 'tracer_list_file', 'atm_source_path']:
+        for var in ['tracer_list_file', 'atm_source_path', 'max_workers']:
             print(f'{var} = {f"{var}"}')
 
     atm_files, ctrl_files = get_atm_files(atm_source_path)
     tracer_files, rest_files, core_files = get_restart_files(time, incr, max_lookback, fcst_length, rot_dir, run)
 
     if (tracer_files is not None):
-        merge_tracers(merge_script, atm_files, tracer_files, rest_files, core_files[0], ctrl_files[0], tracer_list_file)
+        merge_tracers(atm_files, tracer_files, rest_files, core_files[0], ctrl_files[0], tracer_list_file, max_workers)
 
     return
 
@@ -171,6 +171,9 @@ def get_restart_files(time: datetime, incr: int, max_lookback: int, fcst_length:
     '''
     Determines the last cycle where all the necessary restart files are available. Ideally the immediate previous cycle
 
+    The restart directory of each candidate cycle is scanned once and the newest cycle with a complete
+    set of files is selected.
+
     Parameters
     ----------
     time : datetime
@@ -194,6 +197,9 @@ def get_restart_files(time: datetime, incr: int, max_lookback: int, fcst_length:
 
     '''
     print(f"Looking for restart tracer files in {rot_dir}")
+
+    # Candidate cycles, newest first, with the files each would need
+    candidates = []
     for lookback in map(lambda i: incr * (i + 1), range(max_lookback)):
         if (lookback > fcst_length):
             # Trying to look back farther than the length of a forecast
@@ -205,48 +211,53 @@ def get_restart_files(time: datetime, incr: int, max_lookback: int, fcst_length:
             timestamp = time.strftime("%Y%m%d.%H0000.")
 
         last_time = time - timedelta(hours=lookback)
-
-        if (debug):
-            print(f"\tChecking {last_time}")
-        file_list = []
         file_base = last_time.strftime(restart_base_pattern.format(**locals()))
 
+        file_list = []
         for file_pattern in tracer_file_pattern, restart_file_pattern, dycore_file_pattern:
             files = list(map(lambda tile: file_pattern.format(timestamp=timestamp, file_base=file_base, tile=tile), tiles))
-            if (debug):
-                print(f"\t\tLooking for files {files} in directory {file_base}")
             file_list = file_list + [files]
+        candidates.append((last_time, file_base, file_list))
+
+    # Inventory of each restart directory, read with a single scan
+    inventory = {}
+    for _, file_base, _ in candidates:
+        if file_base not in inventory:
+            try:
+                with os.scandir(file_base) as entries:
+                    inventory[file_base] = {entry.name for entry in entries if entry.is_file()}
+            except FileNotFoundError:
+                inventory[file_base] = set()
+
+    # Newest cycle with a complete set of restart files
+    for last_time, file_base, file_list in candidates:
+        if (debug):
+            print(f"\tChecking {last_time} in directory {file_base}")
+        missing = [file for files in file_list for file in files if os.path.basename(file) not in inventory[file_base]]
+        if not missing:
+            return file_list
+        print(last_time.strftime("Restart files not found for %Y%m%d_%H"))
+        if (debug):
+            print(f"\t\tMissing files {missing}")
 
-        found = all([os.path.isfile(file) for file in files for files in file_list])
-
-        if (found):
-            break
-        else:
-            print(last_time.strftime("Restart files not found for %Y%m%d_%H"))
-
-    if (found):
-        return file_list
-    else:
-        print("WARNING: Unable to find restart files, will use zero fields")
-        return [None, None, None]
+    print("WARNING: Unable to find restart files, will use zero fields")
+    return [None, None, None]
 
 
 # Merge tracer data into atmospheric data
-def merge_tracers(merge_script: str,
-                  atm_files: typing.List[str],
+def merge_tracers(atm_files: typing.List[str],
                   tracer_files: typing.List[str],
                   rest_files: typing.List[str],
                   core_file: str,
                   ctrl_file: str,
-                  tracer_list_file: str) -> None:
+                  tracer_list_file: str,
+                  max_workers: int = n_tiles) -> None:
     '''
-    Call the merger script to merge the tracers into the atmospheric IC files. Merged file is written to a temp file
-    which then overwrites the original upon successful completion of the script.
+    Merge the tracers into the atmospheric IC files, all tiles concurrently. Each merged tile is written
+    to a temp file, the temp files overwrite the originals once all tiles are merged successfully.
 
     Parameters
     ----------
-    merge_script : str
-            Full path to the merge script
     atm_files : list of str
             List of paths to atmospheric IC files
     tracer_files : list of str
@@ -259,6 +270,8 @@ def merge_tracers(merge_script: str,
             Path of control file
     tracer_list_file : str
             Full path to the file listing the tracer variables to add
+    max_workers : int, optional
+            Number of tiles merged at once (default: 6)
 
     Returns
     ----------
@@ -268,8 +281,8 @@ def merge_tracers(merge_script: str,
     ----------
     ValueError
             If `atm_files`, `tracer_files`, and `rest_files` are not all the same length
-    CalledProcessError
-            If merge script exits with a non-zero error
+    SystemExit
+            If the merge of a tile fails on a missing or inconsistent input
 
     '''
     print("Merging tracers")
@@ -279,11 +292,30 @@ def merge_tracers(merge_script: str,
     if (len(atm_files) != len(rest_files)):
         raise ValueError("Atmosphere file list and dycore file list are not the same length")
 
-    for atm_file, tracer_file, rest_file in zip(atm_files, tracer_files, rest_files):
-        if debug:
-            print(f"\tMerging tracers from {tracer_file} into {atm_file}")
-        temp_file = f'{atm_file}.tmp'
-        subprocess.run([merge_script, atm_file, tracer_file, core_file, ctrl_file, rest_file, tracer_list_file, temp_file], check=True)
+    with open(tracer_list_file) as variable_file:
+        tracers = variable_file.read().splitlines()
+
+    # Each tile is merged into a temp file next to its IC file; the IC files are only
+    # replaced once every tile has been merged, otherwise the temp files are removed
+    temp_files = {atm_file: os.path.join(os.path.dirname(atm_file), f'.{os.path.basename(atm_file)}.{os.getpid()}.tmp')
+                  for atm_file in atm_files}
+    try:
+        with ProcessPoolExecutor(max_workers=max(min(max_workers, len(atm_files)), 1)) as executor:
+            futures = []
+            for atm_file, tracer_file, rest_file in zip(atm_files, tracer_files, rest_files):
+                if debug:
+                    print(f"\tMerging tracers from {tracer_file} into {atm_file}")
+                futures.append(executor.submit(merge_tile, atm_file, ctrl_file, core_file, rest_file,
+                                               tracer_file, tracers, temp_files[atm_file]))
+            for future in futures:
+                future.result()
+    except BaseException:
+        for temp_file in temp_files.values():
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+
+    for atm_file, temp_file in temp_files.items():
         os.replace(temp_file, atm_file)
 
 
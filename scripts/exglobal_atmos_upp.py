@@ -34,6 +34,11 @@ def main():
     # Initialize the DATA/ directory; copy static data
     upp.initialize(upp_yaml)
 
+    # Batch mode: process each forecast hour in its own subdirectory of DATA/
+    if len(upp.task_config.forecast_hours) > 1:
+        upp.process_hours(keys, max_workers=upp.task_config.get('UPP_MAX_CONCURRENT_HOURS', 1))
+        return
+
     # Configure DATA/ directory for execution; prepare namelist etc.
     upp.configure(upp_dict, upp_yaml)
 
@@ -21,7 +21,8 @@ def main():
     keys = ['HOMEgfs', 'DATA', 'current_cycle', 'RUN', 'NET',
             f'COM_{oceanice.task_config.component.upper()}_HISTORY',
             f'COM_{oceanice.task_config.component.upper()}_GRIB',
-            'APRUN_OCNICEPOST',
+            'APRUN_OCNICEPOST', 'MAX_CONCURRENT_GRIDS',
+            'OCNICEPOST_ENGINE', 'OCNICEPOST_WEIGHTS_CACHE',
             'component', 'forecast_hour', 'valid_datetime', 'avg_period',
             'model_grid', 'product_grids', 'oceanice_yaml']
     oceanice_dict = AttrDict()
@@ -31,15 +32,8 @@ def main():
     # Initialize the DATA/ directory; copy static data
     oceanice.initialize(oceanice_dict)
 
-    for grid in oceanice_dict.product_grids:
-
-        logger.info(f"Processing {grid} grid")
-
-        # Configure DATA/ directory for execution; prepare namelist etc.
-        oceanice.configure(oceanice_dict, grid)
-
-        # Run the oceanice post executable to interpolate and create grib2 files
-        oceanice.execute(oceanice_dict, grid)
+    # Configure and run the oceanice post executable for each grid, in separate work directories
+    oceanice.process_grids(oceanice_dict)
 
     # Subset raw model data to create netCDF products
     oceanice.subset(oceanice_dict)
@@ -0,0 +1,108 @@
+#! /bin/env python3
+'''
+Benchmarks the ocean/ice products netCDF subset on a synthetic mx025
+  MOM6 history file: the xarray subset against the streaming subset.
+  Each method runs in a separate process to report its peak memory.
+
+Syntax
+------
+bench_oceanice_subset.py [--workdir DIR] [--nz NZ] [--max-memory-mb MB] [--complevel N]
+
+'''
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+import numpy as np
+from netCDF4 import Dataset
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'ush', 'python', 'pygfs', 'utils'))
+
+from netcdf_subset import subset_netcdf
+
+# mx025 tripole dimensions
+NX, NY = 1440, 1080
+
+VARS_2D = ['SSH', 'SST', 'SSS', 'speed', 'MLD_003', 'latent', 'sensible', 'SW', 'LW', 'LwLatSens',
+           'Heat_PmE', 'SSU', 'SSV', 'taux', 'tauy']
+VARS_3D = ['temp', 'so', 'uo', 'vo']
+# variables in the history file that are not part of the subset
+VARS_EXTRA_3D = ['h', 'rhopot0', 'agessc', 'KE']
+
+
+def make_history(path: str, nz: int) -> None:
+    rng = np.random.default_rng(0)
+    with Dataset(path, 'w') as ncf:
+        ncf.title = 'synthetic mx025 MOM6 history'
+        for dim, size in [('time', None), ('z_l', nz), ('yh', NY), ('xh', NX)]:
+            ncf.createDimension(dim, size)
+            if dim != 'time':
+                ncf.createVariable(dim, 'f8', (dim,))[:] = np.arange(size)
+        ncf.createVariable('time', 'f8', ('time',))[:] = [6.0]
+        for name in VARS_2D:
+            var = ncf.createVariable(name, 'f4', ('time', 'yh', 'xh'), fill_value=1.0e20)
+            var.long_name = name
+            var[:] = rng.random((1, NY, NX), dtype=np.float32)
+        for name in VARS_3D + VARS_EXTRA_3D:
+            var = ncf.createVariable(name, 'f4', ('time', 'z_l', 'yh', 'xh'), fill_value=1.0e20)
+            var.long_name = name
+            for kk in range(nz):
+                var[0, kk] = rng.random((NY, NX), dtype=np.float32)
+
+
+def run_xarray(input_file: str, output_file: str, queue: Queue) -> None:
+    import xarray as xr
+    start = time.perf_counter()
+    with xr.open_dataset(input_file) as ds:
+        ds_subset = ds[VARS_2D + VARS_3D]
+        ds_subset.attrs = ds.attrs
+        ds_subset.to_netcdf(output_file)
+    queue.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_streaming(input_file: str, output_file: str, queue: Queue, max_memory_mb: float, complevel: int) -> None:
+    start = time.perf_counter()
+    subset_netcdf(input_file, output_file, VARS_2D + VARS_3D, complevel=complevel,
+                  chunks={'time': 1, 'z_l': 1}, max_memory_mb=max_memory_mb)
+    queue.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def measure(target, *args):
+    queue = Queue()
+    proc = Process(target=target, args=args[:2] + (queue,) + args[2:])
+    proc.start()
+    elapsed, maxrss = queue.get()
+    proc.join()
+    return elapsed, maxrss / 1024., os.path.getsize(args[1]) / 1024. ** 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workdir', default=None, help='directory for the synthetic files')
+    parser.add_argument('--nz', type=int, default=40, help='number of ocean levels')
+    parser.add_argument('--max-memory-mb', type=float, default=256., help='memory ceiling of the streaming subset')
+    parser.add_argument('--complevel', type=int, default=1, help='compression level of the streaming subset')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(dir=args.workdir)
+    try:
+        input_file = os.path.join(workdir, 'ocean.nc')
+        print(f'Creating synthetic mx025 history file with {args.nz} levels in {workdir}')
+        make_history(input_file, args.nz)
+        print(f'input: {os.path.getsize(input_file) / 1024. ** 2:.1f} MB')
+
+        results = {'xarray': measure(run_xarray, input_file, os.path.join(workdir, 'ocean_subset.xarray.nc')),
+                   'streaming': measure(run_streaming, input_file, os.path.join(workdir, 'ocean_subset.streaming.nc'),
+                                        args.max_memory_mb, args.complevel)}
+
+        print(f'{"method":<12}{"time (s)":>12}{"peak RSS (MB)":>16}{"output (MB)":>14}')
+        for method, (elapsed, maxrss, size) in results.items():
+            print(f'{method:<12}{elapsed:>12.2f}{maxrss:>16.1f}{size:>14.1f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
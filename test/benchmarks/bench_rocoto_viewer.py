@@ -0,0 +1,210 @@
+#! /bin/env python3
+'''
+Benchmarks the status assembly of rocoto_viewer.get_rocoto_stat on a
+  synthetic Rocoto database (default 10000 tasks over 500 cycles), then
+  the incremental updates of the viewer when nothing changed and when a
+  new cycle started with --new-jobs jobs, checked against a full read.
+  With --legacy, the list-based assembly that get_rocoto_stat used to do
+  is timed too and its result compared; it is cubic in tasks x cycles,
+  use it with small sizes (e.g. --tasks 300 --cycles 60).
+
+Syntax
+------
+bench_rocoto_viewer.py [--tasks N] [--cycles N] [--cycles-with-jobs N] [--new-jobs N] [--legacy] [--workdir DIR]
+
+'''
+import argparse
+import collections
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'workflow'))
+
+import rocoto_viewer
+
+START = datetime(2020, 1, 1)
+INTERVAL = timedelta(hours=6)
+
+
+def make_workflow(ntasks: int, ncycles: int):
+    """
+    Tasks of two cycledef groups: gdas every cycle, gfs every fourth cycle, and some tasks in both
+    """
+    end = START + (ncycles - 1) * INTERVAL
+    cycledef_group_cycles = collections.defaultdict(rocoto_viewer.CycleDefGroup)
+    cycledef_group_cycles['gdas'].add(START, end, INTERVAL)
+    cycledef_group_cycles['gfs'].add(START, end, 4 * INTERVAL)
+
+    tasks_ordered = []
+    for ii in range(ntasks):
+        cycledefs = ['gdas', 'gfs', 'gdas,gfs'][ii % 3]
+        tasks_ordered.append((f'task{ii:05d}', cycledefs, f'/logs/CYCLE/task{ii:05d}.log'))
+    metatask_list = collections.defaultdict(list)
+    metatask_list[tasks_ordered[0][0]] = [tasks_ordered[0][0]]
+
+    return tasks_ordered, metatask_list, cycledef_group_cycles
+
+
+def make_database(path: str, tasks_ordered, cycledef_group_cycles, ncycles: int, ncycles_with_jobs: int) -> int:
+    """
+    Rocoto database with the first ncycles cycles, and the jobs of the tasks of the last ncycles_with_jobs of them
+    """
+    cycle_strings = list(cycledef_group_cycles['gdas'])[:ncycles]
+    timestamps = [int(datetime.strptime(cycle, '%Y%m%d%H%M').timestamp()) for cycle in cycle_strings]
+    gfs_cycles = set(cycledef_group_cycles['gfs'])
+
+    jobs = []
+    for cycle, timestamp in list(zip(cycle_strings, timestamps))[-ncycles_with_jobs:]:
+        for name, cycledefs, _ in tasks_ordered:
+            if cycledefs == 'gfs' and cycle not in gfs_cycles:
+                continue
+            jobs.append((str(1000000 + len(jobs)), name, timestamp, 1, 'SUCCEEDED', 0, 1, 0, 600.))
+
+    with sqlite3.connect(path) as con:
+        con.execute('CREATE TABLE cycledef (id INTEGER PRIMARY KEY, groupname VARCHAR, cycledef VARCHAR)')
+        con.execute('CREATE TABLE cycles (id INTEGER PRIMARY KEY, cycle DATETIME, activated DATETIME, '
+                    'expired DATETIME, done DATETIME)')
+        con.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY, jobid VARCHAR, taskname VARCHAR, cycle DATETIME, '
+                    'cores INTEGER, state VARCHAR, exit_status INTEGER, tries INTEGER, nunknowns INTEGER, '
+                    'duration REAL)')
+        con.executemany('INSERT INTO cycles (cycle, activated, expired, done) VALUES (?, ?, 0, ?)',
+                        [(timestamp, timestamp, timestamp) for timestamp in timestamps])
+        con.executemany('INSERT INTO jobs (jobid, taskname, cycle, cores, state, exit_status, tries, nunknowns, '
+                        'duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', jobs)
+    return len(jobs)
+
+
+def legacy_assembly(info, cycles, tasks_ordered, cycledef_group_cycles):
+    """
+    Lines of each cycle the way get_rocoto_stat assembled them with lists
+    """
+    new_info = collections.defaultdict(list)
+    job_ids = []
+    for each_cycle, lines_in_cycle in info.items():
+        for task in tasks_ordered:
+            skip_task = False
+            for each_line in lines_in_cycle:
+                if task[0] == each_line.split()[1]:
+                    job_id = each_line.split()[2]
+                    if job_id in job_ids:
+                        break
+                    cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
+                    cycledefs = task[1].split(',')
+                    if len(cycledefs) > 1:
+                        for each_cycledef in cycledefs:
+                            if cycle_string in cycledef_group_cycles[each_cycledef]:
+                                new_info[each_cycle].append(each_line)
+                                job_ids.append(job_id)
+                                skip_task = True
+                                break
+                    elif cycle_string in cycledef_group_cycles[task[1]]:
+                        new_info[each_cycle].append(each_line)
+                        job_ids.append(job_id)
+                        skip_task = True
+                        break
+            if skip_task:
+                continue
+            cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
+            line = cycle_string + ' ' * 7 + task[0] + ' - - - - -'
+            if any(cycle_string in cycledef_group_cycles[each_cycledef] for each_cycledef in task[1].split(',')):
+                new_info[each_cycle].append(line)
+    return [new_info[cycle] for cycle in sorted(cycles) if len(new_info[cycle]) != 0]
+
+
+def legacy_stat(database_file, tasks_ordered, cycledef_group_cycles):
+    # get_tasklist listed every cycle of the cycledefs
+    cycledef_group_cycles = collections.defaultdict(list, {group: list(cycles) for group, cycles in cycledef_group_cycles.items()})
+    with sqlite3.connect(database_file) as con:
+        cycles = {row[0] for row in con.execute('SELECT cycle FROM cycles')}
+        rows = con.execute('SELECT id,jobid,taskname,cycle,state,exit_status,duration,tries FROM jobs').fetchall()
+    info = collections.defaultdict(list)
+    entered_jobids = []
+    for row in rows:
+        (theid, jobid, taskname, cycle, state, exit_status, duration, tries) = tuple('-' if x is None else x for x in row)
+        if jobid in entered_jobids:
+            continue
+        entered_jobids.append(jobid)
+        info[cycle].append(f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} {taskname} {jobid} {state} "
+                           f"{exit_status} {tries} {str(duration).split('.')[0]}")
+    for every_cycle in cycles:
+        if len(info[every_cycle]) == 0:
+            info[every_cycle].append('place holder')
+    return legacy_assembly(info, cycles, tasks_ordered, cycledef_group_cycles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the status assembly of rocoto_viewer')
+    parser.add_argument('--tasks', type=int, default=10000, help='number of tasks')
+    parser.add_argument('--cycles', type=int, default=500, help='number of cycles')
+    parser.add_argument('--cycles-with-jobs', type=int, default=20, help='number of (last) cycles with jobs')
+    parser.add_argument('--new-jobs', type=int, default=100, help='jobs started between two updates')
+    parser.add_argument('--legacy', action='store_true', help='also time the legacy list-based assembly')
+    parser.add_argument('--workdir', type=str, default=None, help='directory of the synthetic database')
+    args = parser.parse_args()
+
+    rocoto_viewer.use_multiprocessing = False
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        database_file = os.path.join(workdir, 'bench.db')
+        # the workflow has one more cycle, started between two updates
+        tasks_ordered, metatask_list, cycledef_group_cycles = make_workflow(args.tasks, args.cycles + 1)
+        start = time.perf_counter()
+        njobs = make_database(database_file, tasks_ordered, cycledef_group_cycles, args.cycles, args.cycles_with_jobs)
+        print(f'{args.tasks} tasks, {args.cycles} cycles, {njobs} jobs: database created in '
+              f'{time.perf_counter() - start:.1f} s')
+
+        start = time.perf_counter()
+        params = (None, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
+        rocoto_stat = rocoto_viewer.get_rocoto_stat(params, None)[0]
+        elapsed = time.perf_counter() - start
+        nlines = sum(len(lines) for lines in rocoto_stat)
+        print(f'get_rocoto_stat: {elapsed:8.2f} s for {nlines} lines')
+
+        start = time.perf_counter()
+        rocoto_viewer.get_rocoto_stat(params, None)
+        print(f'update, no change: {time.perf_counter() - start:8.4f} s')
+
+        # the next cycle starts
+        cycle = START + args.cycles * INTERVAL
+        with sqlite3.connect(database_file) as con:
+            con.execute('INSERT INTO cycles (cycle, activated, expired, done) VALUES (?, ?, 0, 0)',
+                        (int(cycle.timestamp()), int(cycle.timestamp())))
+            con.executemany("INSERT INTO jobs (jobid, taskname, cycle, cores, state, exit_status, tries, nunknowns, "
+                            "duration) VALUES (?, ?, ?, 1, 'RUNNING', '-', 1, 0, 0.)",
+                            [(str(2000000 + ii), tasks_ordered[ii][0], int(cycle.timestamp()))
+                             for ii in range(0, min(args.new_jobs * 3, args.tasks), 3)])
+        start = time.perf_counter()
+        rocoto_stat = rocoto_viewer.get_rocoto_stat(params, None)[0]
+        print(f'update, new cycle: {time.perf_counter() - start:8.4f} s')
+        start = time.perf_counter()
+        rocoto_viewer.rocoto_status.reload()
+        if rocoto_viewer.get_rocoto_stat(params, None)[0] != rocoto_stat:
+            print('ERROR: the incremental update and a full read differ')
+            sys.exit(1)
+        print(f'full read:         {time.perf_counter() - start:8.4f} s, same status as the updates')
+
+        if args.legacy:
+            with sqlite3.connect(database_file) as con:
+                con.execute('DELETE FROM cycles WHERE cycle = ?', (int(cycle.timestamp()),))
+                con.execute('DELETE FROM jobs WHERE cycle = ?', (int(cycle.timestamp()),))
+            rocoto_viewer.rocoto_status.reload()
+            start = time.perf_counter()
+            rocoto_stat = rocoto_viewer.get_rocoto_stat(params, None)[0]
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            legacy = legacy_stat(database_file, tasks_ordered, cycledef_group_cycles)
+            legacy_elapsed = time.perf_counter() - start
+            print(f'legacy:          {legacy_elapsed:8.2f} s, speed-up {legacy_elapsed / elapsed:.1f}x')
+            if legacy != rocoto_stat:
+                print('ERROR: the legacy and indexed assemblies differ')
+                sys.exit(1)
+            print('The legacy and indexed assemblies are identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#! /bin/env python3
+'''
+Benchmarks the rendering of all UFS-weather-model templates in parm/ufs
+  for a number of contexts (e.g. ensemble members): the wxflow substitution
+  with a second scan for unrendered variables, as UFS.parse_ufs_templates
+  used to do, against the pre-split UFSTemplate.
+
+Syntax
+------
+bench_ufs_templates.py [--members N] [--repeat N]
+
+'''
+import argparse
+import os
+import re
+import sys
+import time
+
+from wxflow import Template, TemplateConstants
+
+HOMEgfs = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(HOMEgfs, 'ush', 'python', 'pygfs', 'ufswm'))
+
+from ufs import UFSTemplate
+
+
+def templates():
+    for root, _, files in os.walk(os.path.join(HOMEgfs, 'parm', 'ufs')):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'r') as fhi:
+                    yield path, fhi.read()
+            except UnicodeDecodeError:
+                continue
+
+
+def contexts(texts, members):
+    names = {match[2:-1] for text in texts for match in UFSTemplate.PATTERN.findall(text)}
+    # leave one variable out so that the missing variables are reported too
+    names = sorted(names)[1:]
+    return [{name: f"{name.lower()}_mem{mem:03d}" for name in names} for mem in range(members)]
+
+
+def render_wxflow(paths, ctxs):
+    outputs = []
+    for path in paths:
+        for ctx in ctxs:
+            with open(path, 'r') as fhi:
+                file_out = Template.substitute_structure(fhi.read(), TemplateConstants.AT_SQUARE_BRACES, ctx.get)
+            outputs.append((file_out, re.findall(r"@\[.*?\]+", file_out)))
+    return outputs
+
+
+def render_compiled(paths, ctxs):
+    outputs = []
+    for path in paths:
+        outputs.extend(UFSTemplate.from_file(path).render_many(ctxs))
+    return outputs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=80, help='number of contexts rendered per template')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions')
+    args = parser.parse_args()
+
+    files = dict(templates())
+    ctxs = contexts(files.values(), args.members)
+    print(f'{len(files)} templates, {args.members} contexts')
+
+    reference = render_wxflow(files, ctxs)
+    assert [text for text, _ in reference] == [text for text, _ in render_compiled(files, ctxs)]
+
+    print(f'{"method":<12}{"best (s)":>12}{"per render (us)":>18}')
+    for method, func in [('wxflow', render_wxflow), ('compiled', render_compiled)]:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func(files, ctxs)
+            best = min(best, time.perf_counter() - start)
+        print(f'{method:<12}{best:>12.3f}{best / (len(files) * len(ctxs)) * 1e6:>18.1f}')
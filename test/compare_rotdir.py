@@ -0,0 +1,267 @@
+#! /bin/env python3
+'''
+Compares two experiment directories (ROTDIR cycle directories or UFS run
+  directories) file by file and writes a machine-readable JSON report.
+
+Both trees are walked once. Files with the same size and content hash are
+  identical; the others are compared in a process pool by a comparator
+  chosen from their format:
+    netcdf:   variable by variable, with absolute/relative tolerances
+    grib2:    record by record
+    namelist: group and key differences (compare_f90nml)
+    text:     line differences
+    binary:   content hash only
+
+Syntax
+------
+compare_rotdir.py [-h] [--report FILE] [--jobs N] [--rtol RTOL] [--atol ATOL]
+                  [--ignore-vars FILE] [--include GLOB ...] [--exclude GLOB ...] dirA dirB
+
+'''
+import argparse
+import difflib
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+HOMEgfs = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(HOMEgfs, 'ush'))
+
+HASH_CHUNK = 16 * 1024 * 1024
+NAMELISTS = ['*.nml', 'input.nml*', 'ice_in', 'namelist*']
+TEXT_SUFFIXES = ['.txt', '.log', '.yaml', '.yml', '.rc', '.configure', '.list', '.lst', '.csv']
+TEXT_NAMES = ['model_configure', 'diag_table', 'field_table', 'data_table', 'MOM_input', 'storms.*', 'trak.*']
+
+
+def walk(root: str) -> Dict[str, int]:
+    '''Relative path and size of every file under root, following symbolic links to files'''
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                files[os.path.relpath(path, root)] = os.stat(path).st_size
+            except FileNotFoundError:
+                continue  # dangling link
+    return files
+
+
+def file_hash(path: str) -> str:
+    '''Streaming blake2b hash of a file'''
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_format(path: str) -> str:
+    '''Format of a file from its magic number, then its name'''
+    with open(path, 'rb') as fh:
+        magic = fh.read(8)
+    if magic[:3] == b'CDF' or magic[:8] == b'\x89HDF\r\n\x1a\n':
+        return 'netcdf'
+    if magic[:4] == b'GRIB':
+        return 'grib2'
+    name = os.path.basename(path)
+    if any(fnmatch.fnmatch(name, pattern) for pattern in NAMELISTS):
+        return 'namelist'
+    if os.path.splitext(name)[1] in TEXT_SUFFIXES or any(fnmatch.fnmatch(name, pattern) for pattern in TEXT_NAMES):
+        return 'text'
+    try:
+        with open(path, 'r') as fh:
+            fh.read(4096)
+        return 'text'
+    except UnicodeDecodeError:
+        return 'binary'
+
+
+def compare_netcdf(fileA: str, fileB: str, rtol: float = 0., atol: float = 0., ignore: Optional[List[str]] = None) -> Dict:
+    '''Variable-wise comparison of the data of two netCDF files'''
+    from netCDF4 import Dataset
+
+    ignore = set(ignore or [])
+    details = {'variables': {}}
+    with Dataset(fileA, 'r') as ncA, Dataset(fileB, 'r') as ncB:
+        varsA, varsB = set(ncA.variables) - ignore, set(ncB.variables) - ignore
+        details['only_in_a'] = sorted(varsA - varsB)
+        details['only_in_b'] = sorted(varsB - varsA)
+        for name in sorted(varsA & varsB):
+            varA, varB = ncA.variables[name], ncB.variables[name]
+            if varA.shape != varB.shape:
+                details['variables'][name] = {'shape': [list(varA.shape), list(varB.shape)]}
+                continue
+            diff = _compare_arrays(varA, varB, rtol, atol)
+            if diff is not None:
+                details['variables'][name] = diff
+    identical = not (details['variables'] or details['only_in_a'] or details['only_in_b'])
+    return {'identical': identical, 'details': details}
+
+
+def _slabs(shape: Tuple[int, ...]) -> Iterator[tuple]:
+    '''Slices along the first dimension of a variable, whole variable for scalars and 1D variables'''
+    if len(shape) < 2:
+        yield ()
+        return
+    for ii in range(shape[0]):
+        yield (ii,)
+
+
+def _compare_arrays(varA, varB, rtol: float, atol: float) -> Optional[Dict]:
+    ndiff, max_abs, max_rel, count = 0, 0., 0., 0
+    for index in _slabs(varA.shape):
+        dataA, dataB = varA[index], varB[index]
+        if not np.issubdtype(np.asarray(dataA).dtype, np.number):
+            if not np.array_equal(np.asarray(dataA), np.asarray(dataB)):
+                return {'ndiff': None, 'message': 'non-numeric data differ'}
+            continue
+        maskA, maskB = np.ma.getmaskarray(dataA), np.ma.getmaskarray(dataB)
+        a = np.ma.getdata(dataA).astype(np.float64)
+        b = np.ma.getdata(dataB).astype(np.float64)
+        valid = ~(maskA | maskB)
+        differ = (maskA != maskB) | (valid & ~np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True))
+        count += a.size
+        if differ.any():
+            ndiff += int(differ.sum())
+            both = valid & differ & np.isfinite(a) & np.isfinite(b)
+            if both.any():
+                abs_diff = np.abs(a[both] - b[both])
+                max_abs = max(max_abs, float(abs_diff.max()))
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rel = abs_diff / np.abs(a[both])
+                max_rel = max(max_rel, float(np.nanmax(np.where(np.isfinite(rel), rel, np.nan), initial=0.)))
+    if ndiff == 0:
+        return None
+    return {'ndiff': ndiff, 'size': count, 'max_abs_diff': max_abs, 'max_rel_diff': max_rel}
+
+
+def compare_grib2(fileA: str, fileB: str, **kwargs) -> Dict:
+    '''Record-wise comparison of two GRIB2 files (diff_grib_files), records are matched in order'''
+    from diff_grib_files import compare_records
+
+    details = compare_records(fileA, fileB)
+    identical = details['nonidentical'] == 0 and details['records'][0] == details['records'][1]
+    return {'identical': identical, 'details': details}
+
+
+def compare_namelist(fileA: str, fileB: str, **kwargs) -> Dict:
+    '''Group and key differences of two Fortran namelists, both ways'''
+    from compare_f90nml import diff_dicts, get_dict_from_nml
+
+    nmlA, nmlB = get_dict_from_nml(fileA), get_dict_from_nml(fileB)
+    details = {'a_vs_b': diff_dicts(nmlA, nmlB), 'b_vs_a': diff_dicts(nmlB, nmlA)}
+    return {'identical': not (details['a_vs_b'] or details['b_vs_a']), 'details': details}
+
+
+def compare_text(fileA: str, fileB: str, max_lines: int = 200, **kwargs) -> Dict:
+    '''Line differences of two text files'''
+    with open(fileA, 'r', errors='replace') as fa, open(fileB, 'r', errors='replace') as fb:
+        diff = list(difflib.unified_diff(fa.readlines(), fb.readlines(), 'a', 'b', n=0))
+    changed = [line.rstrip('\n') for line in diff if line[:1] in '+-' and line[:3] not in ('---', '+++')]
+    return {'identical': not changed, 'details': {'nlines': len(changed), 'diff': changed[:max_lines]}}
+
+
+COMPARATORS = {'netcdf': compare_netcdf, 'grib2': compare_grib2, 'namelist': compare_namelist, 'text': compare_text}
+
+
+def compare_file(rel: str, dirA: str, dirB: str, options: Dict) -> Tuple[str, Dict]:
+    '''Compare one file of both trees: hash fast path, then the comparator of its format'''
+    fileA, fileB = os.path.join(dirA, rel), os.path.join(dirB, rel)
+    start = time.perf_counter()
+    result = {'format': None}
+    try:
+        same_size = os.path.getsize(fileA) == os.path.getsize(fileB)
+        if same_size and file_hash(fileA) == file_hash(fileB):
+            result.update({'status': 'identical', 'method': 'hash'})
+        else:
+            fmt = file_format(fileA)
+            result['format'] = fmt
+            if fmt in COMPARATORS:
+                outcome = COMPARATORS[fmt](fileA, fileB, **options.get(fmt, {}))
+                result.update({'status': 'equivalent' if outcome['identical'] else 'different',
+                               'method': fmt, 'details': outcome['details']})
+            else:
+                result.update({'status': 'different', 'method': 'hash'})
+    except Exception as exc:
+        result.update({'status': 'error', 'message': f'{type(exc).__name__}: {exc}'})
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return rel, result
+
+
+def compare_trees(dirA: str, dirB: str, jobs: int = 4, include: Optional[List[str]] = None,
+                  exclude: Optional[List[str]] = None, options: Optional[Dict] = None) -> Dict:
+    '''
+    Compare two directory trees and return the report
+
+    Statuses are identical (same bytes), equivalent (different bytes, same content for the
+    comparator, e.g. within tolerances), different, error, only_in_a and only_in_b.
+    '''
+    start = time.perf_counter()
+    filesA, filesB = walk(dirA), walk(dirB)
+
+    def selected(rel):
+        if include and not any(fnmatch.fnmatch(rel, pattern) for pattern in include):
+            return False
+        return not (exclude and any(fnmatch.fnmatch(rel, pattern) for pattern in exclude))
+
+    common = sorted(rel for rel in filesA if rel in filesB and selected(rel))
+    files = {rel: {'status': 'only_in_a'} for rel in sorted(filesA) if rel not in filesB and selected(rel)}
+    files.update({rel: {'status': 'only_in_b'} for rel in sorted(filesB) if rel not in filesA and selected(rel)})
+
+    # largest files first so that they do not end the run alone
+    order = sorted(common, key=lambda rel: -filesA[rel])
+    with ProcessPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for rel, result in executor.map(compare_file, order, [dirA] * len(order), [dirB] * len(order),
+                                        [options or {}] * len(order), chunksize=1):
+            files[rel] = result
+
+    files = dict(sorted(files.items()))
+    summary = {}
+    for result in files.values():
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return {'dirA': os.path.abspath(dirA), 'dirB': os.path.abspath(dirB),
+            'seconds': round(time.perf_counter() - start, 3), 'summary': summary, 'files': files}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dirA', help='first (baseline) directory')
+    parser.add_argument('dirB', help='second directory')
+    parser.add_argument('--report', default=None, help='JSON report file, default is stdout')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='number of files compared at once')
+    parser.add_argument('--rtol', type=float, default=0., help='relative tolerance of the netCDF comparison')
+    parser.add_argument('--atol', type=float, default=0., help='absolute tolerance of the netCDF comparison')
+    parser.add_argument('--ignore-vars', default=None,
+                        help='file with netCDF variables to skip, one per line (e.g. coordinates.lst)')
+    parser.add_argument('--include', nargs='*', default=None, help='only compare relative paths matching these globs')
+    parser.add_argument('--exclude', nargs='*', default=None, help='skip relative paths matching these globs')
+    args = parser.parse_args(argv)
+
+    ignore = []
+    if args.ignore_vars:
+        with open(args.ignore_vars) as fh:
+            ignore = [line.strip() for line in fh if line.strip()]
+    options = {'netcdf': {'rtol': args.rtol, 'atol': args.atol, 'ignore': ignore}}
+
+    report = compare_trees(args.dirA, args.dirB, jobs=args.jobs, include=args.include,
+                           exclude=args.exclude, options=options)
+    if args.report:
+        with open(args.report, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    print(f"{report['summary']} in {report['seconds']} s", file=sys.stderr)
+
+    return 0 if set(report['summary']) <= {'identical', 'equivalent'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,16 @@
 #! /bin/env python3
 '''
-Compares two grib2 files and print any variables that have a
-  non-identity correlation.
+Compares two grib2 files record by record and print any variables that
+  differ.
+
+Both files are memory-mapped and split into GRIB2 messages. Records whose
+  grid, product, packing and data sections are byte-identical are skipped;
+  only the records that differ are decoded with wgrib2 to check their
+  correlation, minimum and maximum (so that a constant offset is caught too).
 
 Syntax
 ------
-diff_grib_files.py fileA fileB
+diff_grib_files.py [--jobs N] fileA fileB [fileA2 fileB2 ...]
 
 Parameters
 ----------
@@ -13,13 +18,31 @@ fileA: string
     Path to the first grib2 file
 fileB: string
     Path to the second grib2 file
+jobs: int, optional
+    Number of file pairs compared at once
 
 '''
+import argparse
+import hashlib
+import mmap
+import os
 import re
-import sys
+import shutil
 import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ush', 'python', 'pygfs', 'utils'))
 
-# TODO - Update to also check the min just in case the grib files have a constant offset
+from grib2_index import index_records, inventory_line, scan_messages
+
+# Sections hashed to tell whether two records hold the same field: grid definition,
+# product definition, data representation, bit-map and data
+HASHED_SECTIONS = (3, 4, 5, 6, 7)
+
+WGRIB2 = os.environ.get('WGRIB2', 'wgrib2')
 
 
 def count_nonid_corr(test_string: str, quiet=False):
@@ -65,12 +88,184 @@ def count_nonid_corr(test_string: str, quiet=False):
     return count
 
 
-if __name__ == '__main__':
-    fileA = sys.argv[0]
-    fileB = sys.argv[1]
+def message_digests(buf) -> List[Tuple[int, int, bytes]]:
+    '''
+    Offset, length and digest of the hashed sections of each GRIB2 message of a buffer
+
+    Parameters
+    ----------
+    buf: bytes-like
+        Content of a grib2 file
+
+    Returns
+    -------
+    list of (int, int, bytes)
+    '''
+    digests = []
+    for offset, length, _, sections in scan_messages(buf):
+        digest = hashlib.blake2b(digest_size=20)
+        for sec_num, sec_off, sec_len in sections:
+            if sec_num in HASHED_SECTIONS:
+                digest.update(buf[offset + sec_off:offset + sec_off + sec_len])
+        digests.append((offset, length, digest.digest()))
+    return digests
+
+
+def parse_stats(output: str) -> List[Dict]:
+    '''
+    Parse the wgrib2 output of decode_records, one line per record:
+      n:offset:var:lev:min=..:max=..:min=..:max=..:rpn_corr=..
+
+    Returns
+    -------
+    list of dict
+        field, min and max of both files and correlation of each record
+    '''
+    stats = []
+    for line in output.splitlines():
+        if 'rpn_corr=' not in line:
+            continue
+        items = line.split(':')
+        values = {'min': [], 'max': []}
+        corr = None
+        for item in items[2:]:
+            key, _, value = item.partition('=')
+            if key in values:
+                values[key].append(float(value))
+            elif key == 'rpn_corr':
+                corr = float(value)
+        stats.append({'field': ':'.join(item for item in items[2:4]), 'corr': corr,
+                      'min': values['min'], 'max': values['max']})
+    return stats
+
+
+def decode_records(messagesA: List[bytes], messagesB: List[bytes]) -> Optional[List[Dict]]:
+    '''
+    Correlation, minimum and maximum of pairs of records, decoded by a single wgrib2 call
+      on files holding only these records. None if wgrib2 is not available.
+    '''
+    if shutil.which(WGRIB2) is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmpdir:
+        subA, subB = os.path.join(tmpdir, 'a.grib2'), os.path.join(tmpdir, 'b.grib2')
+        for path, messages in (subA, messagesA), (subB, messagesB):
+            with open(path, 'wb') as fh:
+                fh.writelines(messages)
+        cmd = [WGRIB2, subA, '-var', '-lev', '-min', '-max', '-rpn', 'sto_1',
+               '-import_grib', subB, '-min', '-max', '-rpn', 'rcl_1:print_corr']
+        output = subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout.decode('utf-8')
+    return parse_stats(output)
+
+
+def values_differ(record: Dict) -> bool:
+    '''
+    Whether a differing record has different values: a non-identity correlation or
+      a different minimum or maximum, or no statistics because it was not decoded
+    '''
+    if 'corr' not in record:
+        return True
+    return record['corr'] != 1.0 or record['min'][:1] != record['min'][1:] or record['max'][:1] != record['max'][1:]
 
-    wgrib2_cmd = f"wgrib2 {fileA} -var -rpn 'sto_1' -import_grib {fileB} -rpn 'rcl_1:print_corr'"
 
-    string = subprocess.run(wgrib2_cmd, shell=True, stdout=subprocess.PIPE).stdout.decode("utf-8")
+def compare_records(fileA: str, fileB: str) -> Dict:
+    '''
+    Compare two grib2 files record by record, records are matched in order
+
+    Parameters
+    ----------
+    fileA: str
+        Path to the first grib2 file
+    fileB: str
+        Path to the second grib2 file
+
+    Returns
+    -------
+    dict
+        records: number of records of each file
+        identical: number of byte-identical records
+        different: record number, field and (if decoded) statistics of each differing record
+        nonidentical: number of differing records whose values differ, or that could not be decoded
+    '''
+    with open(fileA, 'rb') as fa, open(fileB, 'rb') as fb, \
+            mmap.mmap(fa.fileno(), 0, access=mmap.ACCESS_READ) as bufA, \
+            mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as bufB:
+        digestsA, digestsB = message_digests(bufA), message_digests(bufB)
+        differ = [ii for ii, (recA, recB) in enumerate(zip(digestsA, digestsB)) if recA[2] != recB[2]]
+
+        different = []
+        if differ:
+            names = [inventory_line(1, field).split(':', 3)[3].rstrip(':')
+                     for _, field in index_records(bufA) if field['field_number'] == 1]
+            stats = decode_records([bufA[digestsA[ii][0]:digestsA[ii][0] + digestsA[ii][1]] for ii in differ],
+                                   [bufB[digestsB[ii][0]:digestsB[ii][0] + digestsB[ii][1]] for ii in differ])
+            for nn, ii in enumerate(differ):
+                record = {'record': ii + 1, 'field': names[ii]}
+                if stats is not None and nn < len(stats):
+                    record.update({key: stats[nn][key] for key in ('corr', 'min', 'max')})
+                different.append(record)
+
+    return {'records': [len(digestsA), len(digestsB)],
+            'identical': min(len(digestsA), len(digestsB)) - len(differ),
+            'different': different,
+            'nonidentical': sum(map(values_differ, different))}
+
+
+def compare_files(pairs: List[Tuple[str, str]], max_workers: int = 4) -> List[Dict]:
+    '''
+    Compare many pairs of grib2 files concurrently
+
+    Parameters
+    ----------
+    pairs: list of (str, str)
+        Paths of the files to compare
+    max_workers: int, optional
+        Number of pairs compared at once
+
+    Returns
+    -------
+    list of dict
+        Result of compare_records for each pair, in order
+    '''
+    if len(pairs) == 1 or max_workers <= 1:
+        return [compare_records(fileA, fileB) for fileA, fileB in pairs]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(pairs))) as executor:
+        return list(executor.map(compare_records, *zip(*pairs)))
+
+
+def print_result(result: Dict) -> int:
+    '''
+    Print the differing variables of a comparison and return how many there are
+    '''
+    nrecA, nrecB = result['records']
+    if nrecA != nrecB:
+        print(f"Number of records differ: {nrecA} vs {nrecB}")
+    for record in result['different']:
+        if 'corr' not in record:
+            print(f"{record['field']}: differs (not decoded)")
+        elif record['corr'] != 1.0:
+            print(f"{record['field']}: corr={record['corr']}")
+        elif record['min'][:1] != record['min'][1:] or record['max'][:1] != record['max'][1:]:
+            print(f"{record['field']}: min={record['min']} max={record['max']}")
+
+    count = result['nonidentical']
+    if count == 0 and nrecA == nrecB:
+        print("All fields are identical!")
+    else:
+        print(f"{count} variables are different")
+    return count + abs(nrecA - nrecB)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='pairs of grib2 files to compare: fileA fileB [fileA2 fileB2 ...]')
+    parser.add_argument('--jobs', type=int, default=4, help='number of pairs compared at once')
+    args = parser.parse_args()
+
+    if len(args.files) % 2:
+        parser.error('files must be given in pairs')
+    pairs = list(zip(args.files[::2], args.files[1::2]))
 
-    count_nonid_corr(string)
+    for (fileA, fileB), result in zip(pairs, compare_files(pairs, args.jobs)):
+        if len(pairs) > 1:
+            print(f"=== {fileA} | {fileB} ===")
+        print_result(result)
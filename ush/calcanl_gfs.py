@@ -6,9 +6,10 @@
 # on GFS gaussian grid for downstream users
 import os
 import shutil
-import subprocess
 import sys
 import gsi_utils
+from job_orchestrator import Step, run_steps
+from launcher import SCHEDULERS, Launcher, Placement
 from collections import OrderedDict
 import datetime
 from wxflow import cast_as_dtype
@@ -39,7 +40,7 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                 gsi_utils.link_file(RunDir + '/siganl', CalcAnlDir + '/anl.06')
                 gsi_utils.copy_file(ExecChgresInc, CalcAnlDir + '/chgres_inc.x')
                 # for ensemble res analysis
-                if Run in ["gdas", "gfs"]:
+                if run in ["gdas", "gfs"]:
                     CalcAnlDir = RunDir + '/calcanl_ensres_' + format(fh, '02')
                     if not os.path.exists(CalcAnlDir):
                         gsi_utils.make_dir(CalcAnlDir)
@@ -138,89 +139,26 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
     ExecCMDLevs = ExecCMDMPI.replace("$ncmd", str(levs))
     ExecCMDMPI13 = ExecCMDMPI.replace("$ncmd", str(13))
 
-    # are we using mpirun with lsf, srun, or aprun with Cray?
+    # discover the hosts and task slots of the job from the scheduler behind the launcher
     launcher = ExecCMDMPI.split(' ')[0]
-    if launcher == 'mpirun':
-        hostfile = os.getenv('LSB_DJOB_HOSTFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'mpirun -np ' + str(nFH) + ' --hostfile hosts'
-        tasks = int(os.getenv('LSB_DJOB_NUMPROC', 1))
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'mpirun -np ' + str(tasks) + ' --hostfile hosts'
-            ExecCMDMPILevs_nohost = 'mpirun -np ' + str(tasks)
-        else:
-            ExecCMDMPILevs_host = 'mpirun -np ' + str(levs) + ' --hostfile hosts'
-            ExecCMDMPILevs_nohost = 'mpirun -np ' + str(levs)
-        ExecCMDMPI1_host = 'mpirun -np 1 --hostfile hosts'
-        ExecCMDMPI13_host = 'mpirun -np 13 --hostfile hosts'
-    elif launcher == 'mpiexec':
-        hostfile = os.getenv('PBS_NODEFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'mpiexec -l -n ' + str(nFH)
-        tasks = int(os.getenv('ntasks_calcanl', 1))
-        print('nhosts,tasks=', nhosts, tasks)
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'mpiexec -l -n ' + str(tasks)
-            ExecCMDMPILevs_nohost = 'mpiexec -l -n ' + str(tasks)
-        else:
-            ExecCMDMPILevs_host = 'mpiexec -l -n ' + str(levs)
-            ExecCMDMPILevs_nohost = 'mpiexec -l -n ' + str(levs)
-        ExecCMDMPI1_host = 'mpiexec -l -n 1 --cpu-bind depth --depth ' + str(NThreads)
-        ExecCMDMPI13_host = 'mpiexec -l -n 13 --cpu-bind depth --depth ' + str(NThreads)
-    elif launcher == 'srun':
-        nodes = os.getenv('SLURM_JOB_NODELIST', '')
-        hosts_tmp = subprocess.check_output('scontrol show hostnames ' + nodes, shell=True)
-        if (sys.version_info > (3, 0)):
-            hosts_tmp = hosts_tmp.decode('utf-8')
-            hosts_tmp = str(hosts_tmp).splitlines()
-            hosts_tmp = [x.strip() for x in hosts_tmp]
-        else:
-            hosts_tmp = hosts_tmp.strip()
-            hosts_tmp = str(hosts_tmp).splitlines()
-            hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'srun -n ' + str(nFH) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-        # need to account for when fewer than LEVS tasks are available
-        tasks = int(os.getenv('SLURM_NPROCS', 1))
-        if levs > tasks:
-            ExecCMDMPILevs_host = 'srun -n ' + str(tasks) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-            ExecCMDMPILevs_nohost = 'srun -n ' + str(tasks) + ' --verbose --export=ALL'
-        else:
-            ExecCMDMPILevs_host = 'srun -n ' + str(levs) + ' --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-            ExecCMDMPILevs_nohost = 'srun -n ' + str(levs) + ' --verbose --export=ALL'
-        ExecCMDMPI1_host = 'srun -n 1 --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-        ExecCMDMPI13_host = 'srun -n 13 --verbose --export=ALL -c 1 --distribution=arbitrary --cpu-bind=cores'
-    elif launcher == 'aprun':
-        hostfile = os.getenv('LSB_DJOB_HOSTFILE', '')
-        with open(hostfile) as f:
-            hosts_tmp = f.readlines()
-        hosts_tmp = [x.strip() for x in hosts_tmp]
-        hosts = []
-        [hosts.append(x) for x in hosts_tmp if x not in hosts]
-        nhosts = len(hosts)
-        ExecCMDMPI_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n ' + str(nFH)
-        ExecCMDMPILevs_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n ' + str(levs)
-        ExecCMDMPILevs_nohost = 'aprun -d ' + str(NThreads) + ' -n ' + str(levs)
-        ExecCMDMPI1_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n 1'
-        ExecCMDMPI13_host = 'aprun -l hosts -d ' + str(NThreads) + ' -n 13'
-    else:
+    if launcher not in SCHEDULERS:
         print('unknown MPI launcher. Failure.')
         sys.exit(1)
+    mpi = Launcher(launcher)
+    hosts = mpi.allocation.hosts
+    nhosts = len(hosts)
+    tasks = mpi.allocation.nslots
+    print('nhosts,tasks=', nhosts, tasks)
+    # need to account for when fewer than LEVS tasks are available
+    ExecCMDMPILevs_nohost = mpi.command(min(levs, tasks), NThreads)[0]
+
+    # build the steps: chgres_inc for each increment (on as few hosts as hold its 13 tasks, two on xjet),
+    # then the full resolution analysis, and the ensemble resolution analyses that
+    # only depend on the increment and guess files; the analyses use the whole allocation
+    steps = []
+    base_env = {key: value for key, value in os.environ.items() if key != 'SLURM_HOSTFILE'}
+    xjet = launcher == 'srun' and os.getenv('SLURM_JOB_PARTITION', '') == 'xjet'
 
-    # generate the full resolution analysis
-    ihost = 0
     # interpolate increment to full background resolution
     for fh in IAUHH:
         # first check to see if increment file exists
@@ -236,34 +174,20 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                                  "outfile": "'inc.fullres." + format(fh, '02') + "'",
                                  }
             gsi_utils.write_nml(namelist, CalcAnlDir + '/fort.43')
+            print('interp_inc', fh, namelist)
 
-            if ihost >= nhosts:
-                ihost = 0
-            with open(CalcAnlDir + '/hosts', 'w') as hostfile:
-                hostfile.write(hosts[ihost] + '\n')
-                if launcher == 'srun':  # need to write host per task not per node for slurm
+            def place_chgres_inc(step, CalcAnlDir=CalcAnlDir):
+                if xjet:
                     # For xjet, each instance of chgres_inc must run on two nodes each
-                    if os.getenv('SLURM_JOB_PARTITION', '') == 'xjet':
-                        for a in range(0, 4):
-                            hostfile.write(hosts[ihost] + '\n')
-                        ihost += 1
-                        for a in range(0, 5):
-                            hostfile.write(hosts[ihost] + '\n')
-                    for a in range(0, 12):  # need 12 more of the same host for the 13 tasks for chgres_inc
-                        hostfile.write(hosts[ihost] + '\n')
-            if launcher == 'srun':
-                os.environ['SLURM_HOSTFILE'] = CalcAnlDir + '/hosts'
-            print('interp_inc', fh, namelist)
-            job = subprocess.Popen(ExecCMDMPI13_host + ' ' + CalcAnlDir + '/chgres_inc.x', shell=True, cwd=CalcAnlDir)
-            print(ExecCMDMPI13_host + ' ' + CalcAnlDir + '/chgres_inc.x submitted on ' + hosts[ihost])
-            sys.stdout.flush()
-            ec = job.wait()
-            if ec != 0:
-                print('Error with chgres_inc.x at forecast hour: f' + format(fh, '03'))
-                print('Error with chgres_inc.x, exit code=' + str(ec))
-                print(locals())
-                sys.exit(ec)
-            ihost += 1
+                    placement = Placement(step.name, [step.hosts[0]] * 5 + [step.hosts[-1]] * 8)
+                else:
+                    placement = mpi.place(step.name, 13, step.hosts)
+                cmd, env = mpi.command(13, NThreads, placement, CalcAnlDir + '/hosts')
+                step.cmd = cmd + ' ' + CalcAnlDir + '/chgres_inc.x'
+                step.env = dict(base_env, **env)
+
+            steps.append(Step('chgres_inc_f' + format(fh, '03'), CalcAnlDir + '/chgres_inc.x', CalcAnlDir,
+                              nhosts=2 if xjet else mpi.nhosts_for(13), setup=place_chgres_inc, env=base_env))
         else:
             print('f' + format(fh, '03') + ' is in $IAUFHRS but increment file is missing. Skipping.')
 
@@ -280,27 +204,12 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                          }
 
     gsi_utils.write_nml(namelist, CalcAnlDir6 + '/calc_analysis.nml')
-
-    # run the executable
-    if ihost >= nhosts - 1:
-        ihost = 0
-    if launcher == 'srun':
-        del os.environ['SLURM_HOSTFILE']
     print('fullres_calc_anl', namelist)
-    fullres_anl_job = subprocess.Popen(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x', shell=True, cwd=CalcAnlDir6)
-    print(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x submitted')
-
-    sys.stdout.flush()
-    exit_fullres = fullres_anl_job.wait()
-    sys.stdout.flush()
-    if exit_fullres != 0:
-        print('Error with calc_analysis.x for deterministic resolution, exit code=' + str(exit_fullres))
-        print(locals())
-        sys.exit(exit_fullres)
+    steps.append(Step('fullres_calc_anl', ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x',
+                      CalcAnlDir6, nhosts=0, deps=[step.name for step in steps], env=base_env))
 
     # compute determinstic analysis on ensemble resolution
-    if Run in ["gdas", "gfs"]:
-        chgres_jobs = []
+    if run in ["gdas", "gfs"]:
         for fh in IAUHH:
             # first check to see if guess file exists
             CalcAnlDir6 = RunDir + '/calcanl_ensres_06'
@@ -317,26 +226,25 @@ def calcanl_gfs(DoIAU, l4DEnsVar, Write4Danl, ComOut, APrefix,
                                      "fhr": fh,
                                      "jedi": python2fortran_bool[JEDI],
                                      }
-
-                gsi_utils.write_nml(namelist, CalcAnlDir6 + '/calc_analysis.nml')
-
-                # run the executable
-                if ihost > nhosts - 1:
-                    ihost = 0
                 print('ensres_calc_anl', namelist)
-                ensres_anl_job = subprocess.Popen(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x', shell=True, cwd=CalcAnlDir6)
-                print(ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x submitted')
 
-                sys.stdout.flush()
-                # check on analysis steps
-                exit_ensres = ensres_anl_job.wait()
-                if exit_ensres != 0:
-                    print('Error with calc_analysis.x for ensemble resolution, exit code=' + str(exit_ensres))
-                    print(locals())
-                    sys.exit(exit_ensres)
+                # the ensemble resolution analyses share a directory, the namelist is written at launch;
+                # they use the whole allocation so they never run at the same time
+                def write_namelist(step, namelist=namelist, CalcAnlDir6=CalcAnlDir6):
+                    gsi_utils.write_nml(namelist, CalcAnlDir6 + '/calc_analysis.nml')
+
+                steps.append(Step('ensres_calc_anl_f' + format(fh, '03'), ExecCMDMPILevs_nohost + ' ' + CalcAnlDir6 + '/calc_anl.x',
+                                  CalcAnlDir6, nhosts=0, setup=write_namelist, env=base_env))
             else:
                 print('f' + format(fh, '03') + ' is in $IAUFHRS but ensemble resolution guess file is missing. Skipping.')
 
+    sys.stdout.flush()
+    ec = run_steps(steps, hosts)
+    if ec != 0:
+        print('Error with calcanl_gfs, exit code=' + str(ec))
+        print(locals())
+        sys.exit(ec)
+
     print('calcanl_gfs successfully completed at: ', datetime.datetime.utcnow())
     print(locals())
 
@@ -22,14 +22,14 @@ def get_dict_from_nml(filename: str) -> Dict:
     return json.loads(json.dumps(f90nml.read(filename).todict()))
 
 
-def compare_dicts(dict1: Dict, dict2: Dict, path: str = "") -> None:
+def diff_dicts(dict1: Dict, dict2: Dict, path: str = "") -> Dict:
     """
-    Compare 2 dictionaries.
+    Differences between 2 dictionaries.
     This is done by looping over keys in dictionary 1 and searching for them
     in dictionary 2.
     If a matching key is found, the values are compared.
     If a matching key is not found, it is set to as UNDEFINED.
-    Note: A reverse match is not performed in this method.  For reverse matching, use the -r option in the main driver.
+    Note: A reverse match is not performed in this method.
     Note: This is a recursive method to handle nested dictionaries.
     Parameters
     ----------
@@ -42,14 +42,16 @@ def compare_dicts(dict1: Dict, dict2: Dict, path: str = "") -> None:
            key (if nested dictionary)
     Returns
     -------
-    None
+    result: Dict
+            Differences as {path: {key: [value1, value2]}}
     """
 
     result = dict()
     for kk in dict1.keys():  # Loop over all keys of first dictionary
         if kk in dict2.keys():  # kk is present in dict2
             if isinstance(dict1[kk], dict):  # nested dictionary, go deeper
-                compare_dicts(dict1[kk], dict2[kk], path=kk)
+                for nested_path, diffs in diff_dicts(dict1[kk], dict2[kk], path=kk).items():
+                    result.setdefault(nested_path, dict()).update(diffs)
             else:
                 if dict1[kk] != dict2[kk]:
                     if path not in result:
@@ -61,6 +63,27 @@ def compare_dicts(dict1: Dict, dict2: Dict, path: str = "") -> None:
                 result[tt] = dict()
             result[tt][kk] = [dict1[kk], 'UNDEFINED']
 
+    return result
+
+
+def compare_dicts(dict1: Dict, dict2: Dict, path: str = "") -> None:
+    """
+    Compare 2 dictionaries and print the differences.
+    Note: A reverse match is not performed in this method.  For reverse matching, use the -r option in the main driver.
+    Parameters
+    ----------
+    dict1: Dict
+           First dictionary
+    dict2: Dict
+           Second dictionary
+    path:  str (optional)
+           default: ""
+           key (if nested dictionary)
+    Returns
+    -------
+    None
+    """
+
     def _print_diffs(diff_dict: Dict) -> None:
         """
         Print the differences between the two dictionaries to stdout
@@ -80,7 +103,7 @@ def compare_dicts(dict1: Dict, dict2: Dict, path: str = "") -> None:
                 print(
                     f"{kk:>{max_len+2}} : {' | '.join(map(str, diff_dict[path][kk]))}")
 
-    _print_diffs(result)
+    _print_diffs(diff_dicts(dict1, dict2, path))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# job_orchestrator.py
+# run the executables of a job as a dependency graph of steps,
+# launching the steps whose dependencies are done concurrently
+# on the hosts of the job allocation
+import asyncio
+import datetime
+import sys
+import time
+
+
+class Step:
+    """
+    One executable of a job
+
+    name     : unique name of the step
+    cmd      : shell command
+    cwd      : directory to run the command in
+    nhosts   : number of hosts the step needs, 0 for the whole allocation
+    deps     : names of the steps that must succeed before this one starts
+    setup    : optional callable(step) run just before the launch, once step.hosts is assigned,
+               e.g. to write a namelist or a hostfile; it may update step.cmd and step.env
+    env      : environment of the command, the current environment if None
+    """
+
+    def __init__(self, name, cmd, cwd, nhosts=1, deps=None, setup=None, env=None):
+        self.name = name
+        self.cmd = cmd
+        self.cwd = cwd
+        self.nhosts = nhosts
+        self.deps = list(deps or [])
+        self.setup = setup
+        self.env = env
+        self.hosts = []
+        self.returncode = None
+        self.start = None
+        self.end = None
+
+    @property
+    def elapsed(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+async def _run_step(step):
+    if step.setup is not None:
+        step.setup(step)
+    print(f'{step.name}: {step.cmd} submitted on {",".join(step.hosts)} at {datetime.datetime.utcnow()}')
+    sys.stdout.flush()
+    step.start = time.time()
+    proc = await asyncio.create_subprocess_shell(step.cmd, cwd=step.cwd, env=step.env)
+    step.returncode = await proc.wait()
+    step.end = time.time()
+    print(f'{step.name}: finished with exit code {step.returncode} in {step.elapsed:.1f} s')
+    sys.stdout.flush()
+    return step
+
+
+async def _run_graph(steps, hosts):
+    names = [step.name for step in steps]
+    for step in steps:
+        unknown = [dep for dep in step.deps if dep not in names]
+        if unknown:
+            raise ValueError(f'step {step.name} depends on unknown steps {unknown}')
+
+    pending = list(steps)
+    done = set()
+    free = list(hosts)
+    running = {}
+    failed = False
+
+    while pending or running:
+        # launch, in order, every ready step that fits on the free hosts
+        if not failed:
+            for step in list(pending):
+                if not all(dep in done for dep in step.deps):
+                    continue
+                nhosts = len(hosts) if step.nhosts <= 0 else min(step.nhosts, len(hosts))
+                if nhosts > len(free):
+                    continue
+                step.hosts, free = free[:nhosts], free[nhosts:]
+                pending.remove(step)
+                running[asyncio.ensure_future(_run_step(step))] = step
+            if pending and not running:
+                raise RuntimeError(f'steps {[step.name for step in pending]} can not be scheduled')
+        elif not running:
+            break
+
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for future in finished:
+            step = running.pop(future)
+            free.extend(step.hosts)
+            if future.exception() is not None:
+                raise future.exception()
+            if step.returncode == 0:
+                done.add(step.name)
+            else:
+                # let the running steps finish but do not launch any more
+                failed = True
+
+    return steps
+
+
+def run_steps(steps, hosts):
+    """
+    Run the steps concurrently on the hosts, respecting their dependencies
+
+    Prints the timing and exit code of each step and returns the first non-zero
+    exit code, in the order of the steps, or 0
+    """
+    hosts = list(hosts) or ['localhost']
+    wall_start = time.time()
+    asyncio.run(_run_graph(steps, hosts))
+    wall = time.time() - wall_start
+
+    print(f'{"step":<32}{"hosts":>6}{"start (s)":>11}{"elapsed (s)":>13}{"exit code":>11}')
+    for step in steps:
+        if step.start is None:
+            print(f'{step.name:<32}{"":>6}{"":>11}{"":>13}{"not run":>11}')
+            continue
+        print(f'{step.name:<32}{len(step.hosts):>6}{step.start - wall_start:>11.1f}'
+              f'{step.elapsed:>13.1f}{step.returncode:>11}')
+    print(f'total walltime {wall:.1f} s, sum of the step times '
+          f'{sum(step.elapsed for step in steps if step.elapsed is not None):.1f} s')
+    sys.stdout.flush()
+
+    for step in steps:
+        if step.returncode not in (None, 0):
+            return step.returncode
+    if any(step.returncode is None for step in steps):
+        return 1
+    return 0
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import math
+import os
+import subprocess
+from collections import Counter
+from logging import getLogger
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from wxflow import logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# MPI launcher -> batch scheduler providing the allocation
+SCHEDULERS = {'mpirun': 'lsf', 'mpiexec': 'pbs', 'srun': 'slurm', 'aprun': 'aprun', 'fake': 'fake'}
+
+# Allocation of the "fake" scheduler, e.g. "node1:4,node2:4", default is the local host
+FAKE_ALLOCATION = 'PYGFS_FAKE_ALLOCATION'
+
+
+class Allocation:
+    """Hosts of a batch job and the number of task slots on each of them"""
+
+    def __init__(self, slots: Mapping[str, int]) -> None:
+        self.slots = dict(slots)
+
+    @classmethod
+    def from_hostnames(cls, hostnames: List[str]) -> 'Allocation':
+        """Allocation from a list of host names repeated once per slot, as in LSF and PBS host files"""
+        # Counter keeps the order in which the hosts are first seen
+        return cls(Counter(name.strip() for name in hostnames if name.strip()))
+
+    @property
+    def hosts(self) -> List[str]:
+        return list(self.slots)
+
+    @property
+    def nslots(self) -> int:
+        return sum(self.slots.values())
+
+    def __repr__(self) -> str:
+        return f"Allocation({self.slots})"
+
+
+class Placement:
+    """Hosts of the tasks of an MPI sub-job, one entry per task"""
+
+    def __init__(self, name: str, task_hosts: List[str]) -> None:
+        self.name = name
+        self.task_hosts = list(task_hosts)
+
+    @property
+    def ntasks(self) -> int:
+        return len(self.task_hosts)
+
+    @property
+    def hosts(self) -> List[str]:
+        return list(dict.fromkeys(self.task_hosts))
+
+    def write_hostfile(self, path: str) -> str:
+        """Write the host of each task, one per line"""
+        with open(path, 'w') as fh:
+            fh.write(''.join(f"{host}\n" for host in self.task_hosts))
+        return path
+
+    def __repr__(self) -> str:
+        return f"Placement({self.name}, {dict(Counter(self.task_hosts))})"
+
+
+@logit(logger)
+def discover_allocation(launcher: str, env: Optional[Mapping[str, str]] = None) -> Allocation:
+    """Allocation of the current batch job, from the scheduler behind the MPI launcher
+
+    Parameters
+    ----------
+    launcher : str
+        MPI launcher, one of mpirun (LSF), mpiexec (PBS), srun (Slurm), aprun or fake
+    env : Mapping[str, str]
+        Environment to read the scheduler variables from, default os.environ
+
+    Returns
+    -------
+    Allocation
+    """
+    env = os.environ if env is None else env
+    if launcher not in SCHEDULERS:
+        raise KeyError(f"Unknown MPI launcher {launcher}, valid launchers are {', '.join(SCHEDULERS)}")
+    scheduler = SCHEDULERS[launcher]
+
+    if scheduler in ['lsf', 'aprun']:
+        return Allocation.from_hostnames(_read_lines(env.get('LSB_DJOB_HOSTFILE', '')))
+
+    if scheduler == 'pbs':
+        return Allocation.from_hostnames(_read_lines(env.get('PBS_NODEFILE', '')))
+
+    if scheduler == 'slurm':
+        output = subprocess.check_output(['scontrol', 'show', 'hostnames', env.get('SLURM_JOB_NODELIST', '')])
+        hosts = [host.strip() for host in output.decode('utf-8').splitlines() if host.strip()]
+        per_node = slurm_tasks_per_node(env.get('SLURM_TASKS_PER_NODE', ''), len(hosts))
+        if not per_node:
+            ntasks = int(env.get('SLURM_NPROCS', env.get('SLURM_NTASKS', len(hosts))))
+            per_node = [max(ntasks // max(len(hosts), 1), 1)] * len(hosts)
+        return Allocation(dict(zip(hosts, per_node)))
+
+    # fake scheduler: host:slots pairs from the environment
+    spec = env.get(FAKE_ALLOCATION, f"localhost:{os.cpu_count() or 1}")
+    slots = {}
+    for item in spec.split(','):
+        host, _, nslots = item.strip().partition(':')
+        slots[host] = slots.get(host, 0) + int(nslots or 1)
+    return Allocation(slots)
+
+
+def slurm_tasks_per_node(spec: str, nhosts: int) -> List[int]:
+    """Expand a Slurm task count list such as "40(x2),20" into one count per host"""
+    counts = []
+    for item in filter(None, spec.split(',')):
+        count, _, repeat = item.partition('(x')
+        counts.extend([int(count)] * int(repeat.rstrip(')') or 1))
+    return counts if len(counts) == nhosts else []
+
+
+def _read_lines(path: str) -> List[str]:
+    with open(path, 'r') as fh:
+        return fh.readlines()
+
+
+@logit(logger)
+def pack(allocation: Allocation, jobs: List[Tuple[str, int]], exclusive: bool = False) -> Dict[str, Placement]:
+    """Place concurrent MPI sub-jobs on disjoint task slots of an allocation
+
+    Jobs are placed largest first. A job that fits on one host goes to the host
+    with the fewest free slots that can hold it (best fit); a larger job takes
+    the fewest whole free hosts that can hold it. With exclusive, each job gets
+    hosts of its own even when it leaves slots unused.
+
+    Parameters
+    ----------
+    allocation : Allocation
+        Allocation of the batch job
+    jobs : List[Tuple[str, int]]
+        (name, number of tasks) of each sub-job
+    exclusive : bool
+        Do not share hosts between sub-jobs
+
+    Returns
+    -------
+    Dict[str, Placement]
+        Placement of each job, in the order of jobs
+
+    Raises
+    ------
+    ValueError
+        The jobs do not fit at once in the allocation
+    """
+    free = dict(allocation.slots)
+    untouched = set(free)
+    placements = {}
+
+    for name, ntasks in sorted(jobs, key=lambda job: job[1], reverse=True):
+        if ntasks <= 0:
+            raise ValueError(f"Job {name} must have at least one task")
+        candidates = [host for host, nslots in free.items() if nslots >= ntasks and (not exclusive or host in untouched)]
+        if candidates:
+            host = min(candidates, key=lambda host: free[host])
+            task_hosts = [host] * ntasks
+        else:
+            # span whole free hosts, largest first to use as few as possible
+            whole = sorted((host for host in free if host in untouched and free[host] > 0), key=lambda host: -free[host])
+            task_hosts = []
+            for host in whole:
+                if len(task_hosts) >= ntasks:
+                    break
+                task_hosts += [host] * min(free[host], ntasks - len(task_hosts))
+            if len(task_hosts) < ntasks:
+                raise ValueError(f"Job {name} with {ntasks} tasks does not fit in the free slots {free}")
+        for host, count in Counter(task_hosts).items():
+            free[host] = 0 if exclusive else free[host] - count
+            untouched.discard(host)
+        placements[name] = Placement(name, task_hosts)
+
+    logger.debug(f"Placements: {placements}")
+    return {name: placements[name] for name, _ in jobs}
+
+
+class Launcher:
+    """MPI launcher of the current batch job
+
+    Builds the launch command of an MPI sub-job, either across the allocation or
+    bound to the hosts of a Placement through a host file (mpirun, srun, aprun)
+    or the list of its hosts (mpiexec).
+    """
+
+    def __init__(self, launcher: str, env: Optional[Mapping[str, str]] = None) -> None:
+        self.launcher = launcher
+        self.allocation = discover_allocation(launcher, env)
+
+    def pack(self, jobs: List[Tuple[str, int]], exclusive: bool = False) -> Dict[str, Placement]:
+        return pack(self.allocation, jobs, exclusive=exclusive)
+
+    def place(self, name: str, ntasks: int, hosts: List[str]) -> Placement:
+        """Placement of a single job on the given hosts of the allocation,
+        oversubscribing them round-robin if they do not have enough slots"""
+        try:
+            return pack(Allocation({host: self.allocation.slots[host] for host in hosts}), [(name, ntasks)])[name]
+        except ValueError:
+            logger.warning(f"Job {name} with {ntasks} tasks oversubscribes the hosts {', '.join(hosts)}")
+            return Placement(name, [hosts[ii % len(hosts)] for ii in range(ntasks)])
+
+    def nhosts_for(self, ntasks: int) -> int:
+        """Smallest number of hosts that can hold ntasks"""
+        nslots = min(self.allocation.slots.values())
+        return min(math.ceil(ntasks / nslots), len(self.allocation.hosts))
+
+    def command(self, ntasks: int, nthreads: int = 1, placement: Optional[Placement] = None,
+                hostfile: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        """Launch command prefix and the extra environment of an MPI sub-job
+
+        Parameters
+        ----------
+        ntasks : int
+            Number of MPI tasks
+        nthreads : int
+            Depth of each task (mpiexec, aprun); srun binds one core per task
+        placement : Placement
+            Hosts of the tasks, the job is not bound to hosts if None
+        hostfile : str
+            Host file written for the placement
+
+        Returns
+        -------
+        Tuple[str, Dict[str, str]]
+        """
+        env = {}
+        if placement is not None:
+            if hostfile is None:
+                raise ValueError("A host file is required to bind a job to its placement")
+            placement.write_hostfile(hostfile)
+
+        if self.launcher == 'mpirun':
+            cmd = f"mpirun -np {ntasks}" + (f" --hostfile {hostfile}" if placement else '')
+        elif self.launcher == 'mpiexec':
+            cmd = f"mpiexec -l -n {ntasks}"
+            if placement:
+                # concurrent sub-jobs run on their own hosts, tasks filled host by host
+                ppn = max(Counter(placement.task_hosts).values())
+                cmd += f" --hosts {','.join(placement.hosts)} -ppn {ppn} --cpu-bind depth --depth {nthreads}"
+        elif self.launcher == 'srun':
+            cmd = f"srun -n {ntasks} --verbose --export=ALL"
+            if placement:
+                cmd += " -c 1 --distribution=arbitrary --cpu-bind=cores"
+                env['SLURM_HOSTFILE'] = hostfile
+        elif self.launcher == 'aprun':
+            cmd = (f"aprun -l {hostfile}" if placement else 'aprun') + f" -d {nthreads} -n {ntasks}"
+        else:
+            # fake scheduler: run the executable once, locally, with the placement in the environment
+            cmd = ''
+            env.update({'PYGFS_FAKE_NTASKS': str(ntasks), 'PYGFS_FAKE_NTHREADS': str(nthreads)})
+            if placement:
+                env['PYGFS_FAKE_HOSTFILE'] = hostfile
+        return cmd, env
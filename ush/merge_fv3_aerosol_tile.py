@@ -27,20 +27,26 @@ optional arguments:
 """
 import os
 import sys
-import subprocess
-from typing import List
+from typing import List, Optional
 from functools import partial
-from shutil import copyfile
 import argparse
 import numpy as np
 import netCDF4
 
 # Make sure print statements are flushed immediately, otherwise
-#   print statments may be out-of-order with subprocess output
+#   print statments may be out-of-order with the output of other processes
 print = partial(print, flush=True)
 
 
-def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, rest_file_name: str, append_file_name: str, tracers_to_append: List[str]) -> None:
+def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, rest_file_name: str, append_file_name: str,
+               tracers_to_append: List[str], out_file_name: Optional[str] = None) -> None:
+    """
+    Merge conservation-adjusted tracers from a restart tracer file into an atmospheric IC tile.
+
+    The merged tile is written in a single pass with the updated ntracer dimension and without
+    checksum attributes. If out_file_name is None, it is written to a temporary file that then
+    replaces base_file_name.
+    """
     if not os.path.isfile(base_file_name):
         print("FATAL ERROR: Atmosphere file " + base_file_name + " does not exist!")
         sys.exit(102)
@@ -61,23 +67,17 @@ def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, re
         print("FATAL ERROR: Chemistry file " + append_file_name + " does not exist!")
         sys.exit(106)
 
-    append_file = netCDF4.Dataset(append_file_name, "r")
-    base_file = netCDF4.Dataset(base_file_name, "r+")
-    core_file = netCDF4.Dataset(core_file_name, "r")
-    ctrl_file = netCDF4.Dataset(ctrl_file_name, "r")
-    rest_file = netCDF4.Dataset(rest_file_name, "r")
-
-    # read pressure layer thickness from restart file
-    delp = rest_file["delp"][0, :]
-    # read a, b coefficients to generate sigma levels
-    ak = core_file["ak"][0, :]
-    bk = core_file["bk"][0, :]
-
-    # read surface pressure from initial conditions file
-    psfc = base_file["ps"][:, :]
-    # read sigma-level a, b coefficients from initial conditions control file
-    ai = ctrl_file["vcoord"][0, 1:]
-    bi = ctrl_file["vcoord"][1, 1:]
+    with netCDF4.Dataset(core_file_name, "r") as core_file, \
+            netCDF4.Dataset(ctrl_file_name, "r") as ctrl_file, \
+            netCDF4.Dataset(rest_file_name, "r") as rest_file:
+        # read pressure layer thickness from restart file
+        delp = np.ma.getdata(rest_file["delp"][0, :])
+        # read a, b coefficients to generate sigma levels
+        ak = np.ma.getdata(core_file["ak"][0, :])
+        bk = np.ma.getdata(core_file["bk"][0, :])
+        # read sigma-level a, b coefficients from initial conditions control file
+        ai = ctrl_file["vcoord"][0, 1:]
+        bi = ctrl_file["vcoord"][1, 1:]
 
     # IC sigma levels must match model restart sigma levels
     if ak.size != ai.size:
@@ -88,55 +88,66 @@ def merge_tile(base_file_name: str, ctrl_file_name: str, core_file_name: str, re
         print("FATAL ERROR: Inconsistent size of B(k) arrays: src=", bk.size, ", dst=", bi.size)
         sys.exit(108)
 
-    dp = np.zeros(delp.shape)
-    for k in range(0, dp.shape[0]):
-        dp[k, :, :] = ak[k + 1] - ak[k] + psfc * (bk[k + 1] - bk[k])
-
-    scale_factor = delp / dp
-
-    # print(base_file)
-    # print(base_file.dimensions["ntracer"])
-
-    old_ntracer = base_file.dimensions["ntracer"].size
-    new_ntracer = old_ntracer
-
-    print("Adding the following variables to " + base_file_name + ":\n")
+    write_file_name = base_file_name + ".tmp" if out_file_name is None else out_file_name
+
+    with netCDF4.Dataset(base_file_name, "r") as base_file, \
+            netCDF4.Dataset(append_file_name, "r") as append_file, \
+            netCDF4.Dataset(write_file_name, "w", format=base_file.data_model) as out_file:
+        base_file.set_auto_maskandscale(False)
+        append_file.set_auto_maskandscale(False)
+
+        # read surface pressure from initial conditions file
+        psfc = base_file["ps"][:, :]
+        # layer thickness of the IC sigma levels and the mass conserving scale factor
+        dp = np.diff(ak)[:, np.newaxis, np.newaxis] + np.diff(bk)[:, np.newaxis, np.newaxis] * psfc
+        scale_factor = delp / dp
+
+        new_tracers = [name for name in tracers_to_append if name not in base_file.variables]
+        old_ntracer = base_file.dimensions["ntracer"].size
+        new_ntracer = old_ntracer + len(new_tracers)
+        if new_ntracer != old_ntracer:
+            print(f"Updating ntracer from {old_ntracer} to {new_ntracer}")
+
+        for name, dim in base_file.dimensions.items():
+            size = new_ntracer if name == "ntracer" else dim.size
+            out_file.createDimension(name, None if dim.isunlimited() else size)
+        out_file.setncatts({att: base_file.getncattr(att) for att in base_file.ncattrs() if att != "checksum"})
+
+        def define(name: str, source: netCDF4.Variable, dimensions) -> netCDF4.Variable:
+            attrs = {att: source.getncattr(att) for att in source.ncattrs() if att != "checksum"}
+            variable = out_file.createVariable(name, source.datatype, dimensions, fill_value=attrs.pop("_FillValue", None))
+            variable.set_auto_maskandscale(False)
+            variable.setncatts(attrs)
+            return variable
+
+        # the ntracer variable, if any, is dropped as its dimension changes
+        for name, variable in base_file.variables.items():
+            if name == "ntracer" or name in tracers_to_append:
+                continue
+            define(name, variable, variable.dimensions)[:] = variable[:]
+
+        print("Adding the following variables to " + base_file_name + ":\n")
+
+        print(" Name   | Total mass (restart) | Total mass (IC)      | Max column abs. diff.")
+        print("-" * 8 + "+" + "-" * 22 + "+" + "-" * 22 + "+" + "-" * 24)
+        for variable_name in tracers_to_append:
+            variable = append_file[variable_name]
+            tracer = variable[0, :, :, :]
+            merged = (scale_factor * tracer).astype(variable.datatype)
+            output = define(variable_name, variable, base_file["sphum"].dimensions)
+            output[0, :, :] = 0.
+            output[1:, :, :] = merged
+            mass_src = tracer * delp
+            mass_dst = merged * dp
+            mass_err_max = np.max(np.abs(mass_src - mass_dst))
+            total_mass_src = np.sum(mass_src)
+            total_mass_dst = np.sum(mass_dst)
+            print(f' {variable_name:6}   {total_mass_src:20}   {total_mass_dst:20}    {mass_err_max:22}')
+
+        print("-" * 79 + "\n")
 
-    print(" Name   | Total mass (restart) | Total mass (IC)      | Max column abs. diff.")
-    print("-" * 8 + "+" + "-" * 22 + "+" + "-" * 22 + "+" + "-" * 24)
-    for variable_name in tracers_to_append:
-        variable = append_file[variable_name]
-        if variable_name not in base_file.variables.keys():
-            new_ntracer = new_ntracer + 1
-            base_file.createVariable(variable_name, variable.datatype, base_file["sphum"].dimensions)
-        base_file[variable_name][0, :, :] = 0.
-        base_file[variable_name][1:, :, :] = scale_factor * variable[0, :, :, :]
-        base_file[variable_name].setncatts(variable.__dict__)
-        mass_src = variable * delp
-        mass_dst = base_file[variable_name][1:, :, :] * dp
-        mass_err_max = np.max(np.abs(mass_src - mass_dst))
-        total_mass_src = np.sum(mass_src)
-        total_mass_dst = np.sum(mass_dst)
-        print(f' {variable_name:6}   {total_mass_src:20}   {total_mass_dst:20}    {mass_err_max:22}')
-        # print("Done adding " + variable_name)
-
-    print("-" * 79 + "\n")
-
-    base_file.close()
-
-    if new_ntracer != old_ntracer:
-        print("Updating ntracer")
-
-        # Use ncks to rewrite file without ntracer so we can define it anew
-        subprocess.run(["ncks", "-x", "-v", "ntracer", "-O", base_file_name, base_file_name], check=True)
-
-        base_file = netCDF4.Dataset(base_file_name, "r+")
-        base_file.createDimension("ntracer", new_ntracer)
-        # print(base_file.dimensions["ntracer"])
-        base_file.close()
-
-    # Remove checksum
-    subprocess.run(["ncatted", "-a", "checksum,,d,,", base_file_name], check=True)
+    if out_file_name is None:
+        os.replace(write_file_name, base_file_name)
 
 
 def main() -> None:
@@ -162,17 +173,14 @@ def main() -> None:
 
     if out_file_name is None:
         print("INFO: No out_file specified, will edit atm_file in-place")
-        out_file_name = atm_file_name
-    else:
-        if os.path.isfile(out_file_name):
-            print("WARNING: Specified out file " + out_file_name + " exists and will be overwritten")
-        copyfile(atm_file_name, out_file_name)
+    elif os.path.isfile(out_file_name):
+        print("WARNING: Specified out file " + out_file_name + " exists and will be overwritten")
 
     variable_file = open(variable_file)
     variable_names = variable_file.read().splitlines()
     variable_file.close()
 
-    merge_tile(out_file_name, ctrl_file_name, core_file_name, rest_file_name, chem_file_name, variable_names)
+    merge_tile(atm_file_name, ctrl_file_name, core_file_name, rest_file_name, chem_file_name, variable_names, out_file_name)
 
     # print(variable_names)
 
@@ -4,6 +4,7 @@ import copy
 import os
 from logging import getLogger
 import pygfs.utils.marine_da_utils as mdau
+from pygfs.utils.marine_bkg_catalog import list_files
 import glob
 import re
 import netCDF4
@@ -102,6 +103,11 @@ class MarineAnalysis(Task):
         bkg_list = parse_j2yaml(self.task_config.MARINE_DET_STAGE_BKG_YAML_TMPL, self.task_config)
         FileHandler(bkg_list).sync()
 
+        # check the dates of the staged backgrounds and prepare the background list for the pseudo model
+        mdau.gen_bkg_list(bkg_path='./bkg',
+                          window_begin=self.task_config.MARINE_WINDOW_BEGIN,
+                          yaml_name='bkg_list.yaml')
+
         # stage the soca grid
         FileHandler({'copy': [[os.path.join(self.task_config.COMIN_OCEAN_BMATRIX, 'soca_gridspec.nc'),
                                os.path.join(self.task_config.DATA, 'soca_gridspec.nc')]]}).sync()
@@ -188,11 +194,6 @@ class MarineAnalysis(Task):
         """Create the yaml configuration to run the SOCA variational application
         """
 
-        # prepare background list for the pseudo model, check bkg date for consistency
-        mdau.gen_bkg_list(bkg_path='./bkg',
-                          window_begin=self.task_config.MARINE_WINDOW_BEGIN,
-                          yaml_name='bkg_list.yaml')
-
         # Make a copy of the env config before modifying to avoid breaking something else
         envconfig_jcb = copy.deepcopy(self.task_config)
         logger.info(f"---------------- Prepare the yaml configuration")
@@ -329,13 +330,6 @@ class MarineAnalysis(Task):
            This method saves the results of the deterministic variational analysis to the COMROOT
         """
 
-        def list_all_files(dir_in, dir_out, wc='*', fh_list=[]):
-            files = glob.glob(os.path.join(dir_in, wc))
-            for file_src in files:
-                file_dst = os.path.join(dir_out, os.path.basename(file_src))
-                fh_list.append([file_src, file_dst])
-            return fh_list
-
         # variables of convenience
         com_ocean_analysis = self.task_config.COMOUT_OCEAN_ANALYSIS
         com_ice_analysis = self.task_config.COMOUT_ICE_ANALYSIS
@@ -409,12 +403,12 @@ class MarineAnalysis(Task):
                                os.path.join(com_ocean_analysis, 'yaml')]}).sync()
 
         # ioda output files
-        fh_list = list_all_files(os.path.join(anl_dir, 'diags'),
-                                 os.path.join(com_ocean_analysis, 'diags'))
+        fh_list = list_files(os.path.join(anl_dir, 'diags'),
+                             os.path.join(com_ocean_analysis, 'diags'))
 
-        # yaml configurations
-        fh_list = list_all_files(os.path.join(anl_dir),
-                                 os.path.join(com_ocean_analysis, 'yaml'), wc='*.yaml', fh_list=fh_list)
+        # yaml configurations, including the background list and catalog
+        fh_list += list_files(os.path.join(anl_dir),
+                              os.path.join(com_ocean_analysis, 'yaml'), wc='*.yaml')
 
         FileHandler({'copy': fh_list}).sync()
 
@@ -4,6 +4,7 @@ import f90nml
 from logging import getLogger
 import os
 from pygfs.task.analysis import Analysis
+import pygfs.utils.marine_da_utils as mdau
 from typing import Dict
 from wxflow import (AttrDict,
                     FileHandler,
@@ -71,7 +72,7 @@ class MarineLETKF(Analysis):
             ensbkgconf[key] = self.task_config[key]
         ensbkgconf.RUN = 'enkfgdas'
         soca_ens_bkg_stage_list = parse_j2yaml(self.task_config.SOCA_ENS_BKG_STAGE_YAML_TMPL, ensbkgconf)
-        FileHandler(soca_ens_bkg_stage_list).sync()
+        mdau.stage_ens_list(soca_ens_bkg_stage_list, self.task_config)
         soca_fix_stage_list = parse_j2yaml(self.task_config.SOCA_FIX_YAML_TMPL, self.task_config)
         FileHandler(soca_fix_stage_list).sync()
         letkf_stage_list = parse_j2yaml(self.task_config.MARINE_LETKF_STAGE_YAML_TMPL, self.task_config)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import os
+from concurrent.futures import ProcessPoolExecutor
 from logging import getLogger
 from typing import List, Dict, Any
 from pprint import pformat
@@ -15,6 +16,7 @@ from wxflow import (AttrDict,
                     add_to_datetime, to_timedelta,
                     WorkflowException,
                     Executable)
+from pygfs.utils.netcdf_subset import subset_netcdf
 
 logger = getLogger(__name__.split('.')[-1])
 
@@ -110,7 +112,113 @@ class OceanIceProducts(Task):
 
     @staticmethod
     @logit(logger)
-    def configure(config: Dict, product_grid: str) -> None:
+    def process_grids(config: Dict) -> None:
+        """Process all the product grids concurrently, each one in its own work directory.
+        The products of each grid are moved back to the DATA/ directory for finalize
+
+        Parameters
+        ----------
+        config : Dict
+            Configuration dictionary for the task
+
+        Returns
+        -------
+        None
+        """
+
+        max_workers = max(min(len(config.product_grids), config.get('MAX_CONCURRENT_GRIDS', 1)), 1)
+        logger.info(f"Processing {', '.join(config.product_grids)} grids with {max_workers} worker(s)")
+
+        # each grid runs in a separate process as the executables are run from the current working directory
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {grid: executor.submit(OceanIceProducts.process_grid, config, grid)
+                       for grid in config.product_grids}
+        for grid, future in futures.items():
+            try:
+                future.result()
+            except Exception:
+                logger.exception(f"FATAL ERROR: Failed to process the {grid} grid")
+                raise WorkflowException(f"Failed to process the {grid} grid")
+
+    @staticmethod
+    @logit(logger)
+    def process_grid(config: Dict, product_grid: str) -> None:
+        """Configure and execute a single product grid in its own work directory
+        and move its products to the DATA/ directory
+
+        Parameters
+        ----------
+        config : Dict
+            Configuration dictionary for the task
+        product_grid : str
+            Target product grid to process
+
+        Returns
+        -------
+        None
+        """
+
+        logger.info(f"Processing {product_grid} grid")
+
+        workdir = OceanIceProducts.link_grid_dir(config, product_grid)
+
+        # Configure the work directory for execution; prepare namelist etc.
+        OceanIceProducts.configure(config, product_grid, workdir=workdir)
+
+        # Run the oceanice post executable to interpolate and create grib2 files
+        OceanIceProducts.execute(config, product_grid, workdir=workdir)
+
+        # Merge the products back into DATA/ where finalize expects them
+        for product in [f"{config.component}.{product_grid}.grib2", f"{config.component}.{product_grid}.grib2.idx"]:
+            os.replace(os.path.join(workdir, product), os.path.join(config.DATA, product))
+
+    @staticmethod
+    @logit(logger)
+    def link_grid_dir(config: Dict, product_grid: str) -> str:
+        """Create the work directory of a product grid and mirror the data staged in the
+        DATA/ directory into it: the directories are created and the files linked
+
+        Parameters
+        ----------
+        config : Dict
+            Configuration dictionary for the task
+        product_grid : str
+            Target product grid to process
+
+        Returns
+        -------
+        str
+            Path to the work directory of the product grid
+        """
+
+        workdir = os.path.join(config.DATA, product_grid)
+        FileHandler({'mkdir': [workdir]}).sync()
+
+        for root, dirs, files in os.walk(config.DATA):
+            reldir = os.path.relpath(root, config.DATA)
+            if reldir == os.curdir:
+                # the work directories of the product grids are not part of the common data
+                dirs[:] = [name for name in dirs if name not in config.product_grids]
+            for name in dirs:
+                dest = os.path.normpath(os.path.join(workdir, reldir, name))
+                if os.path.islink(os.path.join(root, name)):
+                    # os.walk does not descend into linked directories, link them as they are
+                    files.append(name)
+                elif not os.path.isdir(dest) or os.path.islink(dest):
+                    if os.path.lexists(dest):
+                        os.remove(dest)
+                    os.makedirs(dest)
+            for name in files:
+                dest = os.path.normpath(os.path.join(workdir, reldir, name))
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                os.symlink(os.path.join(root, name), dest)
+
+        return workdir
+
+    @staticmethod
+    @logit(logger)
+    def configure(config: Dict, product_grid: str, workdir: str = None) -> None:
         """Configure the namelist for the product_grid in the work directory.
         Create namelist 'ocnicepost.nml' from template
 
@@ -120,6 +228,8 @@ class OceanIceProducts(Task):
             Configuration dictionary for the task
         product_grid : str
             Target product grid to process
+        workdir : str
+            Work directory of the product grid, default is the DATA/ directory
 
         Returns
         -------
@@ -128,7 +238,7 @@ class OceanIceProducts(Task):
 
         # Make a localconf with the "component" specific configuration for parsing the namelist
         localconf = AttrDict()
-        localconf.DATA = config.DATA
+        localconf.DATA = config.DATA if workdir is None else workdir
         localconf.component = config.component
 
         localconf.source_tripole_dims = ', '.join(map(str, OceanIceProducts.TRIPOLE_DIMS_MAP[config.model_grid]))
@@ -153,7 +263,7 @@ class OceanIceProducts(Task):
 
     @staticmethod
     @logit(logger)
-    def execute(config: Dict, product_grid: str) -> None:
+    def execute(config: Dict, product_grid: str, workdir: str = None) -> None:
         """Run the ocnicepost.x executable to interpolate and convert to grib2
 
         Parameters
@@ -162,17 +272,24 @@ class OceanIceProducts(Task):
             Configuration dictionary for the task
         product_grid : str
             Target product grid to process
+        workdir : str
+            Work directory of the product grid, default is the DATA/ directory
 
         Returns
         -------
         None
         """
 
-        # Run the ocnicepost.x executable
-        OceanIceProducts.interp(config.DATA, config.APRUN_OCNICEPOST, exec_name="ocnicepost.x")
+        workdir = config.DATA if workdir is None else workdir
+
+        # Interpolate with the ocnicepost.x executable or in-process with cached weights
+        if config.get('OCNICEPOST_ENGINE', 'ocnicepost.x') == 'python':
+            OceanIceProducts.remap(config, product_grid, workdir)
+        else:
+            OceanIceProducts.interp(workdir, config.APRUN_OCNICEPOST, exec_name="ocnicepost.x")
 
         # Convert interpolated netCDF file to grib2
-        OceanIceProducts.netCDF_to_grib2(config, product_grid)
+        OceanIceProducts.netCDF_to_grib2(config, product_grid, workdir=workdir)
 
     @staticmethod
     @logit(logger)
@@ -205,7 +322,41 @@ class OceanIceProducts(Task):
 
     @staticmethod
     @logit(logger)
-    def netCDF_to_grib2(config: Dict, grid: str) -> None:
+    def remap(config: Dict, product_grid: str, workdir: str) -> None:
+        """
+        Interpolate the tripole model output to the product grid in-process,
+        as an alternative to ocnicepost.x. The sparse weights are cached in OCNICEPOST_WEIGHTS_CACHE
+
+        Parameters
+        ----------
+        config : Dict
+            Configuration dictionary for the task
+        product_grid : str
+            Target product grid to process
+        workdir : str
+            Work directory of the product grid, holding the model output and the weight files
+
+        Returns
+        -------
+        None
+        """
+        # imported here, scipy is only needed by the in-process remapping
+        from pygfs.utils.tripole_remap import TripoleRemapper, read_var_list
+
+        namelist = config.oceanice_yaml[config.component].namelist
+        # remap the variables of the ocnicepost.x table only, each with its method
+        methods = read_var_list(os.path.join(workdir, f"{config.component}.csv"))
+        remapper = TripoleRemapper(workdir, config.model_grid, product_grid,
+                                   cache_dir=config.OCNICEPOST_WEIGHTS_CACHE)
+        remapper.remap_file(os.path.join(workdir, f"{config.component}.nc"),
+                            os.path.join(workdir, f"{config.component}.{product_grid}.nc"),
+                            config.component, namelist.maskvar,
+                            sinvar=namelist.sinvar, cosvar=namelist.cosvar, angvar=namelist.angvar,
+                            varlist=list(methods), methods=methods)
+
+    @staticmethod
+    @logit(logger)
+    def netCDF_to_grib2(config: Dict, grid: str, workdir: str = None) -> None:
         """Convert interpolated netCDF file to grib2
 
         Parameters
@@ -214,13 +365,15 @@ class OceanIceProducts(Task):
             Configuration dictionary for the task
         grid : str
             Target product grid to process
+        workdir : str
+            Work directory of the product grid, default is the DATA/ directory
 
         Returns
         ------
         None
         """
 
-        os.chdir(config.DATA)
+        os.chdir(config.DATA if workdir is None else workdir)
 
         exec_cmd = Executable(config.oceanice_yaml.nc2grib2.script)
         arguments = [config.component, grid, config.current_cycle.strftime("%Y%m%d%H"), config.avg_period]
@@ -263,6 +416,22 @@ class OceanIceProducts(Task):
 
         logger.info(f"Subsetting {varlist} from {input_file} to {output_file}")
 
+        # stream the subset slab by slab into a compressed file if configured
+        subset_opts = config.oceanice_yaml.get('netcdf_subset', {})
+        if subset_opts.get('streaming', False):
+            try:
+                subset_netcdf(input_file, output_file, varlist,
+                              complevel=subset_opts.get('complevel', 1),
+                              chunks=subset_opts.get('chunks', None),
+                              max_memory_mb=subset_opts.get('max_memory_mb', 512))
+            except FileNotFoundError:
+                logger.exception(f"FATAL ERROR: Input file not found: {input_file}")
+                raise FileNotFoundError(f"File not found: {input_file}")
+            except Exception as err:
+                logger.exception(f"FATAL ERROR: Error occurred during netCDF subset: {input_file}")
+                raise WorkflowException(f"{err}")
+            return
+
         try:
             # open the netcdf file
             ds = xr.open_dataset(input_file)
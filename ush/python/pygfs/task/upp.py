@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from logging import getLogger
-from typing import Dict, Any, Union
+from typing import Dict, Any, List, Tuple, Union
 from pprint import pformat
 
 from wxflow import (AttrDict,
@@ -15,6 +16,8 @@ from wxflow import (AttrDict,
                     WorkflowException,
                     Executable, which)
 
+from pygfs.utils.grib2_index import index_files
+
 logger = getLogger(__name__.split('.')[-1])
 
 
@@ -64,11 +67,105 @@ class UPP(Task):
         )
         self.task_config = AttrDict(**self.task_config, **localdict)
 
+        # Forecast hours processed by this job (batch mode), default is FORECAST_HOUR only
+        forecast_hours = str(self.task_config.get('FORECAST_HOURS', '')).split()
+        self.task_config.forecast_hours = [int(fhr) for fhr in forecast_hours] or [self.task_config.FORECAST_HOUR]
+
         # Read the upp.yaml file for common configuration
         logger.info(f"Read the UPP configuration yaml file {self.task_config.UPP_CONFIG}")
         self.task_config.upp_yaml = parse_j2yaml(self.task_config.UPP_CONFIG, self.task_config)
         logger.debug(f"upp_yaml:\n{pformat(self.task_config.upp_yaml)}")
 
+    @logit(logger)
+    def hour_config(self, keys: List[str], forecast_hour: int) -> Tuple[Dict, Dict]:
+        """Configuration of one forecast hour of a batch, processed in its own subdirectory of DATA
+
+        Parameters
+        ----------
+        keys : List[str]
+            Configuration keys needed to run the UPP steps
+        forecast_hour : int
+            Forecast hour to process
+
+        Returns
+        -------
+        upp_dict : Dict
+            Task specific keys for the forecast hour
+        upp_yaml : Dict
+            Fully resolved upp.yaml dictionary for the forecast hour
+        """
+        valid_datetime = add_to_datetime(self.task_config.current_cycle, to_timedelta(f"{forecast_hour}H"))
+        localconf = AttrDict(**self.task_config)
+        localconf.update({'DATA': os.path.join(self.task_config.DATA, f"f{forecast_hour:03d}"),
+                          'forecast_hour': forecast_hour,
+                          'valid_datetime': valid_datetime,
+                          'atmos_filename': f"atm_{valid_datetime.strftime('%Y%m%d%H%M%S')}.nc",
+                          'flux_filename': f"sfc_{valid_datetime.strftime('%Y%m%d%H%M%S')}.nc"})
+
+        upp_dict = AttrDict({key: localconf[key] for key in keys})
+        upp_yaml = parse_j2yaml(self.task_config.UPP_CONFIG, localconf)
+
+        return upp_dict, upp_yaml
+
+    @logit(logger)
+    def process_hours(self, keys: List[str], max_workers: int = 1) -> None:
+        """Process the forecast hours of a batch, each in its own subdirectory of DATA.
+        The fix data must have been staged in DATA by initialize.
+        Each forecast hour is finalized as soon as it is processed
+
+        Parameters
+        ----------
+        keys : List[str]
+            Configuration keys needed to run the UPP steps
+        max_workers : int
+            Number of forecast hours processed at once
+
+        Returns
+        -------
+        None
+        """
+        hours = {fhr: self.hour_config(keys, fhr) for fhr in self.task_config.forecast_hours}
+        max_workers = max(min(max_workers, len(hours)), 1)
+        logger.info(f"Processing forecast hours {', '.join(map(str, hours))} with {max_workers} worker(s)")
+
+        # each forecast hour runs in a separate process as upp.x runs from the current working directory
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(UPP.process_hour, upp_dict, upp_yaml, self.task_config.DATA): fhr
+                       for fhr, (upp_dict, upp_yaml) in hours.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception(f"FATAL ERROR: Failed to process forecast hour {futures[future]}")
+                    raise WorkflowException(f"Failed to process forecast hour {futures[future]}")
+                logger.info(f"Forecast hour {futures[future]} is complete")
+
+    @staticmethod
+    @logit(logger)
+    def process_hour(upp_dict: Dict, upp_yaml: Dict, fixdir: Union[str, os.PathLike]) -> None:
+        """Configure, execute and finalize one forecast hour in its own work directory
+
+        Parameters
+        ----------
+        upp_dict : Dict
+            Task specific keys for the forecast hour, DATA is the work directory of the forecast hour
+        upp_yaml : Dict
+            Fully resolved upp.yaml dictionary for the forecast hour
+        fixdir : str | os.PathLike
+            Directory with the staged fix data, linked into the work directory
+        """
+        FileHandler({'mkdir': [upp_dict.DATA]}).sync()
+        for entry in os.scandir(fixdir):
+            if entry.is_file():
+                dest = os.path.join(upp_dict.DATA, entry.name)
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                os.symlink(entry.path, dest)
+
+        UPP.configure(upp_dict, upp_yaml)
+        UPP.execute(upp_dict.DATA, upp_dict.APRUN_UPP, upp_dict.forecast_hour)
+        UPP.finalize(upp_dict.upp_run, upp_yaml)
+
     @staticmethod
     @logit(logger)
     def initialize(upp_yaml: Dict) -> None:
@@ -187,6 +284,9 @@ class UPP(Task):
 
         Environment Parameters
         ----------------------
+        UPP_INDEXER : str (optional)
+            "grb2index" (default) runs the grb2index executable on each file,
+            "python" indexes the files in-process and concurrently
         GRB2INDEX : str (optional)
             path to executable "grb2index"
             Typically set in the modulefile
@@ -198,22 +298,27 @@ class UPP(Task):
         os.chdir(workdir)
         logger.info("Generate index file")
 
-        grb2index_cmd = os.environ.get("GRB2INDEX", None)
-
         template = f"GFS{{file_type}}.GrbF{forecast_hour:02d}"
 
+        grbfiles = []
         for ftype in ['PRS', 'FLX', 'GOES']:
             grbfile = template.format(file_type=ftype)
-            grbfidx = f"{grbfile}.idx"
-
             if not os.path.exists(grbfile):
                 logger.info(f"No {grbfile} to process, skipping ...")
                 continue
+            grbfiles.append((os.path.join(workdir, grbfile), os.path.join(workdir, f"{grbfile}.idx")))
 
+        if os.environ.get("UPP_INDEXER", "grb2index") == "python":
+            logger.info(f"Creating index files for {', '.join(grbfile for grbfile, _ in grbfiles)}")
+            index_files(grbfiles, max_workers=len(grbfiles))
+            return
+
+        grb2index_cmd = os.environ.get("GRB2INDEX", None)
+        for grbfile, grbfidx in grbfiles:
             logger.info(f"Creating index file for {grbfile}")
             exec_cmd = which("grb2index") if grb2index_cmd is None else Executable(grb2index_cmd)
-            exec_cmd.add_default_arg(os.path.join(workdir, grbfile))
-            exec_cmd.add_default_arg(os.path.join(workdir, grbfidx))
+            exec_cmd.add_default_arg(grbfile)
+            exec_cmd.add_default_arg(grbfidx)
 
             UPP._call_executable(exec_cmd)
 
@@ -1,9 +1,10 @@
+import os
 import re
 import copy
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
-from wxflow import logit, Template, TemplateConstants
+from wxflow import logit
 
 logger = logging.getLogger(__name__.split('.')[-1])
 
@@ -32,26 +33,88 @@ class UFS:
         # Make a deep copy of incoming config for caching purposes. _config should not be updated
         self._config = copy.deepcopy(config)
 
+    @staticmethod
     @logit(logger)
     def parse_ufs_templates(input_template, output_file, ctx: Dict) -> None:
         """
         This method parses UFS-weather-model templates of the pattern @[VARIABLE]
         drawing the value from ctx['VARIABLE']
         """
+        UFS.parse_ufs_templates_many(input_template, {output_file: ctx})
 
-        with open(input_template, 'r') as fhi:
-            file_in = fhi.read()
-            file_out = Template.substitute_structure(
-                file_in, TemplateConstants.AT_SQUARE_BRACES, ctx.get)
-
-        # If there are unrendered bits, find out what they are
-        pattern = r"@\[.*?\]+"
-        matches = re.findall(pattern, file_out)
-        if matches:
-            logger.warn(f"{input_template} was rendered incompletely")
-            logger.warn(f"The following variables were not substituted")
-            print(matches)  # TODO: improve the formatting of this message
-        # TODO: Should we abort here? or continue to write output_file?
-
-        with open(output_file, 'w') as fho:
-            fho.write(file_out)
+    @staticmethod
+    @logit(logger)
+    def parse_ufs_templates_many(input_template, outputs: Dict[str, Dict]) -> None:
+        """
+        This method parses a UFS-weather-model template of the pattern @[VARIABLE]
+        once for several contexts, e.g. one per ensemble member,
+        writing output_file from outputs[output_file]['VARIABLE']
+        """
+        template = UFSTemplate.from_file(input_template)
+        for output_file, ctx in outputs.items():
+            file_out, missing = template.render(ctx)
+
+            # If there are unrendered bits, report what they are
+            if missing:
+                logger.warning(f"{input_template} was rendered incompletely for {output_file}")
+                logger.warning(f"The following variables were not substituted: {', '.join(missing)}")
+            # TODO: Should we abort here? or continue to write output_file?
+
+            with open(output_file, 'w') as fho:
+                fho.write(file_out)
+
+
+class UFSTemplate:
+    """
+    A UFS-weather-model template of the pattern @[VARIABLE], split once into
+    literal text and variable names so that it can be rendered for many contexts
+    """
+
+    # Same pattern and slice as wxflow TemplateConstants.AT_SQUARE_BRACES
+    PATTERN = re.compile(r"@\[.*?\]+")
+
+    _cache: Dict[Tuple[str, int, int], 'UFSTemplate'] = {}
+
+    def __init__(self, text: str) -> None:
+        self.literals = []
+        self.variables = []
+        position = 0
+        for match in self.PATTERN.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.variables.append(match.group())
+            position = match.end()
+        self.literals.append(text[position:])
+        self.names = [variable[2:-1] for variable in self.variables]
+
+    @classmethod
+    def from_file(cls, input_template: str) -> 'UFSTemplate':
+        """Template of a file, read and split only once while the file is unchanged"""
+        stat = os.stat(input_template)
+        key = (os.path.realpath(input_template), stat.st_mtime_ns, stat.st_size)
+        if key not in cls._cache:
+            with open(input_template, 'r') as fhi:
+                cls._cache[key] = cls(fhi.read())
+        return cls._cache[key]
+
+    def render(self, ctx: Dict) -> Tuple[str, List[str]]:
+        """
+        Render the template drawing the value of @[VARIABLE] from ctx['VARIABLE']
+
+        Returns the rendered text and the variables not found in ctx, left as @[VARIABLE]
+        """
+        parts = [self.literals[0]]
+        missing = []
+        for name, variable, literal in zip(self.names, self.variables, self.literals[1:]):
+            value = ctx.get(name)
+            if value is None:
+                parts.append(variable)
+                if variable not in missing:
+                    missing.append(variable)
+            else:
+                parts.append(str(value))
+            parts.append(literal)
+        return ''.join(parts), missing
+
+    def render_many(self, ctxs: List[Dict]) -> List[Tuple[str, List[str]]]:
+        """Render the template for each of a list of contexts"""
+        return [self.render(ctx) for ctx in ctxs]
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import socket
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from logging import getLogger
+from typing import Dict, Iterator, List, Tuple, Union
+
+from wxflow import logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Length of the two header records of a version 1 index file (2 x 81 bytes)
+INDEX_HEADER_LENGTH = 162
+
+# Fixed part (44 bytes) of a version 1 index record
+RECORD_HEADER = '>8IQ2BH'
+
+# Number of bytes of the bit-map section kept in an index record
+BMS_BYTES = 6
+
+# Parameter short names (discipline, category, number) used in the inventory
+PARAMETERS = {(0, 0, 0): 'TMP', (0, 0, 2): 'POT', (0, 0, 4): 'TMAX', (0, 0, 5): 'TMIN', (0, 0, 6): 'DPT',
+              (0, 1, 0): 'SPFH', (0, 1, 1): 'RH', (0, 1, 3): 'PWAT', (0, 1, 7): 'PRATE', (0, 1, 8): 'APCP',
+              (0, 1, 11): 'SNOD', (0, 1, 13): 'WEASD', (0, 1, 22): 'CLWMR', (0, 1, 23): 'ICMR',
+              (0, 2, 0): 'WDIR', (0, 2, 1): 'WIND', (0, 2, 2): 'UGRD', (0, 2, 3): 'VGRD', (0, 2, 8): 'VVEL',
+              (0, 2, 10): 'ABSV', (0, 2, 22): 'GUST', (0, 3, 0): 'PRES', (0, 3, 1): 'PRMSL', (0, 3, 5): 'HGT',
+              (0, 4, 7): 'DSWRF', (0, 5, 3): 'DLWRF', (0, 6, 1): 'TCDC', (0, 7, 6): 'CAPE', (0, 7, 7): 'CIN',
+              (0, 16, 196): 'REFC', (0, 19, 0): 'VIS', (2, 0, 0): 'LAND', (2, 0, 192): 'SOILW',
+              (10, 2, 0): 'ICEC', (10, 2, 1): 'ICETK', (10, 3, 0): 'WTMP'}
+
+# Fixed surface types (code table 4.5) used in the inventory
+SURFACES = {1: 'surface', 2: 'cloud base', 3: 'cloud top', 4: '0C isotherm', 6: 'max wind',
+            7: 'tropopause', 8: 'top of atmosphere', 10: 'entire atmosphere (considered as a single layer)',
+            101: 'mean sea level', 200: 'entire atmosphere (considered as a single layer)'}
+
+# Time units (code table 4.4)
+TIME_UNITS = {0: 'min', 1: 'hour', 2: 'day', 10: '3 hour', 11: '6 hour', 12: '12 hour', 13: 'sec'}
+
+
+def _signed(value: int, nbytes: int) -> int:
+    """Decode a GRIB2 sign-magnitude integer"""
+    sign_bit = 1 << (8 * nbytes - 1)
+    return -(value & ~sign_bit) if value & sign_bit else value
+
+
+def _uint(buf, offset: int, nbytes: int) -> int:
+    return int.from_bytes(buf[offset:offset + nbytes], 'big')
+
+
+def scan_messages(buf) -> Iterator[Tuple[int, int, int, List[Tuple[int, int, int]]]]:
+    """Walk the GRIB2 messages of a buffer without decoding the data
+
+    Yields
+    ------
+    offset, length, discipline, sections
+        Offset and length of each message, its discipline and the (number, offset, length)
+        of each of its sections, offsets being relative to the start of the message
+    """
+    offset = buf.find(b'GRIB')
+    while offset >= 0:
+        edition = buf[offset + 7]
+        if edition != 2:
+            raise ValueError(f"GRIB edition {edition} message at byte {offset} is not supported")
+        discipline = buf[offset + 6]
+        length = _uint(buf, offset + 8, 8)
+
+        sections = []
+        position = 16
+        while position < length - 4:
+            sec_len = _uint(buf, offset + position, 4)
+            sec_num = buf[offset + position + 4]
+            if sec_len <= 0 or position + sec_len > length:
+                raise ValueError(f"Corrupt GRIB2 section {sec_num} in message at byte {offset}")
+            sections.append((sec_num, position, sec_len))
+            position += sec_len
+        if buf[offset + length - 4:offset + length] != b'7777':
+            raise ValueError(f"GRIB2 message at byte {offset} does not end with 7777")
+
+        yield offset, length, discipline, sections
+        offset = buf.find(b'GRIB', offset + length)
+
+
+def index_records(buf) -> Iterator[Tuple[bytes, Dict]]:
+    """Version 1 index record of every field of the GRIB2 messages of a buffer
+
+    Record layout (bytes, 1-based):
+      001-004 length of the index record
+      005-008 bytes to skip in the file before the message
+      009-012 bytes to skip in the message before the local use section (0 if none)
+      013-016 bytes to skip in the message before the grid definition section
+      017-020 bytes to skip in the message before the product definition section
+      021-024 bytes to skip in the message before the data representation section
+      025-028 bytes to skip in the message before the bit-map section
+      029-032 bytes to skip in the message before the data section
+      033-040 total length of the message
+      041     GRIB edition (2)
+      042     discipline
+      043-044 field number within the message
+      045-    identification, grid definition, product definition and data representation
+              sections followed by the first 6 bytes of the bit-map section
+
+    Yields
+    ------
+    record, field
+        The index record and a description of the field for the inventory
+    """
+    for offset, length, discipline, sections in scan_messages(buf):
+        loc = {num: 0 for num in range(1, 8)}
+        raw = {}
+        field_number = 0
+        for sec_num, sec_off, sec_len in sections:
+            section = bytes(buf[offset + sec_off:offset + sec_off + sec_len])
+            if sec_num == 6:
+                # a bit-map indicator of 254 refers to the previously defined bit-map
+                if section[5] != 254:
+                    loc[6] = sec_off
+                raw[6] = section[:BMS_BYTES]
+                continue
+            loc[sec_num] = sec_off
+            raw[sec_num] = section
+            if sec_num != 7:
+                continue
+
+            field_number += 1
+            body = raw[1] + raw[3] + raw[4] + raw[5] + raw.get(6, b'')
+            record = struct.pack(RECORD_HEADER, struct.calcsize(RECORD_HEADER) + len(body), offset,
+                                 loc[2], loc[3], loc[4], loc[5], loc[6], loc[7], length, 2, discipline,
+                                 field_number) + body
+            yield record, _describe(offset, field_number, discipline, raw[1], raw[4])
+
+
+def _describe(offset: int, field_number: int, discipline: int, ids: bytes, pds: bytes) -> Dict:
+    """Metadata of a field for the inventory"""
+    ref_time = datetime(_uint(ids, 12, 2), ids[14], ids[15], ids[16], ids[17], ids[18])
+    field = {'offset': offset, 'field_number': field_number, 'discipline': discipline,
+             'center': _uint(ids, 5, 2), 'local_table': ids[10], 'ref_time': ref_time,
+             'pdt': _uint(pds, 7, 2), 'category': pds[9], 'number': pds[10]}
+    if len(pds) >= 34:
+        field.update({'time_unit': pds[17], 'forecast_time': _signed(_uint(pds, 18, 4), 4),
+                      'surface': pds[22], 'surface_scale': _signed(pds[23], 1),
+                      'surface_value': _signed(_uint(pds, 24, 4), 4)})
+    return field
+
+
+def _level(field: Dict) -> str:
+    surface = field.get('surface', 255)
+    if surface in SURFACES:
+        return SURFACES[surface]
+    value = field['surface_value'] * 10. ** -field['surface_scale'] if surface != 255 else None
+    if surface == 100:
+        return f"{value / 100.:g} mb"
+    if surface == 103:
+        return f"{value:g} m above ground"
+    if surface == 106:
+        return f"{value:g} m below ground"
+    if surface == 102:
+        return f"{value:g} m above mean sea level"
+    if surface == 104:
+        return f"{value:g} sigma level"
+    if surface == 105:
+        return f"{value:g} hybrid level"
+    return f"lvl type={surface}" if surface != 255 else 'reserved'
+
+
+def inventory_line(record_number: int, field: Dict) -> str:
+    """Short inventory line of a field in the style of `wgrib2 -s`"""
+    number = f"{record_number}" if field['field_number'] == 1 else f"{record_number}.{field['field_number']}"
+    key = (field['discipline'], field['category'], field['number'])
+    name = PARAMETERS.get(key, f"var discipline={key[0]} center={field['center']} "
+                               f"local_table={field['local_table']} parmcat={key[1]} parm={key[2]}")
+    ftime = field.get('forecast_time', 0)
+    if ftime == 0 and field['pdt'] == 0:
+        fcst = 'anl'
+    else:
+        fcst = f"{ftime} {TIME_UNITS.get(field.get('time_unit'), 'unit')} fcst"
+    return f"{number}:{field['offset']}:d={field['ref_time']:%Y%m%d%H}:{name}:{_level(field)}:{fcst}:"
+
+
+@logit(logger)
+def index_file(grbfile: Union[str, os.PathLike], idxfile: Union[str, os.PathLike], invfile: Union[str, os.PathLike] = None) -> int:
+    """Write the version 1 index file of a GRIB2 file, as written by grb2index,
+    and optionally its inventory
+
+    Parameters
+    ----------
+    grbfile : str | os.PathLike
+        GRIB2 file to index
+    idxfile : str | os.PathLike
+        Index file
+    invfile : str | os.PathLike
+        Inventory file, in the style of `wgrib2 -s`, not written if None
+
+    Returns
+    -------
+    int
+        Number of indexed fields
+    """
+    records, lines = [], []
+    with open(grbfile, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        record_number = 0
+        for record, field in index_records(buf):
+            records.append(record)
+            if field['field_number'] == 1:
+                record_number += 1
+            lines.append(inventory_line(record_number, field))
+
+    index = b''.join(records)
+    with open(idxfile, 'wb') as fh:
+        fh.write(_index_header(str(grbfile), len(index), len(records)))
+        fh.write(index)
+
+    if invfile is not None:
+        with open(invfile, 'w') as fh:
+            fh.write('\n'.join(lines) + ('\n' if lines else ''))
+
+    logger.info(f"Indexed {len(records)} fields of {grbfile}")
+    return len(records)
+
+
+def _index_header(grbfile: str, nlen: int, nnum: int) -> bytes:
+    """The two 81 byte header records of a version 1 index file"""
+    now = datetime.now()
+    head1 = list(' ' * 81)
+    head1[0:7] = '!GFHDR!'
+    head1[8:10] = ' 1'
+    head1[11:14] = '  1'
+    head1[15:20] = f"{INDEX_HEADER_LENGTH:5d}"
+    head1[21:31] = now.strftime('%Y-%m-%d')
+    head1[32:40] = now.strftime('%H:%M:%S')
+    head1[41:47] = 'GB2IX1'
+    head1[55:70] = f"{socket.gethostname()[:15]:<15}"
+    head1[71:80] = 'grb2index'
+    head1[80] = '\n'
+
+    head2 = list(' ' * 81)
+    head2[0:8] = 'IX1FORM:'
+    head2[8:38] = f"{INDEX_HEADER_LENGTH:10d}{nlen:10d}{nnum:10d}"
+    # grb2index writes the name of the GRIB file, without its directory
+    head2[40:80] = f"{os.path.basename(grbfile)[:40]:<40}"
+    head2[80] = '\n'
+
+    return ''.join(head1 + head2).encode('ascii', errors='replace')
+
+
+@logit(logger)
+def index_files(files: List[Tuple[str, str]], max_workers: int = 4, inventory: bool = False) -> None:
+    """Index several GRIB2 files concurrently
+
+    Parameters
+    ----------
+    files : List[Tuple[str, str]]
+        (GRIB2 file, index file) pairs
+    max_workers : int
+        Number of files indexed at once
+    inventory : bool
+        Also write the inventory of each file (<GRIB2 file>.inv)
+    """
+    if not files:
+        return
+    with ProcessPoolExecutor(max_workers=max(min(max_workers, len(files)), 1)) as executor:
+        futures = [executor.submit(index_file, grbfile, idxfile, f"{grbfile}.inv" if inventory else None)
+                   for grbfile, idxfile in files]
+        for future in futures:
+            future.result()
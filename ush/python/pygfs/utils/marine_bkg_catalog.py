@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timedelta
+import dateutil.parser as dparser
+import glob
+import os
+import re
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple
+from netCDF4 import Dataset
+
+from wxflow import AttrDict, logit, save_as_yaml
+
+logger = getLogger(__name__.split('.')[-1])
+
+# time units found in MOM6 and CICE history files
+TIME_UNITS = ['seconds', 'minutes', 'hours', 'days']
+
+
+def read_hist_time(histfile: str) -> Tuple[str, Optional[str], Optional[float]]:
+    """Read the time metadata of a MOM6/CICE history file
+
+    Only the `time` variable is accessed, the model fields are never read.
+
+    Parameters
+    ----------
+    histfile : str
+        Path to the history file
+
+    Returns
+    -------
+    Tuple[str, Optional[str], Optional[float]]
+        The file name, the units of `time` and its first value.
+        If the file cannot be read, the units contain the error and the value is None
+    """
+    try:
+        with Dataset(histfile, 'r') as ncf:
+            time = ncf.variables['time']
+            time.set_auto_maskandscale(False)
+            return histfile, time.units, float(time[0])
+    except Exception as ee:
+        return histfile, f"unable to read time: {ee}", None
+
+
+def hist_date(units: str, value: float) -> datetime:
+    """Convert a CF time value (e.g. `hours since 2021-03-22 00:00:00`) into a datetime
+    """
+    match = re.match(r'\s*(\w+)\s+since\s+(.+)', units)
+    if match is None or match.group(1).lower() not in TIME_UNITS:
+        raise ValueError(f"unsupported time units '{units}'")
+    ref_date = dparser.parse(match.group(2), ignoretz=True)
+    return ref_date + timedelta(**{match.group(1).lower(): value})
+
+
+def list_files(dir_in: str, dir_out: str, wc: str = '*') -> List[List[str]]:
+    """List the files of dir_in matching wc as [src, dest] pairs for a FileHandler copy into dir_out
+    """
+    return [[file_src, os.path.join(dir_out, os.path.basename(file_src))]
+            for file_src in sorted(glob.glob(os.path.join(dir_in, wc)))]
+
+
+class MarineBkgCatalog:
+    """Catalog of the ocean and sea ice backgrounds of the FGAT window
+
+    The time metadata of all the backgrounds is read at once and the whole window is
+    validated in one pass. The catalog, with the dates read from the files, is saved in
+    the run directory when the backgrounds are staged and archived with the analysis.
+    """
+
+    @logit(logger, name="MarineBkgCatalog")
+    def __init__(self, bkg_path: str, window_begin: datetime, fcst_hrs: List[int], dt_pseudo: int = 3,
+                 ocn_filename_ic: str = './INPUT/MOM.res.nc') -> None:
+        """Constructor for the marine background catalog
+
+        Parameters
+        ----------
+        bkg_path : str
+            Directory of the staged backgrounds
+        window_begin : datetime
+            Beginning of the assimilation window
+        fcst_hrs : List[int]
+            Forecast hours of the backgrounds
+        dt_pseudo : int
+            Time step of the pseudo model in hours
+        ocn_filename_ic : str
+            Ocean restart used for the vertical coordinate remapping, valid at window_begin
+
+        Returns
+        -------
+        None
+        """
+        self.bkg_path = bkg_path
+        self.window_begin = window_begin
+        self.fcst_hrs = list(fcst_hrs)
+        self.dt_pseudo = dt_pseudo
+        self.ocn_filename_ic = ocn_filename_ic
+
+        # the initial condition and the backgrounds, with their expected dates
+        self.expected = {ocn_filename_ic: window_begin}
+        self.backgrounds = []
+        bkg_date = window_begin
+        for fcst_hr in fcst_hrs:
+            bkg_date = bkg_date + timedelta(hours=dt_pseudo)
+            ocn_file = os.path.join(bkg_path, f"ocean.bkg.f{str(fcst_hr).zfill(3)}.nc")
+            ice_file = os.path.join(bkg_path, f"ice.bkg.f{str(fcst_hr).zfill(3)}.nc")
+            # the pseudo model reads the sea ice background of each date as well
+            self.expected[ocn_file] = bkg_date
+            self.expected[ice_file] = bkg_date
+            self.backgrounds.append(AttrDict({'date': bkg_date, 'ocn_file': ocn_file, 'ice_file': ice_file}))
+
+        self.dates = {}
+        self.errors = []
+
+    @logit(logger)
+    def read(self) -> Dict[str, Optional[datetime]]:
+        """Read the time metadata of all the files of the catalog
+        """
+        self.errors = []
+        for histfile, units, value in map(read_hist_time, self.expected):
+            if value is None:
+                self.dates[histfile] = None
+                self.errors.append(f"{histfile}: {units}")
+                continue
+            try:
+                self.dates[histfile] = hist_date(units, value)
+            except ValueError as ee:
+                self.dates[histfile] = None
+                self.errors.append(f"{histfile}: {ee}")
+
+        return self.dates
+
+    @logit(logger)
+    def validate(self) -> None:
+        """Check the dates of all the backgrounds against the FGAT window
+
+        The files are only read if the catalog was not read (or loaded) yet.
+
+        Raises
+        ------
+        ValueError
+            Listing every inconsistent or unreadable background
+        """
+        if not self.dates:
+            self.read()
+        errors = list(self.errors)  # the files that could not be read
+        for histfile, ref_date in self.expected.items():
+            date = self.dates.get(histfile)
+            logger.info(f"*** history file: {histfile} date: {date} expected date: {ref_date}")
+            if date is not None and date != ref_date:
+                errors.append(f"{histfile}: date {date} does not match the expected date {ref_date}")
+
+        if errors:
+            error_list = '\n'.join(errors)
+            raise ValueError(f"FATAL ERROR: Inconsistent bkg date(s) in {len(errors)} file(s):\n{error_list}")
+
+    def bkg_list(self, basename: str = './bkg/') -> List[Dict]:
+        """List of the backgrounds for the pseudo model
+        """
+        bkg_list = []
+        for bkg in self.backgrounds:
+            ocn_filename = os.path.splitext(os.path.basename(bkg.ocn_file))[0] + '.nc'
+            bkg_list.append({'date': bkg.date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                             'basename': basename,
+                             'ocn_filename': ocn_filename,
+                             'ice_filename': ocn_filename.replace("ocean", "ice"),
+                             'read_from_file': 1})
+        return bkg_list
+
+    def save(self, yaml_name: str) -> None:
+        """Save the catalog, with the dates read from the files, to a YAML file
+        """
+        save_as_yaml({'bkg_path': self.bkg_path,
+                      'window_begin': self.window_begin.isoformat(),
+                      'fcst_hrs': self.fcst_hrs,
+                      'dt_pseudo': self.dt_pseudo,
+                      'ocn_filename_ic': self.ocn_filename_ic,
+                      'dates': {histfile: None if date is None else date.isoformat() for histfile, date in self.dates.items()},
+                      'errors': self.errors}, yaml_name)
@@ -1,8 +1,8 @@
-from datetime import datetime, timedelta
-import dateutil.parser as dparser
+from concurrent.futures import ThreadPoolExecutor
 import os
-from netCDF4 import Dataset
+import re
 from logging import getLogger
+from typing import Dict, List
 import yaml
 
 from wxflow import (FileHandler,
@@ -14,6 +14,8 @@ from wxflow import (FileHandler,
                     save_as_yaml,
                     jinja)
 
+from pygfs.utils.marine_bkg_catalog import MarineBkgCatalog
+
 logger = getLogger(__name__.split('.')[-1])
 
 
@@ -63,81 +65,128 @@ def prep_input_nml(task_config: AttrDict) -> None:
 
 @logit(logger)
 def stage_ens_mem(task_config: AttrDict) -> None:
-    """ Copy the ensemble members to the DATA directory
-    Copy the ensemble members to the DATA directory and reformat the CICE history files
+    """ Stage the ensemble members to the DATA directory
+    Render the ensemble background staging list and stage the ocean and ice history files
+    of each member concurrently. Members whose manifest is up to date are not restaged.
     """
-    # Copy the ensemble members to the DATA directory
     logger.info("---------------- Stage ensemble members")
     ensbkgconf = AttrDict(task_config)
     ensbkgconf.RUN = task_config.GDUMP_ENS
     logger.debug(f"{jinja.Jinja(task_config.MARINE_ENSDA_STAGE_BKG_YAML_TMPL, ensbkgconf).render}")
     letkf_stage_list = parse_j2yaml(task_config.MARINE_ENSDA_STAGE_BKG_YAML_TMPL, ensbkgconf)
     logger.info(f"{letkf_stage_list}")
-    FileHandler(letkf_stage_list).sync()
+    stage_ens_list(letkf_stage_list, task_config)
 
 
 @logit(logger)
-def test_hist_date(histfile: str, ref_date: datetime) -> None:
+def stage_ens_list(stage_list: Dict, task_config: AttrDict) -> None:
+    """ Stage a rendered ensemble staging list to the DATA directory
+    The files to copy are staged per member, MARINE_ENSDA_STAGE_NTHREADS members at once,
+    and linked rather than copied when MARINE_ENSDA_STAGE_LINK is YES (development only).
+    The other actions of the list are left to FileHandler.
+    """
+    # create the directory structure once, before fanning out over the members
+    if stage_list.get('mkdir'):
+        FileHandler({'mkdir': stage_list['mkdir']}).sync()
+
+    manifest_dir = os.path.join(task_config.DATA, 'ens_stage_manifest')
+    FileHandler({'mkdir': [manifest_dir]}).sync()
+
+    use_links = task_config.get('MARINE_ENSDA_STAGE_LINK', 'NO') == 'YES'
+    if use_links:
+        logger.warning("WARNING: Linking is not permitted per EE2.")
+
+    members = _group_by_member(stage_list.get('copy', []))
+    max_workers = min(int(task_config.get('MARINE_ENSDA_STAGE_NTHREADS', 8)), max(len(members), 1))
+    logger.info(f"Staging {len(members)} member(s) with {max_workers} thread(s)")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {mem: executor.submit(_stage_member, mem, file_list,
+                                        os.path.join(manifest_dir, f"{mem}.yaml"), use_links)
+                   for mem, file_list in members.items()}
+    for mem, future in futures.items():
+        try:
+            future.result()
+        except Exception as ee:
+            raise WorkflowException(f"FATAL ERROR: Failed to stage ensemble member {mem}\n{ee}")
+
+    other_actions = {action: files for action, files in stage_list.items() if action not in ('mkdir', 'copy')}
+    if other_actions:
+        FileHandler(other_actions).sync()
+
+
+def _group_by_member(file_list: List) -> Dict[str, List]:
+    """Group [src, dest] pairs by the ensemble member found in the destination path
     """
-    Check that the date in the MOM6 history file is the expected one for the cycle.
-    TODO: Implement the same for seaice
+    members = {}
+    for src, dest in file_list:
+        match = re.search(r'mem\d{3}', dest)
+        key = match.group(0) if match else 'common'
+        members.setdefault(key, []).append([src, dest])
+    return members
+
+
+def _file_manifest(file_list: List) -> Dict[str, Dict]:
+    """Describe the source of each staged file by path, size and modification time
     """
+    manifest = {}
+    for src, dest in file_list:
+        stat = os.stat(src)
+        manifest[dest] = {'src': src, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    return manifest
 
-    ncf = Dataset(histfile, 'r')
-    hist_date = dparser.parse(ncf.variables['time'].units, fuzzy=True) + timedelta(hours=int(ncf.variables['time'][0]))
-    ncf.close()
-    logger.info(f"*** history file date: {hist_date} expected date: {ref_date}")
 
-    if hist_date != ref_date:
-        raise ValueError(f"FATAL ERROR: Inconsistent bkg date'")
+def _stage_member(mem: str, file_list: List, manifest_file: str, use_links: bool) -> None:
+    """Stage the files of one ensemble member, skipping it if its manifest is current
+    """
+    manifest = _file_manifest(file_list)
+
+    if os.path.isfile(manifest_file):
+        with open(manifest_file, 'r') as fh:
+            staged = yaml.safe_load(fh)
+        if staged == manifest and all(os.path.exists(dest) for dest in manifest):
+            logger.info(f"{mem} is already staged, skipping")
+            return
+
+    FileHandler({'mkdir': sorted({os.path.dirname(dest) for _, dest in file_list})}).sync()
+    if use_links:
+        for src, dest in file_list:
+            if os.path.lexists(dest):
+                os.remove(dest)
+            os.symlink(src, dest)
+    else:
+        FileHandler({'copy': file_list}).sync()
+
+    # the manifest is written last so that an interrupted member is restaged on retry
+    with open(manifest_file, 'w') as fh:
+        yaml.safe_dump(manifest, fh)
+    logger.info(f"Staged {len(file_list)} file(s) for {mem}")
 
 
 @logit(logger)
-def gen_bkg_list(bkg_path: str, window_begin=' ', yaml_name='bkg.yaml', ice_rst=False) -> None:
+def gen_bkg_list(bkg_path: str, window_begin=' ', yaml_name='bkg.yaml', ice_rst=False,
+                 catalog_name='bkg_catalog.yaml') -> MarineBkgCatalog:
     """
     Generate a YAML of the list of backgrounds for the pseudo model
+    The dates of all the backgrounds are checked against the window at once, and the
+    catalog of the backgrounds is saved to catalog_name for finalize
     """
 
     # Pseudo model parameters (time step, start date)
     # TODO: make this a parameter
     dt_pseudo = 3
-    bkg_date = window_begin
-
-    # Construct list of background file names
-    cyc = str(os.getenv('cyc')).zfill(2)
-    gcyc = str((int(cyc) - 6) % 24).zfill(2)  # previous cycle
     fcst_hrs = list(range(6, 10, dt_pseudo))
-    files = []
-    for fcst_hr in fcst_hrs:
-        files.append(os.path.join(bkg_path, f"ocean.bkg.f{str(fcst_hr).zfill(3)}.nc"))
-
-    # Identify the ocean background that will be used for the  vertical coordinate remapping
-    ocn_filename_ic = './INPUT/MOM.res.nc'
-    test_hist_date(ocn_filename_ic, bkg_date)  # assert date of the history file is correct
-
-    # Copy/process backgrounds and generate background yaml list
-    bkg_list = []
-    for bkg in files:
-        logger.info(f"****************** bkg: {bkg}")
-        # assert validity of the ocean bkg date, remove basename
-        bkg_date = bkg_date + timedelta(hours=dt_pseudo)
-        test_hist_date(bkg, bkg_date)
-        ocn_filename = os.path.splitext(os.path.basename(bkg))[0] + '.nc'
-
-        # prepare the seaice background, aggregate if the backgrounds are CICE restarts
-        ice_filename = ocn_filename.replace("ocean", "ice")
-
-        # prepare list of ocean and ice bkg to be copied to RUNDIR
-        bkg_dict = {'date': bkg_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
-                    'basename': './bkg/',
-                    'ocn_filename': ocn_filename,
-                    'ice_filename': ice_filename,
-                    'read_from_file': 1}
-
-        bkg_list.append(bkg_dict)
-
-    # save pseudo model yaml configuration
-    save_as_yaml(bkg_list, yaml_name)
+
+    # Catalog the backgrounds and the ocean background used for the vertical coordinate remapping
+    catalog = MarineBkgCatalog(bkg_path, window_begin, fcst_hrs, dt_pseudo=dt_pseudo,
+                               ocn_filename_ic='./INPUT/MOM.res.nc')
+    catalog.validate()  # assert the dates of all the history files are correct
+
+    # save pseudo model yaml configuration and the catalog
+    save_as_yaml(catalog.bkg_list(), yaml_name)
+    catalog.save(catalog_name)
+
+    return catalog
 
 
 @logit(logger)
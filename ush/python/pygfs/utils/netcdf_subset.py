@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+from logging import getLogger
+from typing import Dict, List, Optional
+
+import numpy as np
+from netCDF4 import Dataset, Variable
+
+from wxflow import logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+
+@logit(logger)
+def subset_netcdf(input_file: str, output_file: str, varlist: List[str], complevel: int = 1,
+                  chunks: Optional[Dict[str, int]] = None, max_memory_mb: float = 512.) -> None:
+    """Subset a list of variables from a netCDF file into a new, compressed, netCDF file
+
+    The variables are copied slab by slab so that no more than max_memory_mb of
+    data is held in memory at once. Only the requested variables, the coordinates
+    of their dimensions and the variables listed in their `coordinates` attribute
+    are read. Global and variable attributes are preserved.
+
+    Parameters
+    ----------
+    input_file : str
+        Input netCDF file
+    output_file : str
+        Output netCDF file
+    varlist : List[str]
+        Variables to subset
+    complevel : int
+        zlib compression level of the output variables, 0 disables the compression
+    chunks : Dict[str, int]
+        Chunk size of the output per dimension name, dimensions not listed are not chunked
+    max_memory_mb : float
+        Memory ceiling of a copied slab in MB
+
+    Returns
+    -------
+    None
+    """
+    chunks = {} if chunks is None else chunks
+    max_bytes = int(max_memory_mb * 1024 * 1024)
+
+    with Dataset(input_file, 'r') as ncin, Dataset(output_file, 'w', format='NETCDF4') as ncout:
+        ncin.set_auto_maskandscale(False)
+        ncout.setncatts({att: ncin.getncattr(att) for att in ncin.ncattrs()})
+
+        missing = [var for var in varlist if var not in ncin.variables]
+        if missing:
+            raise KeyError(f"Variables {', '.join(missing)} are not in {input_file}")
+
+        for name in _with_coordinates(ncin, varlist):
+            src = ncin.variables[name]
+            for dim in src.dimensions:
+                if dim not in ncout.dimensions:
+                    size = ncin.dimensions[dim]
+                    ncout.createDimension(dim, None if size.isunlimited() else size.size)
+
+            chunksizes = None
+            if src.ndim > 0 and any(dim in chunks for dim in src.dimensions):
+                chunksizes = [min(chunks.get(dim, size), size) or 1 for dim, size in zip(src.dimensions, src.shape)]
+            attrs = {att: src.getncattr(att) for att in src.ncattrs()}
+            dst = ncout.createVariable(name, src.dtype, src.dimensions,
+                                       zlib=complevel > 0 and src.ndim > 0, complevel=max(complevel, 1),
+                                       chunksizes=chunksizes, fill_value=attrs.pop('_FillValue', None))
+            dst.set_auto_maskandscale(False)
+            dst.setncatts(attrs)
+
+            logger.debug(f"Copying {name} {src.shape}")
+            _copy_slabs(src, dst, (), max_bytes)
+
+
+def _with_coordinates(ncin: Dataset, varlist: List[str]) -> List[str]:
+    """The requested variables preceded by their dimension and auxiliary coordinates"""
+    names = []
+    for name in varlist:
+        var = ncin.variables[name]
+        coords = [dim for dim in var.dimensions if dim in ncin.variables]
+        coords += [coord for coord in getattr(var, 'coordinates', '').split() if coord in ncin.variables]
+        for coord in coords + [name]:
+            if coord not in names:
+                names.append(coord)
+    return names
+
+
+def _copy_slabs(src: Variable, dst: Variable, index: tuple, max_bytes: int) -> None:
+    """Copy src[index] into dst[index] in slabs along the next dimension no larger than max_bytes"""
+    shape = src.shape[len(index):]
+    itemsize = np.dtype(src.dtype).itemsize
+    if len(shape) <= 2 or int(np.prod(shape)) * itemsize <= max_bytes:
+        # a single 2D slice is always copied at once
+        dst[index] = src[index]
+        return
+
+    slice_bytes = int(np.prod(shape[1:])) * itemsize
+    if slice_bytes > max_bytes:
+        for ii in range(shape[0]):
+            _copy_slabs(src, dst, index + (ii,), max_bytes)
+        return
+
+    step = max(max_bytes // slice_bytes, 1)
+    for start in range(0, shape[0], step):
+        slab = index + (slice(start, min(start + step, shape[0])),)
+        dst[slab] = src[slab]
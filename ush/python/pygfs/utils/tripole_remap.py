@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import tempfile
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from netCDF4 import Dataset
+
+from wxflow import logit
+
+logger = getLogger(__name__.split('.')[-1])
+
+# Horizontal dimensions of the MOM6 staggered grids
+MOM6_STAGGER_DIMS = {('yh', 'xh'): 'Ct', ('yh', 'xq'): 'Cu', ('yq', 'xh'): 'Cv', ('yq', 'xq'): 'Bu'}
+
+# Horizontal dimensions of the CICE grid; velocities are on the corner (U) points
+CICE_DIMS = ('nj', 'ni')
+
+# Vector components rotated from the tripole grid to east/north
+VECTOR_PAIRS = {'ocean': [('SSU', 'SSV'), ('uo', 'vo'), ('taux', 'tauy')],
+                'ice': [('uvel_h', 'vvel_h')]}
+
+FILL_VALUE = -1.0e20
+
+
+def read_esmf_weights(weight_file: str) -> Tuple[sp.csr_matrix, Tuple[int, int], np.ndarray, np.ndarray]:
+    """Read an ESMF weight file into a sparse matrix
+
+    Parameters
+    ----------
+    weight_file : str
+        ESMF weight file, e.g. tripole.mx025.Ct.to.rect.0p25.bilinear.nc
+
+    Returns
+    -------
+    Tuple[sp.csr_matrix, Tuple[int, int], np.ndarray, np.ndarray]
+        The (n_b, n_a) weight matrix, the destination grid dimensions (nlat, nlon)
+        and the destination latitudes and longitudes
+    """
+    with Dataset(weight_file, 'r') as ncf:
+        n_a = ncf.dimensions['n_a'].size
+        n_b = ncf.dimensions['n_b'].size
+        row = ncf.variables['row'][:].astype(np.int64) - 1
+        col = ncf.variables['col'][:].astype(np.int64) - 1
+        weights = ncf.variables['S'][:].astype(np.float64)
+        dst_dims = tuple(int(dd) for dd in ncf.variables['dst_grid_dims'][:])
+        dst_lat = np.asarray(ncf.variables['yc_b'][:])
+        dst_lon = np.asarray(ncf.variables['xc_b'][:])
+
+    matrix = sp.csr_matrix((weights, (row, col)), shape=(n_b, n_a))
+    # dst_grid_dims is stored in the Fortran order (nlon, nlat)
+    nlat, nlon = dst_dims[1], dst_dims[0]
+    return matrix, (nlat, nlon), dst_lat.reshape(nlat, nlon)[:, 0], dst_lon.reshape(nlat, nlon)[0, :]
+
+
+def read_var_list(csv_file: str) -> Dict[str, str]:
+    """Read the variables to remap and their remapping method from an ocnicepost
+    variable table (ocean.csv, ice.csv)
+
+    The name is the first column of each row and the method (bilinear or conserve)
+    the third one; the header and comment rows, which carry no dimension count
+    in the second column, are skipped.
+    """
+    varlist = {}
+    with open(csv_file, 'r') as fh:
+        for line in fh:
+            columns = [column.strip() for column in line.split(',')]
+            if len(columns) < 2 or columns[0].startswith('#') or not columns[1].isdigit():
+                continue
+            varlist[columns[0]] = columns[2] if len(columns) > 2 and columns[2] else 'bilinear'
+    return varlist
+
+
+def source_mask(mask_data: np.ndarray, component: str) -> np.ndarray:
+    """Surface mask of the ocean points on the tripole grid
+
+    The MOM6 mask variable (e.g. temp) is missing on land, the CICE one (tmask)
+    is 1 over the ocean and 0 over land.
+    """
+    surface = mask_data.reshape(-1, *mask_data.shape[-2:])[0]
+    if component == 'ice':
+        return np.isfinite(surface) & (surface != 0.0)
+    return np.isfinite(surface)
+
+
+def mask_weights(matrix: sp.csr_matrix, src_mask: np.ndarray) -> sp.csr_matrix:
+    """Remove the contribution of the masked (land) source points and renormalize
+    the weights of each destination point
+    """
+    masked = (matrix @ sp.diags(src_mask.astype(np.float64))).tocsr()
+    row_sum = np.asarray(masked.sum(axis=1)).ravel()
+    scale = np.divide(1.0, row_sum, out=np.zeros_like(row_sum), where=row_sum > 0.0)
+    return (sp.diags(scale) @ masked).tocsr()
+
+
+class TripoleRemapper:
+    """Remap MOM6/CICE tripole fields to a rectilinear lat/lon grid in-process
+
+    The ESMF weights are read once and cached on disk as a sparse matrix per
+    model grid, product grid, method and source mask. All the fields of a file
+    are remapped with sparse matrix-matrix products over chunks of levels.
+    """
+
+    @logit(logger, name="TripoleRemapper")
+    def __init__(self, fixdir: str, model_grid: str, product_grid: str, cache_dir: str,
+                 method: str = 'bilinear', chunk_size: int = 10) -> None:
+        """Constructor for the tripole remapper
+
+        Parameters
+        ----------
+        fixdir : str
+            Directory holding the tripole.{model_grid}.*.nc weight files
+        model_grid : str
+            Source tripole grid e.g. mx025
+        product_grid : str
+            Target lat/lon grid e.g. 0p25
+        cache_dir : str
+            Directory of the cached sparse weights
+        method : str
+            Default remapping method to the product grid (bilinear or conserve)
+        chunk_size : int
+            Number of 2D fields (variables x levels) remapped in one product
+
+        Returns
+        -------
+        None
+        """
+        self.fixdir = fixdir
+        self.model_grid = model_grid
+        self.product_grid = product_grid
+        self.cache_dir = cache_dir
+        self.method = method
+        self.chunk_size = chunk_size
+
+        self._weights = {}
+        self.dst_dims, self.lat, self.lon = None, None, None
+
+    def _weight_file(self, stagger: str, method: str) -> str:
+        if stagger == 'Ct':
+            return os.path.join(self.fixdir, f"tripole.{self.model_grid}.Ct.to.rect.{self.product_grid}.{method}.nc")
+        return os.path.join(self.fixdir, f"tripole.{self.model_grid}.{stagger}.to.Ct.bilinear.nc")
+
+    def _grid_file(self, method: str) -> str:
+        return os.path.join(self.cache_dir, f"rect.{self.product_grid}.{method}.npz")
+
+    def _save(self, cache_file: str, writer) -> None:
+        # write to a temporary file first, jobs of other forecast hours may be reading the cache
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.npz', delete=False) as tmp:
+            writer(tmp)
+        os.replace(tmp.name, cache_file)
+
+    @logit(logger)
+    def weights(self, stagger: str = 'Ct', src_mask: Optional[np.ndarray] = None, method: Optional[str] = None) -> sp.csr_matrix:
+        """Sparse weights from the stagger to the product grid (Ct) or to Ct (staggered grids),
+        loaded from the cache or computed from the ESMF weight file and then cached
+
+        The method applies to the product grid only, the staggered grids are always
+        brought to Ct with bilinear weights.
+        """
+        method = (method or self.method) if stagger == 'Ct' else 'bilinear'
+        mask_key = 'nomask' if src_mask is None else hashlib.sha1(np.packbits(src_mask.astype(bool)).tobytes()).hexdigest()[:12]
+        target = self.product_grid if stagger == 'Ct' else 'Ct'
+        key = f"{self.model_grid}.{stagger}.to.{target}.{method}.{mask_key}"
+        if key in self._weights:
+            return self._weights[key]
+
+        cache_file = os.path.join(self.cache_dir, f"{key}.npz")
+        if os.path.isfile(cache_file):
+            logger.info(f"Loading cached weights {cache_file}")
+            matrix = sp.load_npz(cache_file).tocsr()
+        else:
+            logger.info(f"Computing weights from {self._weight_file(stagger, method)}")
+            matrix, dst_dims, lat, lon = read_esmf_weights(self._weight_file(stagger, method))
+            if src_mask is not None:
+                matrix = mask_weights(matrix, src_mask.ravel())
+            # the grid goes first: a job finding the weights in the cache expects the grid next to them
+            if stagger == 'Ct':
+                self._save(self._grid_file(method), lambda fh: np.savez(fh, dst_dims=dst_dims, lat=lat, lon=lon))
+            self._save(cache_file, lambda fh: sp.save_npz(fh, matrix))
+
+        if stagger == 'Ct' and self.dst_dims is None:
+            grid = np.load(self._grid_file(method))
+            self.dst_dims, self.lat, self.lon = tuple(grid['dst_dims']), grid['lat'], grid['lon']
+
+        self._weights[key] = matrix
+        return matrix
+
+    def apply(self, matrix: sp.csr_matrix, fields: np.ndarray) -> np.ndarray:
+        """Remap a stack of 2D fields (nfields, ny, nx) with NaN for missing values
+
+        Missing values are excluded and the weights renormalized, destination points
+        without any valid source are set to NaN.
+        """
+        nfields = fields.shape[0]
+        src = fields.reshape(nfields, -1)
+        dst = np.empty((nfields, matrix.shape[0]), dtype=np.float64)
+        for start in range(0, nfields, self.chunk_size):
+            chunk = src[start:start + self.chunk_size].T
+            valid = np.isfinite(chunk)
+            # one product for the data and the valid-point count of all the fields of the chunk
+            both = matrix @ np.hstack([np.where(valid, chunk, 0.0), valid.astype(np.float64)])
+            ncol = chunk.shape[1]
+            num, den = both[:, :ncol], both[:, ncol:]
+            dst[start:start + ncol] = np.divide(num, den, out=np.full_like(num, np.nan), where=den > 1.0e-6).T
+        return dst
+
+    @logit(logger)
+    def remap_file(self, input_file: str, output_file: str, component: str, maskvar: str,
+                   sinvar: str = '', cosvar: str = '', angvar: str = '',
+                   varlist: Optional[List[str]] = None, methods: Optional[Dict[str, str]] = None) -> None:
+        """Remap the tripole variables of a MOM6/CICE history file to the product grid
+
+        Parameters
+        ----------
+        input_file : str
+            History file on the tripole grid
+        output_file : str
+            Output file on the lat/lon grid
+        component : str
+            ocean or ice
+        maskvar : str
+            Variable defining the source (ocean) mask
+        sinvar, cosvar, angvar : str
+            Variables defining the rotation of the tripole grid (sin/cos for MOM6, angle for CICE)
+        varlist : List[str]
+            Variables to remap, default is all variables on the tripole grid
+        methods : Dict[str, str]
+            Remapping method of each variable to the product grid, default is the method of the remapper
+
+        Returns
+        -------
+        None
+        """
+        with Dataset(input_file, 'r') as ncin:
+            fields = self._read_fields(ncin, varlist)
+
+            # surface mask of the ocean points, the mask variable is not necessarily remapped
+            src_mask = None
+            if maskvar in ncin.variables:
+                src_mask = source_mask(np.ma.filled(ncin.variables[maskvar][:].astype(np.float64), np.nan), component)
+
+            # bring the staggered fields to the cell centers
+            for name, (stagger, data, _) in fields.items():
+                if stagger != 'Ct':
+                    fields[name] = ('Ct', self._stack_apply(self.weights(stagger), data), fields[name][2])
+
+            self._rotate(ncin, fields, component, sinvar, cosvar, angvar)
+
+            # one product per method (e.g. conservative for the fluxes, bilinear otherwise)
+            methods = methods or {}
+            remapped = {}
+            for method in dict.fromkeys(methods.get(name, self.method) for name in fields):
+                matrix = self.weights('Ct', src_mask, method)
+                remapped.update({name: self._stack_apply(matrix, data, self.dst_dims) for name, (_, data, _) in fields.items()
+                                 if methods.get(name, self.method) == method})
+
+            self._write(ncin, output_file, fields, remapped)
+
+    def _stack_apply(self, matrix: sp.csr_matrix, data: np.ndarray, dst_dims: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        lead = data.shape[:-2]
+        dst_dims = data.shape[-2:] if dst_dims is None else dst_dims
+        out = self.apply(matrix, data.reshape(-1, *data.shape[-2:]))
+        return out.reshape(*lead, *dst_dims)
+
+    @staticmethod
+    def _stagger(var) -> Optional[str]:
+        hdims = tuple(var.dimensions[-2:])
+        if hdims in MOM6_STAGGER_DIMS:
+            return MOM6_STAGGER_DIMS[hdims]
+        if hdims == CICE_DIMS:
+            return 'Bu' if 'ULON' in getattr(var, 'coordinates', '') else 'Ct'
+        return None
+
+    def _read_fields(self, ncin: Dataset, varlist: Optional[List[str]]) -> Dict:
+        fields = {}
+        for name, var in ncin.variables.items():
+            stagger = self._stagger(var)
+            if stagger is None or (varlist is not None and name not in varlist):
+                continue
+            data = np.ma.filled(var[:].astype(np.float64), np.nan)
+            fields[name] = (stagger, data, var.dimensions)
+        return fields
+
+    @staticmethod
+    def _rotate(ncin: Dataset, fields: Dict, component: str, sinvar: str, cosvar: str, angvar: str) -> None:
+        if angvar:
+            angle = np.ma.filled(ncin.variables[angvar][:].astype(np.float64), 0.0)
+            sinrot, cosrot = -np.sin(angle), np.cos(angle)
+        elif sinvar and cosvar:
+            sinrot = np.ma.filled(ncin.variables[sinvar][:].astype(np.float64), 0.0)
+            cosrot = np.ma.filled(ncin.variables[cosvar][:].astype(np.float64), 0.0)
+        else:
+            return
+
+        for uname, vname in VECTOR_PAIRS.get(component, []):
+            if uname not in fields or vname not in fields:
+                continue
+            uu, vv = fields[uname][1], fields[vname][1]
+            fields[uname] = ('Ct', uu * cosrot + vv * sinrot, fields[uname][2])
+            fields[vname] = ('Ct', vv * cosrot - uu * sinrot, fields[vname][2])
+
+    def _write(self, ncin: Dataset, output_file: str, fields: Dict, remapped: Dict) -> None:
+        nlat, nlon = self.dst_dims
+        with Dataset(output_file, 'w') as ncout:
+            ncout.setncatts({att: ncin.getncattr(att) for att in ncin.ncattrs()})
+            ncout.createDimension('longitude', nlon)
+            ncout.createDimension('latitude', nlat)
+            lon = ncout.createVariable('longitude', 'f8', ('longitude',))
+            lon.units = 'degrees_east'
+            lon[:] = self.lon
+            lat = ncout.createVariable('latitude', 'f8', ('latitude',))
+            lat.units = 'degrees_north'
+            lat[:] = self.lat
+
+            for name, (_, _, dims) in fields.items():
+                lead_dims = dims[:-2]
+                for dim in lead_dims:
+                    if dim not in ncout.dimensions:
+                        size = ncin.dimensions[dim]
+                        ncout.createDimension(dim, None if size.isunlimited() else size.size)
+                        if dim in ncin.variables:
+                            coord = ncout.createVariable(dim, ncin.variables[dim].dtype, (dim,))
+                            coord.setncatts({att: ncin.variables[dim].getncattr(att) for att in ncin.variables[dim].ncattrs()
+                                            if att != '_FillValue'})
+                            coord[:] = ncin.variables[dim][:]
+                var = ncout.createVariable(name, 'f4', (*lead_dims, 'latitude', 'longitude'), fill_value=FILL_VALUE)
+                var.setncatts({att: ncin.variables[name].getncattr(att) for att in ncin.variables[name].ncattrs()
+                               if att not in ['_FillValue', 'missing_value', 'coordinates']})
+                var[:] = np.where(np.isfinite(remapped[name]), remapped[name], FILL_VALUE)
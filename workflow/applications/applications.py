@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 
-from typing import Dict, List, Any
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Tuple
 from datetime import timedelta
 from hosts import Host
 from wxflow import Configuration, to_timedelta
+from applications.config_cache import ConfigCache
 from abc import ABC, ABCMeta, abstractmethod
 
 __all__ = ['AppConfig']
 
 
+def _parse_config(conf: Configuration, files: List[str], run: str) -> Tuple[Dict[str, Any], float]:
+    '''
+    Source files for a RUN in a worker process, returns the configuration and the time it took
+    '''
+    start = time.perf_counter()
+    config = conf.parse_config(files, RUN=run)
+    return config, time.perf_counter() - start
+
+
 class AppConfigInit(ABCMeta):
     def __call__(cls, *args, **kwargs):
         '''
@@ -27,6 +40,9 @@ class AppConfig(ABC, metaclass=AppConfigInit):
 
     VALID_MODES = ['cycled', 'forecast-only']
 
+    # Number of configurations sourced at once
+    max_workers = os.cpu_count() or 1
+
     def __init__(self, conf: Configuration) -> None:
 
         self.scheduler = Host().scheduler
@@ -100,8 +116,17 @@ class AppConfig(ABC, metaclass=AppConfigInit):
         # Get a list of all possible config_files that would be part of the application
         self.configs_names = self._get_app_configs()
 
+        # Configurations whose files did not change since the last setup are read from the cache
+        self.config_cache = ConfigCache(conf)
+
+        # Wall time of each setup phase and time spent sourcing each config, for profiling
+        self.timings = dict()
+        self.source_times = dict()
+
         # Source the config files for the jobs in the application without specifying a RUN
+        start = time.perf_counter()
         self.configs = {'_no_run': self._source_configs(conf)}
+        self.timings['source configs (no RUN)'] = time.perf_counter() - start
 
         # Update the base config dictionary based on application
         self.configs['_no_run']['base'] = self._update_base(self.configs['_no_run']['base'])
@@ -115,13 +140,20 @@ class AppConfig(ABC, metaclass=AppConfigInit):
         # Get task names for the application
         self.task_names = self.get_task_names()
 
-        # Finally, source the configuration files for each valid `RUN`
-        for run in self.task_names.keys():
-            self.configs[run] = self._source_configs(conf, run=run, log=False)
+        # Finally, source the configuration files for each valid `RUN`, all RUNs at once
+        start = time.perf_counter()
+        self.configs.update(self._source_runs_configs(conf, list(self.task_names.keys()), log=False))
+        self.timings[f'source configs ({", ".join(self.task_names.keys())})'] = time.perf_counter() - start
 
+        for run in self.task_names.keys():
             # Update the base config dictionary based on application and RUN
             self.configs[run]['base'] = self._update_base(self.configs[run]['base'])
 
+        # Drop the cached configurations of files that changed since
+        self.config_cache.prune()
+        print(f"Sourced {self.config_cache.misses} configurations, "
+              f"{self.config_cache.hits} unchanged configurations read from {self.config_cache.cache_dir}")
+
     @abstractmethod
     def _get_app_configs(self):
         pass
@@ -152,37 +184,75 @@ class AppConfig(ABC, metaclass=AppConfigInit):
         Every config depends on "config.base"
         """
 
-        configs = dict()
-
-        # Return config.base as well
-        configs['base'] = conf.parse_config('config.base', RUN=run)
-
-        # Source the list of all config_files involved in the application
-        for config in self.configs_names:
-
-            # All must source config.base first
-            files = ['config.base']
-
-            if config in ['eobs', 'eomg']:
-                files += ['config.anal', 'config.eobs']
-            elif config in ['eupd']:
-                files += ['config.anal', 'config.eupd']
-            elif config in ['efcs']:
-                files += ['config.fcst', 'config.efcs']
-            elif config in ['atmanlinit', 'atmanlvar', 'atmanlfv3inc']:
-                files += ['config.atmanl', f'config.{config}']
-            elif config in ['atmensanlinit', 'atmensanlobs', 'atmensanlsol', 'atmensanlletkf', 'atmensanlfv3inc']:
-                files += ['config.atmensanl', f'config.{config}']
-            elif 'wave' in config:
-                files += ['config.wave', f'config.{config}']
-            else:
-                files += [f'config.{config}']
+        return self._source_runs_configs(conf, [run], log=log)[run]
 
-            print(f'sourcing config.{config}') if log else 0
-            configs[config] = conf.parse_config(files, RUN=run)
+    def _source_runs_configs(self, conf: Configuration, runs: List[str], log: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Source the configurations of each config for several RUNs and return a dictionary per RUN
+
+        Configurations whose files did not change are read from the cache, the others are
+        independent bash evaluations and are sourced concurrently in a process pool. The
+        result does not depend on the order in which they complete.
+        """
+
+        # config.base is returned as well
+        jobs = dict()
+        for run in runs:
+            jobs[(run, 'base')] = ['config.base']
+            for config in self.configs_names:
+                jobs[(run, config)] = self._get_config_files(config)
+
+        results = dict()
+        pending = dict()
+        for (run, config), files in jobs.items():
+            key, cached = self.config_cache.lookup(files, RUN=run)
+            if cached is None:
+                pending[(run, config)] = (key, files)
+            else:
+                results[(run, config)] = cached
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=max(min(self.max_workers, len(pending)), 1)) as executor:
+                futures = {job: executor.submit(_parse_config, conf, files, job[0])
+                           for job, (_, files) in pending.items()}
+                for (run, config), future in futures.items():
+                    print(f'sourcing config.{config}') if log and config != 'base' else 0
+                    results[(run, config)], seconds = future.result()
+                    self.config_cache.store(pending[(run, config)][0], results[(run, config)])
+                    self.source_times.setdefault(run, dict())[config] = seconds
+
+        configs = {run: dict() for run in runs}
+        for run, config in jobs:
+            configs[run][config] = results[(run, config)]
 
         return configs
 
+    @staticmethod
+    def _get_config_files(config: str) -> List[str]:
+        """
+        Config files to source, in order, for the config of a job
+        """
+
+        # All must source config.base first
+        files = ['config.base']
+
+        if config in ['eobs', 'eomg']:
+            files += ['config.anal', 'config.eobs']
+        elif config in ['eupd']:
+            files += ['config.anal', 'config.eupd']
+        elif config in ['efcs']:
+            files += ['config.fcst', 'config.efcs']
+        elif config in ['atmanlinit', 'atmanlvar', 'atmanlfv3inc']:
+            files += ['config.atmanl', f'config.{config}']
+        elif config in ['atmensanlinit', 'atmensanlobs', 'atmensanlsol', 'atmensanlletkf', 'atmensanlfv3inc']:
+            files += ['config.atmensanl', f'config.{config}']
+        elif 'wave' in config:
+            files += ['config.wave', f'config.{config}']
+        else:
+            files += [f'config.{config}']
+
+        return files
+
     @abstractmethod
     def get_task_names(self, run="_no_run") -> Dict[str, List[str]]:
         '''
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import re
+from typing import Any, Dict, List, Set, Tuple, Union
+
+from wxflow import Configuration
+
+__all__ = ['ConfigCache']
+
+# `source ${EXPDIR}/config.X` or `. $EXPDIR/config.X` lines of a config file
+SOURCE_PATTERN = re.compile(r'^\s*(?:source|\.)\s+["\']?([^"\'\s;]+)', re.MULTILINE)
+SHELL_VARIABLE = re.compile(r'\$\{?\w+\}?')
+# Names of the shell variables referenced by a config, e.g. ${machine}, $EXPDIR or ${!run_resource_var}
+VARIABLE_NAME = re.compile(r'\$\{?!?([A-Za-z_]\w*)')
+
+
+class ConfigCache:
+    '''
+    Cache of sourced configurations, persisted in the experiment directory
+
+    A parsed configuration is stored under a key made of the content hash of every file
+    it sources (the requested configs and the configs they source in turn, e.g. config.com
+    from config.base or config.resources.${machine} from config.resources), the variables
+    exported before sourcing (e.g. RUN) and the value in the calling environment of every
+    variable these files reference.
+    Editing a config therefore re-sources only the configurations that depend on it.
+
+    Parameters
+    ----------
+    conf: Configuration
+          Configuration of the experiment directory
+    cache_dir: str (optional)
+               Directory of the cache, default: ${EXPDIR}/.config_cache
+    enabled: bool (optional)
+             When False, every configuration is sourced and nothing is stored
+    '''
+
+    VERSION = 1
+
+    def __init__(self, conf: Configuration, cache_dir: str = None, enabled: bool = True) -> None:
+        self.conf = conf
+        self.cache_dir = cache_dir or os.path.join(conf.config_dir, '.config_cache')
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._used = set()
+        self._scans = {}
+
+    def parse_config(self, files: Union[str, List[str]], **envvars) -> Dict[str, Any]:
+        '''
+        Same as Configuration.parse_config, from the cache when the inputs did not change
+        '''
+        key, config = self.lookup(files, **envvars)
+        if config is None:
+            config = self.conf.parse_config(files, **envvars)
+            self.store(key, config)
+        return config
+
+    def lookup(self, files: Union[str, List[str]], **envvars) -> Tuple[str, Union[Dict[str, Any], None]]:
+        '''
+        Cache key and cached configuration of sourcing files, the configuration is None
+        if it must be sourced (and then stored under the key)
+        '''
+        if not self.enabled:
+            self.misses += 1
+            return None, None
+
+        key = self.key(files, **envvars)
+        config = self.load(key)
+        if config is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, config
+
+    def key(self, files: Union[str, List[str]], **envvars) -> str:
+        '''
+        Cache key of sourcing files with the variables envvars exported beforehand
+        '''
+        files = [files] if isinstance(files, (str, bytes)) else list(files)
+        paths = [self.conf.find_config(file) for file in files]
+        sources = sorted(self._dependencies(paths))
+        referenced = set()
+        for path in sources:
+            referenced.update(self._scan(path)[2])
+        inputs = {'version': self.VERSION,
+                  'files': [os.path.basename(path) for path in paths],
+                  'sources': {os.path.basename(path): self._scan(path)[0] for path in sources},
+                  'envvars': {key: str(value) for key, value in sorted(envvars.items())},
+                  'environment': {name: os.environ.get(name) for name in sorted(referenced)}}
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def load(self, key: str) -> Union[Dict[str, Any], None]:
+        '''
+        Cached configuration of a key, None if it is not (or no longer readable) in the cache
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                config = pickle.load(fh)
+        except Exception:
+            # missing or unreadable entry, e.g. written by another python version
+            return None
+        self._used.add(key)
+        return config
+
+    def store(self, key: str, config: Dict[str, Any]) -> None:
+        '''
+        Write a configuration in the cache; the write is atomic so that concurrent
+        runs never read a partial entry
+        '''
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(config, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._used.add(key)
+
+    def prune(self) -> int:
+        '''
+        Remove the entries that were not used by this instance, returns how many were removed
+        '''
+        removed = 0
+        for path in glob.glob(os.path.join(self.cache_dir, '*.pkl')):
+            if os.path.basename(path)[:-len('.pkl')] not in self._used:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _dependencies(self, paths: List[str]) -> Set[str]:
+        '''
+        Config files sourced by paths, including themselves, following `source` lines
+        that point to other configs of the experiment directory. Shell variables in the
+        name of a sourced config match any name, e.g. config.resources.${machine}
+        matches every config.resources.* file.
+        '''
+        found = set()
+        stack = list(paths)
+        while stack:
+            path = stack.pop()
+            if path in found:
+                continue
+            found.add(path)
+            stack.extend(self._scan(path)[1])
+        return found
+
+    def _scan(self, path: str) -> Tuple[str, List[str], Set[str]]:
+        '''
+        Content hash of a config file, the configs it sources and the shell variables it
+        references; scanned once per instance unless the file changes
+        '''
+        stat = os.stat(path)
+        memo = (path, stat.st_mtime_ns, stat.st_size)
+        if memo not in self._scans:
+            with open(path, 'rb') as fh:
+                content = fh.read()
+            text = content.decode(errors='replace')
+            sourced = []
+            for target in SOURCE_PATTERN.findall(text):
+                name = os.path.basename(target)
+                if name.startswith('config.'):
+                    pattern = SHELL_VARIABLE.sub('*', name)
+                    sourced.extend(sorted(glob.glob(os.path.join(self.conf.config_dir, pattern))))
+            self._scans[memo] = (hashlib.sha256(content).hexdigest(), sourced, set(VARIABLE_NAME.findall(text)))
+        return self._scans[memo]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Critical path and maximum sustainable cycle rate of a Rocoto workflow
+"""
+
+import glob
+import os
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from typing import Dict
+
+from rocoto.workflow_dag import WorkflowDAG, durations_from_rocoto_db, hms_to_seconds
+
+
+def input_args(*argv):
+    """
+    Method to collect user arguments for `critical_path.py`
+    """
+
+    description = """
+        Reads a Rocoto workflow XML and, for each cycledef group, prints the longest
+        chain of dependent tasks of a cycle and the number of cycles per day that the
+        dependencies on previous cycles and the cyclethrottle allow.
+        Task durations are the walltimes of the XML, or statistics of the succeeded
+        jobs of a Rocoto database.
+        """
+
+    parser = ArgumentParser(description=description,
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('xml', help='workflow XML, or experiment directory containing $PSLOT.xml', type=str)
+    parser.add_argument('--db', help='Rocoto database to take the task durations from', type=str,
+                        default=None, required=False)
+    parser.add_argument('--statistic', help='statistic of the durations of the database: median, mean, max or pNN',
+                        type=str, default='median', required=False)
+    parser.add_argument('--group', help='cycledef group to analyse, default is every group', type=str,
+                        default=None, required=False)
+    parser.add_argument('--interval', help='cycle interval in hours, default is the interval of the cycledef',
+                        type=float, default=None, required=False)
+
+    return parser.parse_args(argv[0][0] if len(argv[0]) else None)
+
+
+def find_xml(path: str) -> str:
+    """
+    Workflow XML of an experiment directory, or path itself if it is a file
+    """
+
+    if os.path.isfile(path):
+        return path
+    xml_files = sorted(glob.glob(os.path.join(path, '*.xml')))
+    if len(xml_files) != 1:
+        raise FileNotFoundError(f'Expected a single workflow XML in {path}, found {len(xml_files)}')
+    return xml_files[0]
+
+
+def cycle_interval(cycledefs: list) -> int:
+    """
+    Interval in seconds of the first cycledef of a group ("start end interval")
+    """
+
+    fields = cycledefs[0].split()
+    return hms_to_seconds(fields[2]) if len(fields) == 3 else 0
+
+
+def report(dag: WorkflowDAG, durations: Dict[str, float], group: str, interval: float) -> None:
+
+    def duration(name):
+        return durations.get(name, dag.tasks[name].walltime)
+
+    length, path = dag.critical_path(durations, group)
+    print(f'cycledef group {group}: {len(dag.in_cycle(group))} tasks, one cycle takes {length / 3600.:.2f} h')
+    print('  critical path:')
+    for name in path:
+        print(f'    {name:<40} {duration(name) / 60.:8.1f} min')
+
+    if interval <= 0:
+        return
+    period, loop = dag.max_cycle_ratio(durations, interval, group)
+    cyclethrottle = int(dag.attributes.get('cyclethrottle', 1))
+    throttled = length / cyclethrottle if cyclethrottle > 0 else 0.
+    per_cycle = max(period, throttled)
+    if per_cycle <= 0:
+        print('  no dependency on previous cycles limits the cycle rate')
+        return
+    print(f'  maximum sustainable rate: {86400. / per_cycle:.2f} cycles per day '
+          f'({per_cycle / 3600.:.2f} h per cycle, {interval / per_cycle:.2f}x real time)')
+    if period >= throttled:
+        print('  limited by the dependencies on previous cycles:')
+        for pred, succ in loop:
+            print(f'    {pred} (previous cycle) -> {succ}')
+    else:
+        print(f'  limited by cyclethrottle={cyclethrottle}, loops across cycles take {period / 3600.:.2f} h per cycle')
+
+
+def main(*argv):
+
+    user_inputs = input_args(argv)
+    dag = WorkflowDAG.from_xml(find_xml(user_inputs.xml))
+    durations = dict()
+    if user_inputs.db is not None:
+        durations = durations_from_rocoto_db(user_inputs.db, user_inputs.statistic)
+
+    groups = list(dag.cycledefs) if user_inputs.group is None else [user_inputs.group]
+    for group in groups:
+        if group not in dag.cycledefs:
+            raise KeyError(f'Unknown cycledef group {group}, valid groups are {", ".join(dag.cycledefs)}')
+        interval = user_inputs.interval * 3600. if user_inputs.interval else cycle_interval(dag.cycledefs[group])
+        report(dag, durations, group, interval)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -208,7 +208,7 @@ class GEFSTasks(Tasks):
         history_path_tmpl = component_dict['history_path_tmpl']
         history_file_tmpl = component_dict['history_file_tmpl']
 
-        resources = self.get_resource(config)
+        resources, fhr_var_dict = self._product_forecast_hour_groups(component)
 
         history_path = self._template_to_rocoto_cycstring(self._base[history_path_tmpl], {'MEMDIR': 'mem#member#'})
         deps = []
@@ -223,11 +223,12 @@ class GEFSTasks(Tasks):
         postenvar_dict = {'ENSMEM': '#member#',
                           'MEMDIR': 'mem#member#',
                           'FHR3': '#fhr#',
+                          'FHR_LIST': '#fhr_list#',
                           'COMPONENT': component}
         for key, value in postenvar_dict.items():
             postenvars.append(rocoto.create_envar(name=key, value=str(value)))
 
-        task_name = f'gefs_{component}_prod_mem#member#_f#fhr#'
+        task_name = f'gefs_{component}_prod_mem#member#_f#grp#'
         task_dict = {'task_name': task_name,
                      'resources': resources,
                      'dependency': dependencies,
@@ -238,6 +239,28 @@ class GEFSTasks(Tasks):
                      'log': f'{self.rotdir}/logs/@Y@m@d@H/{task_name}.log',
                      'maxtries': '&MAXTRIES;'}
 
+        fhr_metatask_dict = {'task_name': f'gefs_{component}_prod_#member#',
+                             'task_dict': task_dict,
+                             'var_dict': fhr_var_dict}
+
+        member_var_dict = {'member': ' '.join([f"{mem:03d}" for mem in range(0, self.nmem + 1)])}
+        member_metatask_dict = {'task_name': f'gefs_{component}_prod',
+                                'task_dict': fhr_metatask_dict,
+                                'var_dict': member_var_dict}
+
+        task = rocoto.create_task(member_metatask_dict)
+
+        return task
+
+    def _product_forecast_hour_groups(self, component: str):
+        """
+        Resources and metatask variables of the product tasks of a component, one task per
+        group of forecast hours (see _group_forecast_hours)
+        """
+
+        config = 'atmos_products' if component in ['atmos'] else 'oceanice_products'
+        resources = self.get_resource(config)
+
         fhrs = self._get_forecast_hours('gefs', self._configs[config], component)
 
         # when replaying, atmos component does not have fhr 0, therefore remove 0 from fhrs
@@ -249,23 +272,13 @@ class GEFSTasks(Tasks):
         if component in ['ocean', 'ice'] and 0 in fhrs:
             fhrs.remove(0)
 
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+        # A job processes a group of forecast hours and waits for the output of the last one
+        fhr_var_dict = self._group_forecast_hours(config, fhrs, resources)
         if component in ['ocean']:
-            fhrs_next = fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]
-            fhr_var_dict['fhr_next'] = ' '.join([f"{fhr:03d}" for fhr in fhrs_next])
+            fhrs_next = dict(zip(fhrs, fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]))
+            fhr_var_dict['fhr_next'] = ' '.join([f"{fhrs_next[int(fhr)]:03d}" for fhr in fhr_var_dict['fhr'].split()])
 
-        fhr_metatask_dict = {'task_name': f'gefs_{component}_prod_#member#',
-                             'task_dict': task_dict,
-                             'var_dict': fhr_var_dict}
-
-        member_var_dict = {'member': ' '.join([f"{mem:03d}" for mem in range(0, self.nmem + 1)])}
-        member_metatask_dict = {'task_name': f'gefs_{component}_prod',
-                                'task_dict': fhr_metatask_dict,
-                                'var_dict': member_var_dict}
-
-        task = rocoto.create_task(member_metatask_dict)
-
-        return task
+        return resources, fhr_var_dict
 
     def atmos_ensstat(self):
 
@@ -273,7 +286,7 @@ class GEFSTasks(Tasks):
 
         deps = []
         for member in range(0, self.nmem + 1):
-            task = f'gefs_atmos_prod_mem{member:03d}_f#fhr#'
+            task = f'gefs_atmos_prod_mem{member:03d}_f#prod_grp#'
             dep_dict = {'type': 'task', 'name': task}
             deps.append(rocoto.add_dependency(dep_dict))
 
@@ -302,7 +315,14 @@ class GEFSTasks(Tasks):
         if is_replay and 0 in fhrs:
             fhrs.remove(0)
 
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+        # the atmos products task of the group of each forecast hour
+        _, prod_var_dict = self._product_forecast_hour_groups('atmos')
+        prod_grp = dict()
+        for fhr_list, grp in zip(prod_var_dict['fhr_list'].split(), prod_var_dict['grp'].split()):
+            prod_grp.update({int(fhr): grp for fhr in fhr_list.split('_')})
+
+        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs]),
+                        'prod_grp': ' '.join([prod_grp.get(fhr, f"{fhr:03d}") for fhr in fhrs])}
 
         fhr_metatask_dict = {'task_name': f'gefs_atmos_ensstat',
                              'task_dict': task_dict,
@@ -1070,6 +1070,7 @@ class GFSTasks(Tasks):
 
         postenvars = self.envars.copy()
         postenvar_dict = {'FHR3': '#fhr#',
+                          'FHR_LIST': '#fhr_list#',
                           'UPP_RUN': upp_run}
         for key, value in postenvar_dict.items():
             postenvars.append(rocoto.create_envar(name=key, value=str(value)))
@@ -1089,7 +1090,11 @@ class GFSTasks(Tasks):
         cycledef = 'gdas_half,gdas' if self.run in ['gdas'] else self.run
         resources = self.get_resource('upp')
 
-        task_name = f'{self.run}_{task_id}_f#fhr#'
+        # a task processes a group of forecast hours and depends on the output of the last one
+        fhrs = self._get_forecast_hours(self.run, self._configs['upp'])
+        fhr_var_dict = self._group_forecast_hours('upp', fhrs, resources)
+
+        task_name = f'{self.run}_{task_id}_f#grp#'
         task_dict = {'task_name': task_name,
                      'resources': resources,
                      'dependency': dependencies,
@@ -1101,9 +1106,6 @@ class GFSTasks(Tasks):
                      'maxtries': '&MAXTRIES;'
                      }
 
-        fhrs = self._get_forecast_hours(self.run, self._configs['upp'])
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
-
         metatask_dict = {'task_name': f'{self.run}_{task_id}',
                          'task_dict': task_dict,
                          'var_dict': fhr_var_dict
@@ -1140,10 +1142,23 @@ class GFSTasks(Tasks):
         history_file_tmpl = component_dict['history_file_tmpl']
 
         postenvars = self.envars.copy()
-        postenvar_dict = {'FHR3': '#fhr#', 'COMPONENT': component}
+        postenvar_dict = {'FHR3': '#fhr#', 'FHR_LIST': '#fhr_list#', 'COMPONENT': component}
         for key, value in postenvar_dict.items():
             postenvars.append(rocoto.create_envar(name=key, value=str(value)))
 
+        fhrs = self._get_forecast_hours(self.run, self._configs[config], component)
+
+        # ocean/ice components do not have fhr 0 as they are averaged output
+        if component in ['ocean', 'ice'] and 0 in fhrs:
+            fhrs.remove(0)
+
+        # A job processes a group of forecast hours and waits for the output of the last one
+        resources = self.get_resource(component_dict['config'])
+        fhr_var_dict = self._group_forecast_hours(config, fhrs, resources)
+        if component in ['ocean']:
+            fhrs_next = dict(zip(fhrs, fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]))
+            fhr_var_dict['fhr_next'] = ' '.join([f"{fhrs_next[int(fhr)]:03d}" for fhr in fhr_var_dict['fhr'].split()])
+
         history_path = self._template_to_rocoto_cycstring(self._base[history_path_tmpl])
         deps = []
         data = f'{history_path}/{history_file_tmpl}'
@@ -1154,9 +1169,8 @@ class GFSTasks(Tasks):
         dependencies = rocoto.create_dependency(dep=deps, dep_condition='or')
 
         cycledef = 'gdas_half,gdas' if self.run in ['gdas'] else self.run
-        resources = self.get_resource(component_dict['config'])
 
-        task_name = f'{self.run}_{component}_prod_f#fhr#'
+        task_name = f'{self.run}_{component}_prod_f#grp#'
         task_dict = {'task_name': task_name,
                      'resources': resources,
                      'dependency': dependencies,
@@ -1168,16 +1182,6 @@ class GFSTasks(Tasks):
                      'maxtries': '&MAXTRIES;'
                      }
 
-        fhrs = self._get_forecast_hours(self.run, self._configs[config], component)
-
-        # ocean/ice components do not have fhr 0 as they are averaged output
-        if component in ['ocean', 'ice'] and 0 in fhrs:
-            fhrs.remove(0)
-
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
-        if component in ['ocean']:
-            fhrs_next = fhrs[1:] + [fhrs[-1] + (fhrs[-1] - fhrs[-2])]
-            fhr_var_dict['fhr_next'] = ' '.join([f"{fhr:03d}" for fhr in fhrs_next])
         metatask_dict = {'task_name': f'{self.run}_{component}_prod',
                          'task_dict': task_dict,
                          'var_dict': fhr_var_dict}
@@ -1498,7 +1502,7 @@ class GFSTasks(Tasks):
     def gempak(self):
 
         deps = []
-        dep_dict = {'type': 'task', 'name': f'{self.run}_atmos_prod_f#fhr#'}
+        dep_dict = {'type': 'task', 'name': f'{self.run}_atmos_prod_f#prod_grp#'}
         deps.append(rocoto.add_dependency(dep_dict))
         dependencies = rocoto.create_dependency(dep=deps)
 
@@ -1521,7 +1525,16 @@ class GFSTasks(Tasks):
                      }
 
         fhrs = self._get_forecast_hours(self.run, self._configs['gempak'])
-        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs])}
+
+        # the atmos products task of the group of each forecast hour
+        prod_fhrs = self._get_forecast_hours(self.run, self._configs['atmos_products'])
+        prod_var_dict = self._group_forecast_hours('atmos_products', prod_fhrs, self.get_resource('atmos_products'))
+        prod_grp = dict()
+        for fhr_list, grp in zip(prod_var_dict['fhr_list'].split(), prod_var_dict['grp'].split()):
+            prod_grp.update({int(fhr): grp for fhr in fhr_list.split('_')})
+
+        fhr_var_dict = {'fhr': ' '.join([f"{fhr:03d}" for fhr in fhrs]),
+                        'prod_grp': ' '.join([prod_grp.get(fhr, f"{fhr:03d}") for fhr in fhrs])}
 
         fhr_metatask_dict = {'task_name': f'{self.run}_gempak',
                              'task_dict': task_dict,
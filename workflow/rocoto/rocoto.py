@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import re
 from typing import Union, List, Dict, Any
 
 '''
@@ -15,6 +16,9 @@ __all__ = ['create_task',
            'add_dependency', 'create_dependency',
            'create_envar', 'create_entity', 'create_cycledef']
 
+# An '&' that does not start an entity (e.g. &ROTDIR;) or a character reference
+_BARE_AMPERSAND = re.compile(r'&(?!(?:\w+|#\d+|#x[0-9a-fA-F]+);)')
+
 
 def create_task(task_dict: Dict[str, Any]) -> List[str]:
     """
@@ -48,37 +52,61 @@ def create_task(task_dict: Dict[str, Any]) -> List[str]:
 
     """
 
+    lines = []
+    _add_task_lines(task_dict, 0, lines)
+
+    return ''.join(lines)
+
+
+def _add_task_lines(task_dict: Dict[str, Any], depth: int, lines: List[str]) -> None:
+    """
+    Append the lines of a task or metatask nested depth levels deep to lines
+
+    The lines of the nested tasks of a metatask are indented once, when they are
+    added, instead of re-indenting the whole XML of the nested tasks at every level.
+    """
+
     inner_task_dict = task_dict.pop('task_dict', None)
 
     if inner_task_dict is None:
-        strings = _create_innermost_task(task_dict)
+        lines.extend(_indent(_create_innermost_task(task_dict), depth))
+        return
 
-    else:
-        # There is a nested task_dict, so this is a metatask
-        metataskname = f"{task_dict.get('task_name', 'demometatask')}"
-        metataskmode = 'serial' if task_dict.get('is_serial', False) else 'parallel'
-        var_dict = task_dict.get('var_dict', None)
+    # There is a nested task_dict, so this is a metatask
+    metataskname = f"{task_dict.get('task_name', 'demometatask')}"
+    metataskmode = 'serial' if task_dict.get('is_serial', False) else 'parallel'
+    var_dict = task_dict.get('var_dict', None)
 
-        strings = [f'<metatask name="{metataskname}" mode="{metataskmode}">\n',
-                   '\n']
+    strings = [f'<metatask name="{metataskname}" mode="{metataskmode}">\n',
+               '\n']
 
-        if var_dict is None:
-            msg = f'Task {metataskname} has a nested task dict, but has no var_dict'
-            raise KeyError(msg)
+    if var_dict is None:
+        msg = f'Task {metataskname} has a nested task dict, but has no var_dict'
+        raise KeyError(msg)
 
-        for key in var_dict.keys():
-            value = str(var_dict[key])
-            strings.append(f'\t<var name="{key}">{value}</var>\n')
+    for key in var_dict.keys():
+        value = str(var_dict[key])
+        strings.append(f'\t<var name="{key}">{value}</var>\n')
 
-        strings.append('\n')
-        task_dict.update(inner_task_dict)
-        tasklines = create_task(task_dict).splitlines(True)
-        for tl in tasklines:
-            strings.append(f'{tl}') if tl == '\n' else strings.append(f'\t{tl}')
-        strings.append('\n')
-        strings.append('</metatask>\n')
+    strings.append('\n')
+    lines.extend(_indent(strings, depth))
 
-    return ''.join(strings)
+    task_dict.update(inner_task_dict)
+    _add_task_lines(task_dict, depth + 1, lines)
+
+    lines.extend(_indent(['\n', '</metatask>\n'], depth))
+
+
+def _indent(strings: List[str], depth: int) -> List[str]:
+    """
+    Indent the lines of strings by depth tabs, leaving the empty lines empty
+    """
+
+    if depth == 0:
+        return strings
+
+    prefix = '\t' * depth
+    return [line if line == '\n' else f'{prefix}{line}' for line in ''.join(strings).splitlines(True)]
 
 
 def _create_innermost_task(task_dict: Dict[str, Any]) -> List[str]:
@@ -113,7 +141,7 @@ def _create_innermost_task(task_dict: Dict[str, Any]) -> List[str]:
     cycledef = task_dict.get('cycledef', 'democycle')
     maxtries = task_dict.get('maxtries', 3)
     final = task_dict.get('final', False)
-    command = task_dict.get('command', 'sleep 10')
+    command = _escape(task_dict.get('command', 'sleep 10'))
     jobname = task_dict.get('job_name', 'demojob')
     resources_dict = task_dict['resources']
     account = resources_dict.get('account', 'batch')
@@ -121,6 +149,7 @@ def _create_innermost_task(task_dict: Dict[str, Any]) -> List[str]:
     partition = resources_dict.get('partition', None)
     walltime = resources_dict.get('walltime', '00:01:00')
     native = resources_dict.get('native', None)
+    native = None if native is None else _escape(native)
     memory = resources_dict.get('memory', None)
     nodes = resources_dict.get('nodes', 1)
     ppn = resources_dict.get('ppn', 1)
@@ -268,7 +297,7 @@ def _add_data_tag(dep_dict: Dict[str, Any]) -> str:
             offset_string_b = ''
             offset_string_e = ''
 
-        strings.append(f'{offset_string_b}{data}{offset_string_e}')
+        strings.append(f'{offset_string_b}{_escape(data)}{offset_string_e}')
 
     strings.append('</datadep>')
 
@@ -315,14 +344,14 @@ def _add_streq_tag(dep_dict: Dict[str, Any]) -> str:
         msg += f'a left value is necessary for {dep_type} dependency'
         fail = True
     else:
-        dep_left = str(dep_left)
+        dep_left = _escape(dep_left)
     if dep_right is None:
         if fail:
             msg += '\n'
         msg += f'a right value is necessary for {dep_type} dependency'
         fail = True
     else:
-        dep_right = str(dep_right)
+        dep_right = _escape(dep_right)
     if fail:
         raise KeyError(msg)
 
@@ -354,13 +383,22 @@ def _add_sh_tag(dep_dict: Dict[str, Any]) -> str:
     else:
         offset_string_b = ''
         offset_string_e = ''
-    cmd = f'{offset_string_b}{command}{offset_string_e}'
+    cmd = f'{offset_string_b}{_escape(command)}{offset_string_e}'
 
     string = f'<sh shell="{shell}">{cmd}</sh>'
 
     return string
 
 
+def _escape(value: Any) -> str:
+    """
+    Text of a value with the ampersands that do not start an entity or a
+    character reference escaped, e.g. the '&&' of a shell command
+    """
+
+    return _BARE_AMPERSAND.sub('&amp;', str(value))
+
+
 def _traverse(o, tree_types=(list, tuple)):
     """
     Traverse through a list of lists or tuples and yield the value
@@ -426,7 +464,7 @@ def create_envar(name: str, value: Union[str, float, int]) -> str:
     :rtype: str
     """
 
-    return f'<envar><name>{name}</name><value>{str(value)}</value></envar>'
+    return f'<envar><name>{name}</name><value>{_escape(value)}</value></envar>'
 
 
 def create_cycledef(group=None, start=None, stop=None, step=None):
@@ -3,8 +3,9 @@
 import numpy as np
 from applications.applications import AppConfig
 import rocoto.rocoto as rocoto
-from wxflow import Template, TemplateConstants, to_timedelta
-from typing import List
+from rocoto.walltime_history import apply_walltimes, load_walltimes
+from wxflow import Template, TemplateConstants, to_timedelta, timedelta_to_HMS
+from typing import Any, Dict, List
 
 __all__ = ['Tasks']
 
@@ -76,6 +77,9 @@ class Tasks:
 
         self.envars = self._set_envars(envar_dict)
 
+        # Walltimes accepted from the job history of the experiment (workflow/size_walltimes.py)
+        self._walltimes = load_walltimes(self._base.get('WALLTIME_HISTORY', ''))
+
     @staticmethod
     def _set_envars(envar_dict) -> list:
 
@@ -166,12 +170,52 @@ class Tasks:
 
         return fhrs
 
+    @staticmethod
+    def _get_forecast_hour_groups(fhrs: List[int], group_size: int = 1) -> Dict[str, str]:
+        """
+        Group consecutive forecast hours for tasks processing several forecast hours per job.
+        Returns the metatask variables:
+          fhr: last forecast hour of each group, used for the data dependencies
+          fhr_list: forecast hours of each group joined by '_'
+          grp: group label used in the task names (the forecast hour when the group size is 1)
+        """
+        group_size = max(int(group_size), 1)
+        groups = [fhrs[ii:ii + group_size] for ii in range(0, len(fhrs), group_size)]
+
+        def label(group):
+            return f"{group[0]:03d}" if len(group) == 1 else f"{group[0]:03d}-{group[-1]:03d}"
+
+        return {'fhr': ' '.join([f"{group[-1]:03d}" for group in groups]),
+                'fhr_list': ' '.join(['_'.join([f"{fhr:03d}" for fhr in group]) for group in groups]),
+                'grp': ' '.join([label(group) for group in groups])}
+
+    def _group_forecast_hours(self, config: str, fhrs: List[int], resources: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Group the forecast hours of a task by the NFHRS_PER_GROUP of its config, fewer if a group
+        would not fit in MAX_GROUP_WALLTIME, and scale the walltime of the resources (that of one
+        forecast hour) to the number of hours of a group.
+        Returns the metatask variables of _get_forecast_hour_groups
+        """
+        task_config = self._configs[config]
+        group_size = max(int(task_config.get('NFHRS_PER_GROUP', 1)), 1)
+        walltime = to_timedelta(resources['walltime'])
+        max_walltime = task_config.get('MAX_GROUP_WALLTIME', '')
+        if group_size > 1 and max_walltime and walltime.total_seconds() > 0:
+            group_size = max(min(group_size, int(to_timedelta(max_walltime) // walltime)), 1)
+        group_size = min(group_size, max(len(fhrs), 1))
+        if group_size > 1:
+            resources['walltime'] = timedelta_to_HMS(walltime * group_size)
+
+        return self._get_forecast_hour_groups(fhrs, group_size)
+
     def get_resource(self, task_name):
         """
         Given a task name (task_name) and its configuration (task_names),
         return a dictionary of resources (task_resource) used by the task.
         Task resource dictionary includes:
         account, walltime, ntasks, nodes, ppn, threads, memory, queue, partition, native
+        The walltime is the one of the configs; get_task replaces it by the walltime
+        accepted from the job history of the task, if any (WALLTIME_HISTORY).
         """
 
         scheduler = self.app_config.scheduler
@@ -242,8 +286,10 @@ class Tasks:
         Given a task_name, call the method for that task
         """
         try:
-            return getattr(self, task_name, *args, **kwargs)()
+            task = getattr(self, task_name, *args, **kwargs)()
         except AttributeError:
             raise AttributeError(f'"{task_name}" is not a valid task.\n' +
                                  'Valid tasks are:\n' +
                                  f'{", ".join(Tasks.VALID_TASKS)}')
+
+        return apply_walltimes(task, self._walltimes)
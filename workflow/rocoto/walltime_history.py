@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+from wxflow import parse_yaml
+
+from rocoto.workflow_dag import hms_to_seconds
+
+'''
+    MODULE:
+        walltime_history.py
+
+    ABOUT:
+        Walltimes sized from the job history of an experiment: the jobs of its Rocoto
+        database (run times, tries, exit statuses) and the elapsed times that preamble.sh
+        prints at the end of the job logs. propose_walltimes suggests a walltime per task
+        (a percentile of the run times plus a margin) and flags the tasks that keep hitting
+        their walltime; the accepted walltimes are kept in a YAML file that apply_walltimes
+        writes into the task XML.
+'''
+
+__all__ = ['TaskHistory', 'read_rocoto_jobs', 'read_job_logs', 'propose_walltimes',
+           'load_walltimes', 'apply_walltimes', 'seconds_to_hms']
+
+# Last line of a job log: "End <script> at HH:MM:SS with error code N (time elapsed: HH:MM:SS)"
+ELAPSED_PATTERN = re.compile(r'^End \S+ at \S+ with error code (\d+) \(time elapsed: (\d+):(\d+):(\d+)\)', re.MULTILINE)
+
+# Scheduler states and exit statuses of jobs killed at their walltime (slurm, PBS)
+TIMEOUT_STATES = ['TIMEOUT']
+TIMEOUT_EXIT_STATUSES = [271]
+
+TASK_PATTERN = re.compile(r'(<task\s+name="([^"]+)".*?</task>)', re.DOTALL)
+WALLTIME_PATTERN = re.compile(r'<walltime>([^<]*)</walltime>')
+
+
+def seconds_to_hms(seconds: float) -> str:
+    """Rocoto walltime HH:MM:SS of a number of seconds"""
+    seconds = int(round(seconds))
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+class TaskHistory:
+    """
+    Jobs of a Rocoto task over the cycles of an experiment
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.durations = []     # run time of the jobs that succeeded
+        self.elapsed = []       # elapsed time of the job logs that ended with error code 0
+        self.tries = []         # tries of each job
+        self.exit_statuses = dict()
+        self.failed = []        # (state, run time) of the other jobs that did not succeed
+        self.timeouts = 0       # jobs killed by the scheduler at their walltime
+
+    def samples(self, min_samples: int = 1) -> List[float]:
+        """Run times of the database, with the job logs when the database has too few"""
+        return self.durations if len(self.durations) >= min_samples else self.durations + self.elapsed
+
+    def count_timeouts(self, walltime: int) -> int:
+        """Jobs killed at their walltime, and failed jobs that ran for (nearly) the whole walltime"""
+        near = sum(1 for _, duration in self.failed if walltime > 0 and duration >= 0.97 * walltime)
+        return self.timeouts + near
+
+
+def read_rocoto_jobs(db_file: str) -> Dict[str, TaskHistory]:
+    """
+    Run times, tries and exit statuses of the jobs of a Rocoto database
+    """
+    with sqlite3.connect(f'file:{db_file}?mode=ro', uri=True) as con:
+        columns = [row[1] for row in con.execute('PRAGMA table_info(jobs)')]
+        native_state = 'native_state' if 'native_state' in columns else 'NULL'
+        rows = con.execute(f'SELECT taskname, state, {native_state}, exit_status, tries, duration FROM jobs').fetchall()
+
+    history = dict()
+    for taskname, state, native, exit_status, tries, duration in rows:
+        task = history.setdefault(taskname, TaskHistory(taskname))
+        task.exit_statuses[exit_status] = task.exit_statuses.get(exit_status, 0) + 1
+        if tries is not None:
+            task.tries.append(int(tries))
+        if state == 'SUCCEEDED' and duration:
+            task.durations.append(float(duration))
+        elif state in ['FAILED', 'DEAD', 'LOST']:
+            if (native or '').upper() in TIMEOUT_STATES or exit_status in TIMEOUT_EXIT_STATUSES:
+                task.timeouts += 1
+            else:
+                task.failed.append((state, float(duration or 0)))
+    return history
+
+
+def read_job_logs(rotdir: str, history: Dict[str, TaskHistory], tasknames: List[str]) -> Dict[str, TaskHistory]:
+    """
+    Add the elapsed times of the successful job logs ${ROTDIR}/logs/<cycle>/<task>.log
+    of tasks to their history
+    """
+    for taskname in tasknames:
+        for log in glob.glob(os.path.join(rotdir, 'logs', '*', f'{taskname}.log')):
+            with open(log, 'r', errors='replace') as fh:
+                matches = ELAPSED_PATTERN.findall(fh.read())
+            if not matches:
+                continue
+            # scripts nest, the outermost one ends last
+            error_code, hours, minutes, seconds = matches[-1]
+            if int(error_code) == 0:
+                task = history.setdefault(taskname, TaskHistory(taskname))
+                task.elapsed.append(float(int(hours) * 3600 + int(minutes) * 60 + int(seconds)))
+    return history
+
+
+def propose_walltimes(history: Dict[str, TaskHistory], walltimes: Dict[str, str], percentile: float = 99.,
+                      margin: float = 0.1, min_samples: int = 5, granularity: int = 300) -> Dict[str, Dict]:
+    """
+    Walltime proposed for each task with enough history
+
+    The proposal is the percentile of the run times plus a margin, rounded up to granularity
+    seconds. A task whose jobs were killed at their walltime more than once is flagged and
+    never gets a shorter walltime.
+
+    Parameters
+    ----------
+    history: Dict[str, TaskHistory]
+        Jobs of each task
+    walltimes: Dict[str, str]
+        Current walltime of each task
+    percentile: float
+        Percentile of the run times the walltime must cover
+    margin: float
+        Fraction of the percentile added to it
+    min_samples: int
+        Fewest run times to propose a walltime
+    granularity: int
+        Proposed walltimes are multiples of this number of seconds
+
+    Returns
+    -------
+    Dict[str, Dict]
+        current, proposed (HH:MM:SS), samples, percentile (seconds), timeouts, retried jobs and flag of each task
+    """
+    proposals = dict()
+    for name, current in walltimes.items():
+        task = history.get(name)
+        if task is None:
+            continue
+        current_seconds = hms_to_seconds(current)
+        samples = task.samples(min_samples)
+        timeouts = task.count_timeouts(current_seconds)
+        if len(samples) < min_samples and timeouts < 2:
+            continue
+
+        value = float(np.percentile(samples, percentile)) if samples else 0.
+        proposed = int(np.ceil(value * (1. + margin) / granularity)) * granularity
+        flag = ''
+        if timeouts >= 2:
+            flag = 'hits walltime'
+            proposed = max(proposed, int(np.ceil(current_seconds * (1. + margin) / granularity)) * granularity)
+        proposals[name] = {'current': current, 'proposed': seconds_to_hms(proposed), 'samples': len(samples),
+                           'percentile': value, 'timeouts': timeouts, 'retries': sum(tries > 1 for tries in task.tries),
+                           'flag': flag}
+    return proposals
+
+
+@lru_cache(maxsize=None)
+def load_walltimes(path: str) -> Dict[str, str]:
+    """
+    Accepted walltimes (task name: HH:MM:SS) of a YAML file, empty if there is no file
+    """
+    if not path or not os.path.isfile(path):
+        return dict()
+    return {str(name): str(walltime) for name, walltime in (parse_yaml(path) or dict()).items()}
+
+
+def apply_walltimes(xml: str, walltimes: Dict[str, str]) -> str:
+    """
+    Replace the walltime of the tasks of a workflow or task XML by their accepted walltime
+
+    The tasks of a metatask are looked up by their name in the XML, with the metatask
+    variables (e.g. gfs_atmos_prod_f#fhr#).
+    """
+    if not walltimes:
+        return xml
+
+    def replace(match: re.Match) -> str:
+        walltime = walltimes.get(match.group(2))
+        if walltime is None:
+            return match.group(1)
+        return WALLTIME_PATTERN.sub(f'<walltime>{walltime}</walltime>', match.group(1), count=1)
+
+    return TASK_PATTERN.sub(replace, xml)
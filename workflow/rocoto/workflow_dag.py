@@ -0,0 +1,620 @@
+#!/usr/bin/env python3
+
+import re
+import sqlite3
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+'''
+    MODULE:
+        workflow_dag.py
+
+    ABOUT:
+        In-memory model of a Rocoto workflow: tasks, metatasks, cycle definitions and the
+        dependency tree of every task, built from the XML written by the task generators
+        (or from a workflow XML file). On top of the model:
+            critical_path:   longest chain of dependent tasks within a cycle
+            max_cycle_ratio: wall time per cycle imposed by dependencies on previous cycles,
+                             i.e. the maximum sustainable cycle rate
+'''
+
+__all__ = ['DepNode', 'DAGTask', 'WorkflowDAG', 'hms_to_seconds', 'durations_from_rocoto_db', 'job_samples_from_rocoto_db']
+
+# Elements that combine the dependencies below them
+OPERATORS = ['and', 'or', 'not', 'nand', 'nor', 'xor', 'some']
+
+NEVER = float('inf')
+
+
+def hms_to_seconds(hms: str) -> int:
+    """
+    Convert a Rocoto time ([[[DD:]HH:]MM:]SS, optionally signed) to seconds
+    """
+    hms = hms.strip()
+    sign = -1 if hms.startswith('-') else 1
+    fields = [int(field or 0) for field in hms.lstrip('+-').split(':')]
+    days = fields.pop(0) if len(fields) == 4 else 0
+    seconds = 0
+    for field in fields:
+        seconds = seconds * 60 + field
+    return sign * (days * 86400 + seconds)
+
+
+class DepNode:
+    """
+    Node of a dependency tree
+
+    kind is an operator (and, or, not, ...) with children, or a leaf: taskdep,
+    metataskdep, datadep, cycleexistdep, streq, strneq, sh, true or false.
+    Leaves keep their attributes (task, metatask, cycle_offset, age, ...) and text
+    (the data path, the shell command or the compared strings).
+    """
+
+    def __init__(self, kind: str, attrs: Optional[Dict[str, str]] = None,
+                 children: Optional[List['DepNode']] = None, text: str = '') -> None:
+        self.kind = kind
+        self.attrs = attrs or dict()
+        self.children = children or list()
+        self.text = text
+
+    @property
+    def offset(self) -> int:
+        """Cycle offset of the dependency in seconds (0 for the same cycle)"""
+        return hms_to_seconds(self.attrs['cycle_offset']) if 'cycle_offset' in self.attrs else 0
+
+    def leaves(self) -> Iterator['DepNode']:
+        if self.kind in OPERATORS:
+            for child in self.children:
+                yield from child.leaves()
+        else:
+            yield self
+
+    @classmethod
+    def from_element(cls, element: ET.Element) -> 'DepNode':
+        kind = element.tag
+        if kind in OPERATORS:
+            return cls(kind, dict(element.attrib), [cls.from_element(child) for child in element])
+        if kind in ['streq', 'strneq']:
+            text = [''.join(element.find(side).itertext()) if element.find(side) is not None else ''
+                    for side in ('left', 'right')]
+            return cls(kind, dict(element.attrib), text='\n'.join(text))
+        return cls(kind, dict(element.attrib), text=''.join(element.itertext()).strip())
+
+    def __repr__(self) -> str:
+        if self.kind in OPERATORS:
+            return f"{self.kind}({', '.join(map(repr, self.children))})"
+        return f"{self.kind}({self.attrs or self.text})"
+
+
+class DAGTask:
+    """
+    A task of the workflow, with metatask variables substituted
+    """
+
+    def __init__(self, name: str, cycledefs: List[str], dependency: Optional[DepNode],
+                 resources: Dict[str, str], metatasks: List[str], final: bool = False,
+                 template: Optional[str] = None) -> None:
+        self.name = name
+        self.template = template or name  # name in the XML, with the metatask variables
+        self.cycledefs = cycledefs
+        self.dependency = dependency
+        self.resources = resources
+        self.metatasks = metatasks
+        self.final = final
+
+    @property
+    def walltime(self) -> int:
+        """Requested walltime in seconds, 0 if not set"""
+        walltime = self.resources.get('walltime')
+        return hms_to_seconds(walltime) if walltime else 0
+
+    def __repr__(self) -> str:
+        return f"DAGTask({self.name}, cycledefs={','.join(self.cycledefs)})"
+
+
+class WorkflowDAG:
+    """
+    Tasks, metatasks and dependencies of a Rocoto workflow
+
+    Build it with from_tasks from the task and metatask XML strings of the task
+    generators (rocoto.workflow_tasks.get_wf_tasks), or with from_string or from_xml
+    from a whole workflow. Metatasks are expanded the way Rocoto does: #var# is replaced by each
+    value of the metatask variables.
+    """
+
+    def __init__(self) -> None:
+        self.tasks = OrderedDict()
+        self.metatasks = OrderedDict()
+        self.cycledefs = OrderedDict()
+        self.attributes = dict()
+        self.entities = dict()
+
+    @classmethod
+    def from_tasks(cls, task_strings: List[str], entities: Optional[Dict[str, str]] = None) -> 'WorkflowDAG':
+        """
+        Model of the tasks and metatasks XML of the task generators
+
+        Parameters
+        ----------
+        task_strings: List[str]
+            XML of each task or metatask
+        entities: Dict[str, str], optional
+            Values of the XML entities (&NAME;) used in the tasks
+        """
+        dag = cls()
+        text = _substitute_entities(''.join(task_strings), entities or dict())
+        for element in ET.fromstring(f'<tasks>{text}</tasks>'):
+            dag._add(element, dict(), [])
+        return dag
+
+    @classmethod
+    def from_xml(cls, xml_file: str) -> 'WorkflowDAG':
+        """
+        Model of a Rocoto workflow XML file
+        """
+        with open(xml_file, 'r') as fh:
+            return cls.from_string(fh.read())
+
+    @classmethod
+    def from_string(cls, text: str) -> 'WorkflowDAG':
+        """
+        Model of the XML of a Rocoto workflow
+        """
+        # Rocoto workflows define their entities in the DOCTYPE, which ElementTree does not read
+        entities = dict(re.findall(r'<!ENTITY\s+(\w+)\s+"([^"]*)"\s*>', text))
+        text = re.sub(r'<!DOCTYPE.*?\]>', '', text, count=1, flags=re.DOTALL)
+        root = ET.fromstring(_substitute_entities(text, entities))
+
+        dag = cls()
+        dag.attributes = dict(root.attrib)
+        dag.entities = entities
+        for element in root:
+            if element.tag == 'cycledef':
+                dag.cycledefs.setdefault(element.attrib.get('group', ''), []).append(element.text.strip())
+            elif element.tag in ['task', 'metatask']:
+                dag._add(element, dict(), [])
+        return dag
+
+    def _add(self, element: ET.Element, variables: Dict[str, str], metatasks: List[str]) -> None:
+        if element.tag == 'task':
+            self._add_task(element, variables, metatasks)
+            return
+        if element.tag != 'metatask':
+            return
+
+        name = _expand(element.attrib.get('name', ''), variables)
+        values = OrderedDict((var.attrib['name'], var.text.split()) for var in element.findall('var'))
+        lengths = {len(value) for value in values.values()}
+        if len(lengths) > 1:
+            raise ValueError(f'Variables of metatask {name} do not have the same number of values')
+        self.metatasks.setdefault(name, [])
+        for ii in range(lengths.pop() if lengths else 0):
+            inner = dict(variables)
+            inner.update({var: value[ii] for var, value in values.items()})
+            for child in element:
+                self._add(child, inner, metatasks + [name])
+
+    def _add_task(self, element: ET.Element, variables: Dict[str, str], metatasks: List[str]) -> None:
+        template = element.attrib['name']
+        # Rocoto substitutes the metatask variables in the text of the task
+        if variables:
+            element = ET.fromstring(_expand(ET.tostring(element, encoding='unicode'), variables))
+        name = element.attrib['name']
+        if name in self.tasks:
+            raise ValueError(f'Task {name} is defined more than once')
+        cycledefs = [group for group in element.attrib.get('cycledefs', '').split(',') if group]
+
+        resources = dict()
+        for tag in ['walltime', 'nodes', 'memory', 'queue', 'partition', 'account', 'cores', 'native']:
+            child = element.find(tag)
+            if child is not None and child.text is not None:
+                resources[tag] = child.text.strip()
+
+        dependency = None
+        dep_element = element.find('dependency')
+        if dep_element is not None and len(dep_element):
+            dependency = DepNode.from_element(dep_element[0])
+
+        self.tasks[name] = DAGTask(name, cycledefs, dependency, resources, metatasks,
+                                   final=element.attrib.get('final', 'false').lower() == 'true', template=template)
+        for metatask in metatasks:
+            self.metatasks[metatask].append(name)
+
+    def members(self, leaf: DepNode) -> List[str]:
+        """Tasks a taskdep or metataskdep leaf refers to"""
+        if leaf.kind == 'taskdep':
+            return [leaf.attrs['task']] if leaf.attrs.get('task') in self.tasks else []
+        if leaf.kind == 'metataskdep':
+            return self.metatasks.get(leaf.attrs.get('metatask'), [])
+        return []
+
+    def predecessors(self, name: str, offset: Optional[int] = 0) -> List[Tuple[str, int]]:
+        """
+        Tasks a task depends on, with their cycle offset in seconds.
+        With offset=None dependencies on every cycle are returned, otherwise only those
+        with that cycle offset (0: the same cycle).
+        """
+        task = self.tasks[name]
+        if task.dependency is None:
+            return []
+        found = OrderedDict()
+        for leaf in task.dependency.leaves():
+            if offset is None or leaf.offset == offset:
+                for member in self.members(leaf):
+                    found[(member, leaf.offset)] = None
+        return list(found)
+
+    def successors(self, name: str, offset: Optional[int] = 0) -> List[Tuple[str, int]]:
+        """Tasks that depend on a task, with the cycle offset of the dependency"""
+        return [(other, lag) for other in self.tasks for member, lag in self.predecessors(other, offset)
+                if member == name]
+
+    def in_cycle(self, group: Optional[str] = None) -> List[str]:
+        """Tasks that run in the cycles of a cycledef group, all tasks if group is None"""
+        return [name for name, task in self.tasks.items() if group is None or group in task.cycledefs]
+
+    def topological_order(self, names: Optional[List[str]] = None) -> List[str]:
+        """
+        Tasks ordered so that every task comes after the tasks of the same cycle it depends on
+
+        Raises
+        ------
+        ValueError
+            The dependencies within a cycle are circular
+        """
+        names = list(self.tasks) if names is None else names
+        selected = set(names)
+        state = dict()
+        order = []
+        for root in names:
+            if root in state:
+                continue
+            stack = [(root, iter(self.predecessors(root)))]
+            state[root] = 'visiting'
+            while stack:
+                node, preds = stack[-1]
+                for pred, _ in preds:
+                    if pred not in selected:
+                        continue
+                    if state.get(pred) == 'visiting':
+                        raise ValueError(f'Circular dependency between {pred} and {node}')
+                    if pred not in state:
+                        state[pred] = 'visiting'
+                        stack.append((pred, iter(self.predecessors(pred))))
+                        break
+                else:
+                    stack.pop()
+                    state[node] = 'done'
+                    order.append(node)
+        return order
+
+    def _satisfiable(self, node: DepNode, selected: set) -> bool:
+        """
+        Whether a dependency tree can be satisfied in a cycle whose tasks are selected:
+        a dependency on a task that does not run in the same cycle never is
+        """
+        steady = _steady(node)
+        if steady is not None:
+            return steady
+        if node.kind in ['taskdep', 'metataskdep'] and node.offset == 0:
+            return any(member in selected for member in self.members(node))
+        if node.kind == 'and':
+            return all(self._satisfiable(child, selected) for child in node.children)
+        if node.kind == 'or':
+            return any(self._satisfiable(child, selected) for child in node.children)
+        return True
+
+    def _alternatives(self, node: DepNode, selected: set) -> List[DepNode]:
+        """
+        Alternatives of an or that hold a task in the steady state of a run: those that
+        can be satisfied and, when some of them depend on tasks, only those. A data
+        dependency next to a task dependency (e.g. a forecast output or the forecast
+        itself) is there to start early, it does not make the task independent.
+        """
+        live = [child for child in node.children if self._satisfiable(child, selected)]
+        tasks = [child for child in live if any(leaf.kind in ['taskdep', 'metataskdep'] for leaf in child.leaves())]
+        return tasks or live
+
+    def _ready_time(self, node: DepNode, finish: Dict[str, float], selected: set) -> float:
+        """
+        Time a dependency tree is satisfied in a cycle that runs as soon as it can, in the
+        steady state of a long run: previous cycles exist and are complete, and data,
+        shell and string dependencies are met. or is the earliest of its alternatives
+        (see _alternatives); the other operators only use their constant value, if any.
+        """
+        steady = _steady(node)
+        if steady is not None:
+            return 0. if steady else NEVER
+        if node.kind == 'and':
+            return max([self._ready_time(child, finish, selected) for child in node.children], default=0.)
+        if node.kind == 'or':
+            return min([self._ready_time(child, finish, selected) for child in self._alternatives(node, selected)],
+                       default=NEVER)
+        if node.kind in ['taskdep', 'metataskdep'] and node.offset == 0:
+            members = [member for member in self.members(node) if member in selected]
+            return max([finish[member] for member in members]) if members else NEVER
+        return 0.
+
+    def critical_path(self, durations: Dict[str, float], group: Optional[str] = None) -> Tuple[float, List[str]]:
+        """
+        Longest chain of dependent tasks in a cycle of a cycledef group
+
+        Parameters
+        ----------
+        durations: Dict[str, float]
+            Duration of each task in seconds, tasks not listed take their walltime
+        group: str, optional
+            Cycledef group of the cycle, all tasks if None
+
+        Returns
+        -------
+        Tuple[float, List[str]]
+            Length of the cycle in seconds and the tasks of the critical path
+        """
+        names = self.in_cycle(group)
+        selected = set(names)
+        finish = dict()
+        parent = dict()
+        for name in self.topological_order(names):
+            task = self.tasks[name]
+            start = 0.
+            if task.dependency is not None:
+                start = self._ready_time(task.dependency, finish, selected)
+                if start == NEVER:
+                    start = 0.
+                # the predecessor that finishes last is the one that holds the task
+                preds = [pred for pred, _ in self.predecessors(name) if pred in selected and finish[pred] == start]
+                parent[name] = preds[0] if preds and start > 0 else None
+            finish[name] = start + durations.get(name, task.walltime)
+
+        if not finish:
+            return 0., []
+        last = max(finish, key=finish.get)
+        path = [last]
+        while parent.get(path[-1]):
+            path.append(parent[path[-1]])
+        return finish[last], path[::-1]
+
+    def longest_paths(self, durations: Dict[str, float], source: str, names: List[str]) -> Dict[str, float]:
+        """
+        Longest chain (sum of durations, both ends included) from source to every task of
+        the same cycle that depends on it directly or indirectly
+        """
+        order = self.topological_order(names)
+        selected = set(names)
+        length = {source: durations.get(source, self.tasks[source].walltime)}
+        for name in order[order.index(source) + 1:]:
+            best = max([length[pred] for pred, _ in self.required(name, 0, selected) if pred in length],
+                       default=None)
+            if best is not None:
+                length[name] = best + durations.get(name, self.tasks[name].walltime)
+        return length
+
+    def required(self, name: str, offset: Optional[int] = None,
+                 selected: Optional[set] = None) -> List[Tuple[str, int]]:
+        """
+        Dependencies a task cannot start without in the steady state of a run: those
+        reached through and-combinations, and through an or with a single alternative
+        that holds a task (see _alternatives), e.g. when the other one is "the previous
+        cycle does not exist" or a task that does not run in this cycle.
+        Only dependencies on the selected tasks are returned, all tasks if None.
+        """
+        task = self.tasks[name]
+        selected = set(self.tasks) if selected is None else selected
+        found = OrderedDict()
+
+        def walk(node: DepNode) -> None:
+            if node.kind == 'and':
+                for child in node.children:
+                    walk(child)
+            elif node.kind == 'or':
+                live = self._alternatives(node, selected)
+                if len(live) == 1:
+                    walk(live[0])
+            elif node.kind in ['taskdep', 'metataskdep']:
+                if offset is None or node.offset == offset:
+                    for member in self.members(node):
+                        if member in selected:
+                            found[(member, node.offset)] = None
+
+        if task.dependency is not None:
+            walk(task.dependency)
+        return list(found)
+
+    def max_cycle_ratio(self, durations: Dict[str, float], interval: float,
+                        group: Optional[str] = None) -> Tuple[float, List[Tuple[str, str]]]:
+        """
+        Wall time per cycle that the dependencies on previous cycles impose on a long run
+
+        A task that depends on a task of a previous cycle closes a loop across cycles: the
+        chain of tasks from the start of the loop to its end can only run once per number
+        of cycles spanned by the loop. The largest ratio of loop length to number of cycles
+        is the shortest time in which the run can advance by one cycle, however many cycles
+        run at once.
+
+        Parameters
+        ----------
+        durations: Dict[str, float]
+            Duration of each task in seconds, tasks not listed take their walltime
+        interval: float
+            Cycle interval in seconds, to convert cycle offsets into numbers of cycles
+        group: str, optional
+            Cycledef group of the cycles, all tasks if None
+
+        Returns
+        -------
+        Tuple[float, List[Tuple[str, str]]]
+            Wall seconds per cycle (0 if there is no dependency on previous cycles) and
+            the (task of the previous cycle, dependent task) pairs of the limiting loop
+        """
+        names = self.in_cycle(group)
+        selected = set(names)
+        cross = [(pred, name, round(-lag / interval)) for name in names
+                 for pred, lag in self.required(name, None, selected) if lag < 0]
+        cross = [(pred, succ, lag) for pred, succ, lag in cross if lag > 0]
+        if not cross:
+            return 0., []
+
+        # weight[i, j]: longest chain from the dependent task of loop edge i to the
+        # task of the previous cycle of loop edge j, within a cycle
+        n = len(cross)
+        weight = np.full((n, n), -np.inf)
+        for i, (_, succ, _) in enumerate(cross):
+            length = self.longest_paths(durations, succ, names)
+            for j, (pred, _, _) in enumerate(cross):
+                if pred in length:
+                    weight[i, j] = length[pred]
+        lags = np.array([lag for _, _, lag in cross], dtype=float)
+
+        def positive_loop(period: float) -> Optional[List[int]]:
+            # Bellman-Ford for a loop of positive weight - period * lag
+            gain = weight - period * lags[np.newaxis, :]
+            best = np.zeros(n)
+            parent = np.full(n, -1)
+            for _ in range(n):
+                candidates = best[:, np.newaxis] + gain
+                arg = np.argmax(candidates, axis=0)
+                new = candidates[arg, np.arange(n)]
+                improved = new > best + 1.e-9
+                if not improved.any():
+                    return None
+                best = np.where(improved, new, best)
+                parent = np.where(improved, arg, parent)
+            # walk back from an improved node until a node repeats to get the loop
+            node = int(np.argmax(improved))
+            for _ in range(n):
+                node = int(parent[node])
+            loop, current = [node], int(parent[node])
+            while current != node and len(loop) <= n:
+                loop.append(current)
+                current = int(parent[current])
+            return loop[::-1]
+
+        low, high = 0., float(np.nanmax(np.where(np.isfinite(weight), weight, 0.))) + 1.
+        loop = positive_loop(low)
+        if loop is None:
+            return 0., []
+        for _ in range(60):
+            middle = (low + high) / 2.
+            found = positive_loop(middle)
+            if found is None:
+                high = middle
+            else:
+                low, loop = middle, found
+            if high - low < 1.:
+                break
+        return high, [(cross[i][0], cross[i][1]) for i in loop]
+
+
+def _steady(node: DepNode) -> Optional[bool]:
+    """
+    Value of a dependency in every cycle of the steady state of a long run, where the
+    other cycles exist; None if it depends on the progress of the tasks
+    """
+    if node.kind in ['cycleexistdep', 'true']:
+        return True
+    if node.kind == 'false':
+        return False
+    if node.kind not in OPERATORS:
+        return None
+    values = [_steady(child) for child in node.children]
+    if node.kind == 'not':
+        return None if values[0] is None else not values[0]
+    if node.kind == 'and':
+        return False if False in values else True if all(values) else None
+    if node.kind == 'or':
+        return True if True in values else False if values and all(value is False for value in values) else None
+    return None
+
+
+def _expand(text: str, variables: Dict[str, str]) -> str:
+    for var, value in variables.items():
+        text = text.replace(f'#{var}#', value)
+    return text
+
+
+def _substitute_entities(text: str, entities: Dict[str, str]) -> str:
+    """Replace the workflow entities (&NAME;) but not the predefined XML ones (&amp; ...)"""
+    predefined = {'amp', 'lt', 'gt', 'quot', 'apos'}
+    return re.sub(r'&(\w+);', lambda match: match.group(0) if match.group(1) in predefined
+                  else entities.get(match.group(1), match.group(1)), text)
+
+
+def job_samples_from_rocoto_db(db_file: str, since: Optional[datetime] = None) -> Dict[str, Dict[str, List[float]]]:
+    """
+    Run times and, when rocoto_viewer recorded them (jobs_augment table), queue waits of
+    the succeeded jobs of a Rocoto database
+
+    Parameters
+    ----------
+    db_file: str
+        Rocoto SQLite database of an experiment
+    since: datetime, optional
+        Only use the jobs of the cycles from this date
+
+    Returns
+    -------
+    Dict[str, Dict[str, List[float]]]
+        'duration' and 'queue' samples in seconds of each task that has succeeded at least once
+    """
+    where = "WHERE state = 'SUCCEEDED' AND duration > 0"
+    params = []
+    if since is not None:
+        where += " AND cycle >= ?"
+        params.append(int((since - datetime(1970, 1, 1)) / timedelta(seconds=1)))
+    with sqlite3.connect(f'file:{db_file}?mode=ro', uri=True) as con:
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'jobs_augment' in tables:
+            rows = con.execute(f"SELECT taskname, duration, qtime FROM jobs_augment {where}", params).fetchall()
+        else:
+            rows = con.execute(f"SELECT taskname, duration, NULL FROM jobs {where}", params).fetchall()
+
+    samples = dict()
+    for taskname, duration, qtime in rows:
+        task_samples = samples.setdefault(taskname, {'duration': [], 'queue': []})
+        task_samples['duration'].append(float(duration))
+        try:
+            task_samples['queue'].append(float(qtime))
+        except (TypeError, ValueError):
+            pass  # not recorded, or '-' for jobs that were not found by the scheduler
+    return samples
+
+
+def durations_from_rocoto_db(db_file: str, statistic: str = 'median',
+                             since: Optional[datetime] = None) -> Dict[str, float]:
+    """
+    Duration of each task from the succeeded jobs of a Rocoto database
+
+    Parameters
+    ----------
+    db_file: str
+        Rocoto SQLite database of an experiment
+    statistic: str
+        median, mean, max or pNN (a percentile, e.g. p90)
+    since: datetime, optional
+        Only use the jobs of the cycles from this date
+
+    Returns
+    -------
+    Dict[str, float]
+        Duration in seconds of each task that has succeeded at least once
+    """
+    samples = job_samples_from_rocoto_db(db_file, since)
+
+    if statistic == 'median':
+        reduce = np.median
+    elif statistic == 'mean':
+        reduce = np.mean
+    elif statistic == 'max':
+        reduce = np.max
+    elif re.fullmatch(r'p\d+(\.\d+)?', statistic):
+        def reduce(values):
+            return np.percentile(values, float(statistic[1:]))
+    else:
+        raise ValueError(f'Unknown statistic {statistic}, valid statistics are median, mean, max and pNN')
+
+    return {task: float(reduce(values['duration'])) for task, values in samples.items()}
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rocoto.workflow_dag import DepNode, WorkflowDAG, hms_to_seconds
+
+'''
+    MODULE:
+        workflow_sim.py
+
+    ABOUT:
+        Discrete-event simulation of a retrospective run of a Rocoto workflow (WorkflowDAG):
+        cycles are activated in order up to cyclethrottle, ready tasks are submitted up to
+        taskthrottle, every job waits in the queue and then runs. Task durations and queue
+        waits are replayed from a Rocoto database or drawn from synthetic distributions.
+        The result is the number of cycles per wall-clock day, the occupancy of the queue
+        and the gaps when nothing runs, for a pair of throttles or a sweep of them.
+'''
+
+__all__ = ['cycle_times', 'TimingModel', 'SimulationResult', 'ThroughputSimulator', 'recommend']
+
+# Dependencies on the world outside the workflow, taken as satisfied
+EXTERNAL = ['datadep', 'sh', 'streq', 'strneq']
+
+
+def cycle_times(cycledef: str) -> List[datetime]:
+    """
+    Cycles of a Rocoto cycledef "start end interval" (e.g. "202401010000 202401310000 06:00:00")
+    """
+    fields = cycledef.split()
+    if len(fields) != 3:
+        raise ValueError(f'Only "start end interval" cycledefs are supported, not "{cycledef}"')
+    start, end = (datetime.strptime(field, '%Y%m%d%H%M') for field in fields[:2])
+    interval = timedelta(seconds=hms_to_seconds(fields[2]))
+    count = int((end - start) / interval) + 1 if end >= start else 0
+    return [start + ii * interval for ii in range(count)]
+
+
+class TimingModel:
+    """
+    Run time and queue wait of the jobs of each task
+
+    Tasks with samples (e.g. from rocoto.workflow_dag.job_samples_from_rocoto_db) replay
+    them at random. Otherwise the run time is the walltime of the task, scaled by a
+    lognormal factor of median 1 when spread > 0, and the queue wait is exponential of
+    mean queue_wait.
+
+    Parameters
+    ----------
+    samples: Dict[str, Dict[str, List[float]]], optional
+        'duration' and 'queue' samples in seconds of each task
+    queue_wait: float
+        Mean queue wait in seconds of the tasks without queue samples
+    spread: float
+        Standard deviation of the logarithm of the run time of the tasks without samples
+    walltime_fraction: float
+        Fraction of the walltime the tasks without samples run for
+    """
+
+    def __init__(self, samples: Optional[Dict[str, Dict[str, List[float]]]] = None, queue_wait: float = 0.,
+                 spread: float = 0., walltime_fraction: float = 1.) -> None:
+        self.samples = samples or dict()
+        self.queue_wait = queue_wait
+        self.spread = spread
+        self.walltime_fraction = walltime_fraction
+
+    def duration(self, task, rng: np.random.Generator) -> float:
+        values = self.samples.get(task.name, dict()).get('duration')
+        if values:
+            return float(values[rng.integers(len(values))])
+        duration = task.walltime * self.walltime_fraction
+        return duration * float(rng.lognormal(0., self.spread)) if self.spread > 0 else duration
+
+    def queue(self, task, rng: np.random.Generator) -> float:
+        values = self.samples.get(task.name, dict()).get('queue')
+        if values:
+            return float(values[rng.integers(len(values))])
+        return float(rng.exponential(self.queue_wait)) if self.queue_wait > 0 else 0.
+
+
+class SimulationResult:
+    """
+    Outcome of a simulated run
+
+    Attributes
+    ----------
+    cyclethrottle, taskthrottle: int
+        Throttles of the run
+    completed: List[float]
+        Time in seconds each cycle completed, in cycle order
+    makespan: float
+        Time in seconds the last cycle completed
+    occupancy: Dict[str, float]
+        Time-averaged number of queued and running jobs, largest number of jobs in flight and
+        fraction of the time the taskthrottle was reached
+    gaps: List[Tuple[float, float]]
+        Start and length in seconds of the periods when no job was queued nor running
+    queue_waits: List[float]
+        Queue wait in seconds of every job
+    stalled: int
+        Number of cycles that never completed because some of their dependencies can never be satisfied
+    """
+
+    def __init__(self, cyclethrottle: int, taskthrottle: int, completed: List[float], makespan: float,
+                 occupancy: Dict[str, float], gaps: List[Tuple[float, float]], queue_waits: List[float],
+                 stalled: int = 0) -> None:
+        self.cyclethrottle = cyclethrottle
+        self.taskthrottle = taskthrottle
+        self.completed = completed
+        self.makespan = makespan
+        self.occupancy = occupancy
+        self.gaps = gaps
+        self.queue_waits = queue_waits
+        self.stalled = stalled
+
+    @property
+    def cycles_per_day(self) -> float:
+        """Cycles completed per wall-clock day over the whole run"""
+        return 86400. * len(self.completed) / self.makespan if self.makespan > 0 else 0.
+
+    @property
+    def steady_cycles_per_day(self) -> float:
+        """Cycles per day between the completion of the first and the last cycle, without the ramp-up"""
+        if len(self.completed) < 2 or self.completed[-1] <= self.completed[0]:
+            return self.cycles_per_day
+        return 86400. * (len(self.completed) - 1) / (self.completed[-1] - self.completed[0])
+
+    @property
+    def idle(self) -> float:
+        """Seconds when no job was queued nor running"""
+        return sum(length for _, length in self.gaps)
+
+    def summary(self) -> Dict[str, float]:
+        return {'cyclethrottle': self.cyclethrottle, 'taskthrottle': self.taskthrottle,
+                'cycles': len(self.completed), 'stalled': self.stalled, 'makespan_h': self.makespan / 3600.,
+                'cycles_per_day': self.cycles_per_day, 'steady_cycles_per_day': self.steady_cycles_per_day,
+                'mean_queued': self.occupancy['queued'], 'mean_running': self.occupancy['running'],
+                'max_in_flight': self.occupancy['max_in_flight'], 'at_taskthrottle': self.occupancy['at_taskthrottle'],
+                'mean_queue_wait_min': float(np.mean(self.queue_waits)) / 60. if self.queue_waits else 0.,
+                'idle_h': self.idle / 3600., 'longest_gap_h': max([length for _, length in self.gaps], default=0.) / 3600.}
+
+
+class ThroughputSimulator:
+    """
+    Discrete-event simulator of a retrospective run of a workflow
+
+    The run behaves like Rocoto with realtime="F": the oldest cycles are activated first and
+    at most cyclethrottle cycles are active (not complete) at once; a task is submitted when
+    its dependencies are satisfied and fewer than taskthrottle jobs are queued or running.
+    Data, shell and string dependencies are taken as satisfied; when they are alternatives
+    to task or cycle dependencies (e.g. a forecast output or the forecast itself), only the
+    latter are waited for.
+    Every task succeeds on its first try.
+
+    Parameters
+    ----------
+    dag: WorkflowDAG
+        Workflow to simulate
+    timing: TimingModel
+        Run times and queue waits of the jobs
+    ncycles: int, optional
+        Number of cycles of the run, every cycle of the cycledefs if None
+    poll: float
+        Interval in seconds between two rocotorun, 0 to submit as soon as a task is ready
+    """
+
+    def __init__(self, dag: WorkflowDAG, timing: TimingModel, ncycles: Optional[int] = None, poll: float = 0.) -> None:
+        self.dag = dag
+        self.timing = timing
+        self.poll = poll
+
+        groups = dict()
+        for group, cycledefs in dag.cycledefs.items():
+            for cycledef in cycledefs:
+                for cycle in cycle_times(cycledef):
+                    groups.setdefault(cycle, set()).add(group)
+        self.cycles = sorted(groups)[:ncycles]
+        self._index = {cycle: ii for ii, cycle in enumerate(self.cycles)}
+
+        # tasks of each cycle, in an order where a task comes after the tasks it depends on
+        self.cycle_tasks = []
+        for cycle in self.cycles:
+            names = [name for name, task in dag.tasks.items() if groups[cycle] & set(task.cycledefs)]
+            self.cycle_tasks.append(dag.topological_order(names))
+        self._selected = [set(names) for names in self.cycle_tasks]
+
+    def run(self, cyclethrottle: int, taskthrottle: int, seed: int = 0) -> SimulationResult:
+        """
+        Simulate the run with a pair of throttles
+
+        Parameters
+        ----------
+        cyclethrottle: int
+            Maximum number of active cycles
+        taskthrottle: int
+            Maximum number of jobs queued or running
+        seed: int
+            Seed of the random draws of run times and queue waits
+        """
+        rng = np.random.default_rng(seed)
+        ncycles = len(self.cycles)
+        self._done = [set() for _ in range(ncycles)]
+        waiting = [list() for _ in range(ncycles)]
+        completed = [None] * ncycles
+        active = []
+        next_cycle = 0
+        events = []
+        sequence = 0
+        queued, running = 0, 0
+        queue_waits = []
+        now = 0.
+
+        # time integrals of the occupancy
+        last = 0.
+        area = {'queued': 0., 'running': 0., 'at_taskthrottle': 0.}
+        max_in_flight = 0
+        gaps = []
+        idle_since = 0.
+
+        def push(time, kind, ci, name):
+            nonlocal sequence
+            heapq.heappush(events, (time, sequence, kind, ci, name))
+            sequence += 1
+
+        def submit():
+            nonlocal next_cycle, queued
+            while len(active) < cyclethrottle and next_cycle < ncycles:
+                waiting[next_cycle] = list(self.cycle_tasks[next_cycle])
+                if waiting[next_cycle]:
+                    active.append(next_cycle)
+                else:
+                    completed[next_cycle] = now
+                next_cycle += 1
+            for ci in active:
+                for name in list(waiting[ci]):
+                    if queued + running >= taskthrottle:
+                        return
+                    task = self.dag.tasks[name]
+                    if task.dependency is None or self._satisfied(task.dependency, ci):
+                        waiting[ci].remove(name)
+                        wait = self.timing.queue(task, rng)
+                        queue_waits.append(wait)
+                        queued += 1
+                        push(now + wait, 'start', ci, name)
+
+        submit()
+        if self.poll > 0 and queued:
+            push(self.poll, 'poll', None, None)
+        while events:
+            time = events[0][0]
+            in_flight = queued + running
+            area['queued'] += queued * (time - last)
+            area['running'] += running * (time - last)
+            area['at_taskthrottle'] += (time - last) if in_flight >= taskthrottle else 0.
+            last = now = time
+
+            # every event at this time, then the submissions of one rocotorun
+            polled = self.poll <= 0
+            while events and events[0][0] == now:
+                _, _, kind, ci, name = heapq.heappop(events)
+                if kind == 'start':
+                    queued -= 1
+                    running += 1
+                    push(now + self.timing.duration(self.dag.tasks[name], rng), 'finish', ci, name)
+                elif kind == 'finish':
+                    running -= 1
+                    self._done[ci].add(name)
+                    if len(self._done[ci]) == len(self.cycle_tasks[ci]):
+                        completed[ci] = now
+                        active.remove(ci)
+                else:
+                    polled = True
+            if polled:
+                submit()
+                # nothing in flight after a rocotorun: the remaining tasks can never run
+                if self.poll > 0 and queued + running > 0:
+                    push(now + self.poll, 'poll', None, None)
+
+            if queued + running == 0 and in_flight > 0:
+                idle_since = now
+            elif queued + running > 0 and in_flight == 0 and now > idle_since:
+                gaps.append((idle_since, now - idle_since))
+            max_in_flight = max(max_in_flight, queued + running)
+
+        makespan = max([time for time in completed if time is not None], default=0.)
+        occupancy = {key: value / makespan if makespan > 0 else 0. for key, value in area.items()}
+        occupancy['max_in_flight'] = max_in_flight
+        return SimulationResult(cyclethrottle, taskthrottle, [time for time in completed if time is not None],
+                                makespan, occupancy, gaps, queue_waits, stalled=completed.count(None))
+
+    def sweep(self, cyclethrottles: List[int], taskthrottles: List[int], repeats: int = 1,
+              seed: int = 0) -> List[Dict[str, float]]:
+        """
+        Summaries of the runs of every pair of throttles, averaged over repeats random draws
+        """
+        summaries = []
+        for cyclethrottle in cyclethrottles:
+            for taskthrottle in taskthrottles:
+                runs = [self.run(cyclethrottle, taskthrottle, seed + repeat).summary() for repeat in range(repeats)]
+                summary = {key: float(np.mean([run[key] for run in runs])) for key in runs[0]}
+                summary.update(cyclethrottle=cyclethrottle, taskthrottle=taskthrottle)
+                summaries.append(summary)
+        return summaries
+
+    def _satisfied(self, node: DepNode, ci: int) -> bool:
+        if node.kind == 'and':
+            return all(self._satisfied(child, ci) for child in node.children)
+        if node.kind == 'or':
+            tasks = [child for child in node.children if any(leaf.kind not in EXTERNAL for leaf in child.leaves())]
+            return any(self._satisfied(child, ci) for child in tasks or node.children)
+        if node.kind == 'not':
+            return not self._satisfied(node.children[0], ci)
+        if node.kind in ['nand', 'nor', 'xor', 'some']:
+            values = [self._satisfied(child, ci) for child in node.children]
+            if node.kind == 'nand':
+                return not all(values)
+            if node.kind == 'nor':
+                return not any(values)
+            if node.kind == 'xor':
+                return sum(values) == 1
+            return sum(values) >= float(node.attrs.get('threshold', 1.)) * len(values)
+        if node.kind in ['taskdep', 'metataskdep']:
+            target = self._cycle(ci, node.offset)
+            if target is None:
+                return False
+            members = [member for member in self.dag.members(node) if member in self._selected[target]]
+            return bool(members) and all(member in self._done[target] for member in members)
+        if node.kind == 'cycleexistdep':
+            return self._cycle(ci, node.offset) is not None
+        return node.kind != 'false'
+
+    def _cycle(self, ci: int, offset: int) -> Optional[int]:
+        return self._index.get(self.cycles[ci] + timedelta(seconds=offset))
+
+
+def recommend(summaries: List[Dict[str, float]], tolerance: float = 0.02) -> Dict[str, float]:
+    """
+    Throttles to use: the smallest ones (taskthrottle first, to keep the fewest jobs in the
+    queue) whose rate is within tolerance of the best rate of the sweep
+    """
+    best = max(summary['cycles_per_day'] for summary in summaries)
+    candidates = [summary for summary in summaries if summary['cycles_per_day'] >= (1. - tolerance) * best]
+    return min(candidates, key=lambda summary: (summary['taskthrottle'], summary['cyclethrottle']))
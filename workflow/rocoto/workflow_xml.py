@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 
 import os
+import re
+import difflib
 from distutils.spawn import find_executable
 from datetime import datetime
 from collections import OrderedDict
-from typing import Dict
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
 from applications.applications import AppConfig
 from rocoto.workflow_tasks import get_wf_tasks
+from rocoto.workflow_dag import WorkflowDAG
 import rocoto.rocoto as rocoto
+import xml.etree.ElementTree as ET
 from abc import ABC, abstractmethod
 
+# Tasks and metatasks at the top level of a workflow XML start and end at column 0
+_SECTION_PATTERN = re.compile(r'^<(?:task|metatask) name="([^"]+)"', re.MULTILINE)
+_FOOTER_PATTERN = re.compile(r'^</workflow>', re.MULTILINE)
+_GENERATED_PATTERN = re.compile(r'This workflow was automatically generated at [^\n]*')
+
 
 class RocotoXML(ABC):
 
@@ -30,6 +40,84 @@ class RocotoXML(ABC):
         self.footer = self._get_workflow_footer()
 
         self.xml = self._assemble_xml()
+        self._dag = None
+
+    def validate(self) -> List[str]:
+        """
+        Check that the XML is well formed, that the task names are unique and that the
+        variables of each metatask have as many values.
+
+        Returns
+        -------
+        List[str]
+            Warnings for the dependencies on tasks or metatasks that are not in the workflow
+
+        Raises
+        ------
+        ValueError
+            If the XML is not a valid workflow
+        """
+
+        try:
+            dag = self.dag
+        except ET.ParseError as error:
+            raise ValueError(f'The workflow XML is not well formed: {error}')
+
+        warnings = []
+        for name, task in dag.tasks.items():
+            if task.dependency is None:
+                continue
+            for leaf in task.dependency.leaves():
+                if leaf.kind == 'taskdep' and leaf.attrs.get('task') not in dag.tasks:
+                    warnings.append(f"{name} depends on the unknown task {leaf.attrs.get('task')}")
+                elif leaf.kind == 'metataskdep' and leaf.attrs.get('metatask') not in dag.metatasks:
+                    warnings.append(f"{name} depends on the unknown metatask {leaf.attrs.get('metatask')}")
+        return warnings
+
+    def diff(self, xml_file: str = None) -> Tuple[Dict[str, List[str]], str]:
+        """
+        Differences between the workflow and an existing XML, by default $PSLOT.xml
+
+        Returns
+        -------
+        Dict[str, List[str]]
+            Top level tasks and metatasks added, removed and changed, and the header sections
+            (entities, workflow attributes, cycledefs) changed, if any
+        str
+            Unified diff of the XML
+        """
+
+        xml_file = xml_file or self._xml_file()
+        old_xml = ''
+        if os.path.exists(xml_file):
+            with open(xml_file, 'r') as fh:
+                old_xml = fh.read()
+
+        old_head, old_sections, old_tail = split_xml_sections(old_xml)
+        new_head, new_sections, new_tail = split_xml_sections(self.xml)
+        header_changed = _GENERATED_PATTERN.sub('', old_head) != _GENERATED_PATTERN.sub('', new_head) or old_tail != new_tail
+        changes = {'added': [name for name in new_sections if name not in old_sections],
+                   'removed': [name for name in old_sections if name not in new_sections],
+                   'changed': [name for name, section in new_sections.items()
+                               if name in old_sections and old_sections[name] != section],
+                   'header': ['header'] if header_changed else []}
+
+        old_lines = _GENERATED_PATTERN.sub('', old_xml).splitlines(True)
+        new_lines = _GENERATED_PATTERN.sub('', self.xml).splitlines(True)
+        text = ''.join(difflib.unified_diff(old_lines, new_lines, fromfile=xml_file, tofile='regenerated'))
+
+        return changes, text
+
+    @property
+    def dag(self) -> WorkflowDAG:
+        """
+        Model of the tasks, metatasks and dependencies of the workflow
+        """
+
+        if self._dag is None:
+            self._dag = WorkflowDAG.from_string(self.xml)
+
+        return self._dag
 
     @staticmethod
     def _get_preamble():
@@ -119,20 +207,51 @@ class RocotoXML(ABC):
 
         return ''.join(strings)
 
-    def write(self, xml_file: str = None, crontab_file: str = None):
-        self._write_xml(xml_file=xml_file)
+    def write(self, xml_file: str = None, crontab_file: str = None,
+              update: bool = False, tasks: Optional[List[str]] = None) -> bool:
+        """
+        Write the XML and the crontab
+
+        With update, only the top level tasks and metatasks that changed are replaced in an
+        existing XML, and the XML is not written at all if nothing changed. With tasks (names
+        or shell patterns of top level tasks and metatasks), only those are replaced and the
+        rest of the existing XML is kept as is.
+
+        Returns
+        -------
+        bool
+            Whether the XML was written
+        """
+        written = self._write_xml(xml_file=xml_file, update=update or tasks is not None, tasks=tasks)
         self._write_crontab(crontab_file=crontab_file)
+        return written
 
-    def _write_xml(self, xml_file: str = None) -> None:
+    def _xml_file(self) -> str:
 
         expdir = self._base['EXPDIR']
         pslot = self._base['PSLOT']
 
+        return f"{expdir}/{pslot}.xml"
+
+    def _write_xml(self, xml_file: str = None, update: bool = False, tasks: Optional[List[str]] = None) -> bool:
+
         if xml_file is None:
-            xml_file = f"{expdir}/{pslot}.xml"
+            xml_file = self._xml_file()
+
+        if update and os.path.exists(xml_file):
+            with open(xml_file, 'r') as fh:
+                old_xml = fh.read()
+            chunks = merge_xml_sections(old_xml, self.xml, tasks)
+            if ''.join(chunks) == old_xml:
+                return False
+        else:
+            head, sections, tail = split_xml_sections(self.xml)
+            chunks = [head] + list(sections.values()) + [tail]
 
         with open(xml_file, 'w') as fh:
-            fh.write(self.xml)
+            fh.writelines(chunks)
+
+        return True
 
     def _write_crontab(self, crontab_file: str = None, cronint: int = 5) -> None:
         """
@@ -175,3 +294,65 @@ class RocotoXML(ABC):
             fh.write('\n'.join(strings))
 
         return
+
+
+def split_xml_sections(xml: str) -> Tuple[str, Dict[str, str], str]:
+    """
+    Split a workflow XML into its header (up to the first task), the XML of each top level
+    task or metatask (with the empty lines that follow it), and its footer.
+    """
+
+    starts = [(match.start(), match.group(1)) for match in _SECTION_PATTERN.finditer(xml)]
+    footer = _FOOTER_PATTERN.search(xml)
+    end = footer.start() if footer is not None else len(xml)
+    # the footer starts with the line ending of the last task
+    if end > 0 and xml[end - 1] == '\n':
+        end -= 1
+
+    if not starts:
+        return xml[:end], OrderedDict(), xml[end:]
+
+    sections = OrderedDict()
+    for (start, name), (stop, _) in zip(starts, starts[1:] + [(end, None)]):
+        sections[name] = xml[start:stop]
+
+    return xml[:starts[0][0]], sections, xml[end:]
+
+
+def merge_xml_sections(old_xml: str, new_xml: str, tasks: Optional[List[str]] = None) -> List[str]:
+    """
+    Sections of an existing workflow XML updated from a regenerated one
+
+    Unchanged sections are kept as they are in the existing XML, including the header when
+    only its generation time differs. With tasks (names or shell patterns of top level tasks
+    and metatasks) only those are added, replaced or removed; the header and the other tasks
+    of the existing XML are kept.
+    """
+
+    old_head, old_sections, old_tail = split_xml_sections(old_xml)
+    new_head, new_sections, new_tail = split_xml_sections(new_xml)
+
+    if tasks is None:
+        if _GENERATED_PATTERN.sub('', old_head) == _GENERATED_PATTERN.sub('', new_head):
+            new_head = old_head
+        sections = [old_sections.get(name) if old_sections.get(name) == section else section
+                    for name, section in new_sections.items()]
+        return [new_head] + sections + [new_tail]
+
+    def selected(name: str) -> bool:
+        return any(fnmatch(name, pattern) for pattern in tasks)
+
+    sections = []
+    for name, section in old_sections.items():
+        if not selected(name):
+            sections.append(section)
+        elif name in new_sections:
+            sections.append(new_sections[name])
+    sections += [section for name, section in new_sections.items() if selected(name) and name not in old_sections]
+
+    # the last task of the workflow is followed by the line ending of the footer only
+    sections = [section if section.endswith('\n\n') else f'{section}\n' for section in sections]
+    if sections:
+        sections[-1] = sections[-1][:-1]
+
+    return [old_head] + sections + [old_tail]
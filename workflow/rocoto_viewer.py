@@ -36,7 +36,7 @@ from os.path import basename
 import subprocess
 from math import *
 
-from itertools import groupby
+from itertools import groupby, product
 from time import time
 from multiprocessing import Process, Queue
 import queue
@@ -115,6 +115,8 @@ rzdm_path = ''
 only_check_point = False
 save_checkfile_path = None
 use_multiprocessing = True
+# Jobs and cycles of the database read so far (RocotoStatus)
+rocoto_status = None
 get_user = getpass.getuser()
 
 rocotoboot = None
@@ -218,6 +220,73 @@ def string_to_timedelta(td_string: str) -> timedelta:
         raise
 
 
+class CycleDefGroup:
+    """
+    Cycles (YYYYMMDDHHMM) of the cycledefs of a group
+
+    Each cycledef is kept as its start, end and step, a timedelta or a number of months,
+    rather than as the list of its cycles: whether a cycle is in the group is computed
+    from the dates, and the cycles are only generated when the group is iterated.
+    """
+
+    def __init__(self):
+        self.cycledefs = []    # (start, end, step, months) of each cycledef
+
+    def add(self, start_cycle, end_cycle, inc_cycle=None, months=0):
+        """
+        Add the cycles from start_cycle to end_cycle every inc_cycle (timedelta) or every months months
+        """
+        self.cycledefs.append((start_cycle, end_cycle, inc_cycle, months))
+
+    @staticmethod
+    def _nth_cycle(start_cycle, months, nth):
+        # the day of a cycle on the 29th to 31st is cut at the end of the shorter months,
+        # and stays there, as when the months are added one step at a time
+        if start_cycle.day <= 28:
+            return start_cycle + relativedelta(months=+nth * months)
+        cycle = start_cycle
+        for _ in range(nth):
+            cycle = cycle + relativedelta(months=+months)
+        return cycle
+
+    def __contains__(self, cycle_string):
+        try:
+            cycle = datetime.strptime(cycle_string, '%Y%m%d%H%M')
+        except (TypeError, ValueError):
+            return False
+        for start_cycle, end_cycle, inc_cycle, months in self.cycledefs:
+            if not start_cycle <= cycle <= end_cycle:
+                continue
+            if months:
+                nth, remainder = divmod((cycle.year - start_cycle.year) * 12 + cycle.month - start_cycle.month, months)
+                if remainder == 0 and self._nth_cycle(start_cycle, months, nth) == cycle:
+                    return True
+            elif (cycle - start_cycle) % inc_cycle == timedelta(0):
+                return True
+        return False
+
+    @staticmethod
+    def _cycles(start_cycle, end_cycle, inc_cycle, months):
+        cycle = start_cycle
+        while cycle <= end_cycle:
+            yield cycle
+            cycle = cycle + (relativedelta(months=+months) if months else inc_cycle)
+
+    def __iter__(self):
+        for cycledef in self.cycledefs:
+            for cycle in self._cycles(*cycledef):
+                yield cycle.strftime('%Y%m%d%H%M')
+
+    def __len__(self):
+        ncycles = 0
+        for start_cycle, end_cycle, inc_cycle, months in self.cycledefs:
+            if months:
+                ncycles += sum(1 for _ in self._cycles(start_cycle, end_cycle, inc_cycle, months))
+            elif end_cycle >= start_cycle:
+                ncycles += (end_cycle - start_cycle) // inc_cycle + 1
+        return ncycles
+
+
 # Shamelessly stolen and updated from produtils
 def is_posix(s: str) -> bool:
     """
@@ -846,6 +915,9 @@ def rocoto_boot(params):
     stat = syscall([rocotoboot, '--workflow', workflow_file, '--database', database_file, '--cycles', cycle, '--tasks', task_list])
     if stat is None:
         display_results('rocotoboot failed!!', '')
+    # the jobs of the rewound or booted tasks are replaced
+    if rocoto_status is not None:
+        rocoto_status.reload()
     return stat
 
 
@@ -854,6 +926,9 @@ def rocoto_rewind(params):
     stat = syscall([rocotorewind, '-w', workflow_file, '-d', database_file, '-c', cycle, process])
     if stat is None:
         display_results('rocotorewind failed!!', '')
+    # the jobs of the rewound or booted tasks are replaced
+    if rocoto_status is not None:
+        rocoto_status.reload()
     return stat
 
 
@@ -869,6 +944,8 @@ def rocoto_run(params):
 
 def get_tasklist(workflow_file):
     tasks_ordered = []
+    # names of the tasks in tasks_ordered
+    task_names = set()
     metatask_list = collections.defaultdict(list)
     try:
         tree = ET.parse(workflow_file)
@@ -890,7 +967,7 @@ def get_tasklist(workflow_file):
             raise
 
     root = tree.getroot()
-    cycledef_group_cycles = collections.defaultdict(list)
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
     if list_tasks:
         curses.endwin()
         print()
@@ -920,24 +997,21 @@ def get_tasklist(workflow_file):
                 end_cycle = datetime.strptime(cycle_string[1], '%Y%m%d%H%M')
                 inc_cycle = string_to_timedelta(cycle_string[2])
 
-            while start_cycle <= end_cycle:
-                cycledef_group_cycles[cycle_def_name].append(start_cycle.strftime("%Y%m%d%H%M"))
-                if PACKAGE.lower() == 'ugcs' and ucgs_is_cron:
-                    try:
-                        start_cycle = start_cycle + relativedelta(months=+inc_cycle)
-                    except AttributeError:
-                        curses.endwin()
-                        eprint("""
-                            Could not handle cycle increment measured in months because dateutil
-                            could not be imported. In order to read this workflow, install dateutil
-                            using pip:
+            if PACKAGE.lower() == 'ugcs' and ucgs_is_cron:
+                if 'relativedelta' not in globals():
+                    curses.endwin()
+                    eprint("""
+                        Could not handle cycle increment measured in months because dateutil
+                        could not be imported. In order to read this workflow, install dateutil
+                        using pip:
 
-                            > pip install python-dateutil --user
+                        > pip install python-dateutil --user
 
-                            """)
-                        sys.exit(-1)
-                else:
-                    start_cycle = start_cycle + inc_cycle
+                        """)
+                    sys.exit(-1)
+                cycledef_group_cycles[cycle_def_name].add(start_cycle, end_cycle, months=inc_cycle)
+            else:
+                cycledef_group_cycles[cycle_def_name].add(start_cycle, end_cycle, inc_cycle)
         if child.tag == 'task':
             task_name = child.attrib['name']
             log_file = child.find('join').find('cyclestr').text.replace('@Y@m@d@H', 'CYCLE')
@@ -952,10 +1026,13 @@ def get_tasklist(workflow_file):
                 #    for them in dependency.getchildren():
                 #        print(them.attrib)
             tasks_ordered.append((task_name, task_cycledefs, log_file))
+            task_names.add(task_name)
         elif child.tag == 'metatask':
             all_metatasks_iterator = child.iter('metatask')
             all_vars = dict()
             all_tasks = []
+            # tasks already expanded with the same variables, which would add nothing
+            expanded_tasks = set()
             for i, metatasks in enumerate(all_metatasks_iterator):
                 metatask_name = 'NO_NAME'
                 try:
@@ -978,36 +1055,31 @@ def get_tasklist(workflow_file):
                     else:
                         task_cycledefs = cycle_noname
                     all_tasks.append((task_name, task_cycledefs, task_log))
-                add_task = []
-                for task_name in all_tasks:
-                    first_task_resolved = False
-                    first_task_resolved_name = ''
-                    add_task[:] = []
-                    add_task.append(task_name)
-                    for name, vars in all_vars.items():
-                        replace_var = '#' + name + '#'
-                        for each_task_name in add_task:
-                            if replace_var in each_task_name[0]:
-                                for var in vars:
-                                    new_task_name = each_task_name[0].replace(replace_var, var)
-                                    new_task_log = each_task_name[2].replace(replace_var, var)
-                                    add_task.append((new_task_name, each_task_name[1], new_task_log))
-                        for task in add_task:
-                            if '#' not in task[0]:
-                                if task[0] not in [j[0] for j in tasks_ordered]:
-                                    tasks_ordered.append(task)
-                                    if not first_task_resolved:
-                                        first_task_resolved = True
-                                        first_task_resolved_name = task[0]
-                                        if metatask_name == 'NO_NAME':
-                                            metatask_list[task[0]].append(task[0])
-                                        else:
-                                            metatask_list[task[0]].append(metatask_name)
-                                        metatask_list[task[0]].append(task[0])
-                                    else:
-                                        metatask_list[first_task_resolved_name].append(task[0])
-                                    if list_tasks:
-                                        print(f'tasks: , {i}, {task[0]}, {task[1]}, LOG:, {task[2]}')
+                # tasks are only resolved within metatasks that have variables
+                if len(all_vars) == 0:
+                    continue
+                for task in all_tasks:
+                    task_vars = tuple((name, tuple(values)) for name, values in all_vars.items() if f'#{name}#' in task[0])
+                    if (task, task_vars) in expanded_tasks:
+                        continue
+                    expanded_tasks.add((task, task_vars))
+                    first_task_resolved_name = None
+                    for new_task in expand_metatask_task(task, task_vars).values():
+                        if new_task[0] in task_names:
+                            continue
+                        tasks_ordered.append(new_task)
+                        task_names.add(new_task[0])
+                        if first_task_resolved_name is None:
+                            first_task_resolved_name = new_task[0]
+                            if metatask_name == 'NO_NAME':
+                                metatask_list[new_task[0]].append(new_task[0])
+                            else:
+                                metatask_list[new_task[0]].append(metatask_name)
+                            metatask_list[new_task[0]].append(new_task[0])
+                        else:
+                            metatask_list[first_task_resolved_name].append(new_task[0])
+                        if list_tasks:
+                            print(f'tasks: , {i}, {new_task[0]}, {new_task[1]}, LOG:, {new_task[2]}')
 
     # Default expantion of metatasks True = collapsed
     # for metatask,metatasks in metatask_list.iteritems():
@@ -1022,6 +1094,293 @@ def get_tasklist(workflow_file):
     return tasks_ordered, metatask_list, cycledef_group_cycles
 
 
+def expand_metatask_task(task, task_vars):
+    """
+    Tasks (name, cycledefs, log) of a metatask task for each combination of the values of the
+    variables in its name, the first variable varying slowest; the tasks with a #variable#
+    left are not resolved
+    """
+    expanded = dict()
+    replace_vars = [f'#{name}#' for name, _ in task_vars]
+    for var_values in product(*(values for _, values in task_vars)):
+        task_name, task_log = task[0], task[2]
+        for replace_var, var in zip(replace_vars, var_values):
+            task_name = task_name.replace(replace_var, var)
+            task_log = task_log.replace(replace_var, var)
+        if '#' not in task_name:
+            expanded.setdefault(task_name, (task_name, task[1], task_log))
+    return expanded
+
+
+# Columns of the jobs shown by the viewer, and the performance metrics of the jobs_augment table
+JOB_COLUMNS = 'id,jobid,taskname,cycle,state,exit_status,duration,tries'
+PERF_COLUMNS = 'qtime,cputime,runtime,slots'
+# States of the jobs Rocoto no longer updates (until a rewind or a boot)
+FINAL_JOB_STATES = ('SUCCEEDED', 'DEAD', 'EXPIRED')
+# Largest number of parameters of an SQLite query
+SQL_MAX_PARAMS = 900
+
+
+def job_line(row, performance_metrics):
+    """
+    Status line of a job row of the database
+    """
+    if performance_metrics:
+        (theid, jobid, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
+        return (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
+                f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
+                f"{str(tries)} {str(duration).split('.')[0]} {str(slots)} "
+                f"{str(qtime)} {str(cputime).split('.')[0]} {str(runtime)}")
+    (theid, jobid, taskname, cycle, state, exit_status, duration, tries) = row
+    return (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
+            f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
+            f"{str(tries)} {str(duration).split('.')[0]}")
+
+
+def cycledef_membership(cycledef_group_cycles):
+    """
+    Function telling whether a cycle (YYYYMMDDHHMM) is in the cycledefs of a task (e.g. 'gdas_half,gdas')
+    """
+    # Whether a cycle is in the cycledefs of a task
+    in_cycledefs = dict()
+
+    def task_in_cycle(cycle_string, task_cycledefs):
+        key = (cycle_string, task_cycledefs)
+        if key not in in_cycledefs:
+            in_cycledefs[key] = any(cycle_string in cycledef_group_cycles.get(each_cycledef, ())
+                                    for each_cycledef in task_cycledefs.split(','))
+        return in_cycledefs[key]
+
+    return task_in_cycle
+
+
+def assemble_cycle(each_cycle, lines_in_cycle, tasks_ordered, task_in_cycle):
+    """
+    Lines of the tasks of a cycle: the line of the job of each task of the cycle, in the order
+    of the tasks, and an empty line for the tasks of the cycle without job
+    """
+    new_lines = []
+    job_ids = set()
+    cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
+    # Lines of the jobs of each task in the cycle
+    task_lines = collections.defaultdict(list)
+    for each_line in lines_in_cycle:
+        fields = each_line.split()
+        if len(fields) > 2:
+            task_lines[fields[1]].append((each_line, fields[2]))
+    for task in tasks_ordered:
+        skip_task = False
+        in_cycle = task_in_cycle(cycle_string, task[1])
+        for each_line, job_id in task_lines.get(task[0], ()):
+            if job_id in job_ids:
+                break
+            if in_cycle:
+                new_lines.append(each_line)
+                job_ids.add(job_id)
+                skip_task = True
+                # a task with several cycledefs keeps the other lines of its jobs
+                if ',' not in task[1]:
+                    break
+        if skip_task:
+            continue
+        if in_cycle:
+            line = cycle_string + ' ' * 7 + task[0] + ' - - - - -'
+            new_lines.append(line)
+    return new_lines
+
+
+class RocotoStatus:
+    """
+    Jobs and cycles of a Rocoto database kept between two refreshes of the viewer
+
+    The first update reads the whole database. The next ones only read the jobs and cycles
+    added since (the rows above the highest ids read so far) and the jobs that were not
+    finished, and only assemble again the cycles of the jobs that changed; nothing is read
+    when no change was committed to the database. The whole database is read again every
+    full_reload_polls updates, after a rewind or a boot (reload), when jobs were removed
+    and with the performance metrics, whose table the viewer rebuilds at every refresh.
+    """
+
+    full_reload_polls = 20
+
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self._connection = None
+        self.reload()
+
+    @staticmethod
+    def _layout_of(tasks_ordered, cycledef_group_cycles):
+        # the content of the task list and of the cycledefs, comparable across processes
+        return (list(tasks_ordered), {name: list(group.cycledefs) for name, group in cycledef_group_cycles.items()})
+
+    def _file_version(self):
+        """
+        Version of the database that other connections and processes can compare: the file change
+        counter of the SQLite header (bytes 24-27), and the WAL file if any
+        """
+        version = []
+        try:
+            with open(self.database_file, 'rb') as dbfile:
+                dbfile.seek(24)
+                version.append(dbfile.read(4))
+        except OSError:
+            version.append(None)
+        try:
+            wal = os.stat(self.database_file + '-wal')
+            version.append((wal.st_mtime_ns, wal.st_size))
+        except OSError:
+            version.append(None)
+        return tuple(version)
+
+    def reload(self):
+        """
+        Read the whole database at the next update
+        """
+        self.rows = dict()                                # job rows by id
+        self.jobid_rows = collections.defaultdict(set)    # ids of the rows of each job id
+        self.cycle_rows = collections.defaultdict(set)    # ids of the rows of each cycle
+        self.cycles = set()
+        self.cycle_lines = dict()                         # status lines of each cycle
+        self.last_job_id = 0
+        self.last_cycle_id = 0
+        self.polls = 0
+        self._data_version = None
+        self._file_version_read = None
+        self._layout = None
+        self._task_positions = None
+        self._task_in_cycle = None
+
+    def __getstate__(self):
+        # the viewer gets the status from the process that read the database: only the rows,
+        # the lines and the layout are sent, the indexes are rebuilt on arrival; the data_version
+        # of a connection means nothing to another one, the file version is compared instead
+        state = self.__dict__.copy()
+        for name in ('_connection', '_data_version', '_task_positions', '_task_in_cycle', 'jobid_rows', 'cycle_rows'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connection = None
+        self._data_version = None
+        self._task_positions = None
+        self._task_in_cycle = None
+        self.jobid_rows = collections.defaultdict(set)
+        self.cycle_rows = collections.defaultdict(set)
+        for theid, row in self.rows.items():
+            self.jobid_rows[row[1]].add(theid)
+            self.cycle_rows[row[3]].add(theid)
+
+    def incremental(self, performance_metrics=False):
+        """
+        Whether the next update only reads the changes of the database
+        """
+        return not performance_metrics and self.polls % self.full_reload_polls != 0
+
+    def _read(self, query, params=()):
+        return [tuple('-' if x is None else x for x in row) for row in self._connection.execute(query, params)]
+
+    def update(self, tasks_ordered, cycledef_group_cycles, performance_metrics=False):
+        """
+        Read the changes of the database and return the status lines of each cycle
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database_file)
+        # both versions are taken before reading, a commit made while reading is read at the next update
+        data_version = self._connection.execute('PRAGMA data_version').fetchone()[0]
+        file_version = self._file_version()
+        layout = self._layout_of(tasks_ordered, cycledef_group_cycles)
+
+        full = not self.incremental(performance_metrics)
+        if self._data_version is not None:
+            unchanged = data_version == self._data_version
+        else:
+            # first update of a status read by another process
+            unchanged = self._file_version_read is not None and file_version == self._file_version_read
+        if not full and unchanged and layout == self._layout:
+            self._data_version = data_version
+            self.polls += 1
+            return self.stat()
+
+        table, columns = ('jobs_augment', f'{JOB_COLUMNS},{PERF_COLUMNS}') if performance_metrics else ('jobs', JOB_COLUMNS)
+        if full:
+            polls = self.polls
+            self.reload()
+            self.polls = polls
+            rows = self._read(f'SELECT {columns} FROM {table} ORDER BY id')
+        else:
+            rows = self._read(f'SELECT {columns} FROM {table} WHERE id > ? ORDER BY id', (self.last_job_id,))
+            active = [theid for theid, row in self.rows.items() if row[4] not in FINAL_JOB_STATES]
+            for ii in range(0, len(active), SQL_MAX_PARAMS):
+                chunk = active[ii:ii + SQL_MAX_PARAMS]
+                rows += self._read(f"SELECT {columns} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            (njobs,) = self._connection.execute(f'SELECT count(*) FROM {table}').fetchone()
+            if njobs != len(self.rows) + sum(1 for row in rows if row[0] > self.last_job_id):
+                # jobs were removed (rewind), read everything again
+                self.polls = 0
+                return self.update(tasks_ordered, cycledef_group_cycles, performance_metrics)
+
+        changed_cycles = set()
+        for (theid, cycle) in self._connection.execute('SELECT id, cycle FROM cycles WHERE id > ?', (self.last_cycle_id,)):
+            self.cycles.add(cycle)
+            changed_cycles.add(cycle)
+            self.last_cycle_id = max(self.last_cycle_id, theid)
+
+        changed_jobids = set()
+        for row in rows:
+            theid, jobid, cycle = row[0], row[1], row[3]
+            old = self.rows.get(theid)
+            if old == row:
+                continue
+            if old is not None:
+                self.jobid_rows[old[1]].discard(theid)
+                self.cycle_rows[old[3]].discard(theid)
+                changed_jobids.add(old[1])
+                changed_cycles.add(old[3])
+            self.rows[theid] = row
+            self.jobid_rows[jobid].add(theid)
+            self.cycle_rows[cycle].add(theid)
+            changed_jobids.add(jobid)
+            changed_cycles.add(cycle)
+            self.last_job_id = max(self.last_job_id, theid)
+        # only the first job of a job id is shown, the cycle of the other ones may change too
+        for jobid in changed_jobids:
+            changed_cycles.update(self.rows[theid][3] for theid in self.jobid_rows[jobid])
+
+        if layout != self._layout:
+            self._layout = layout
+            self._task_in_cycle = None
+            changed_cycles = set(self.cycles)
+        if self._task_in_cycle is None:
+            self._task_positions = dict()
+            for position, task in enumerate(tasks_ordered):
+                self._task_positions.setdefault(task[0], position)
+            self._task_in_cycle = cycledef_membership(cycledef_group_cycles)
+
+        for cycle in changed_cycles & self.cycles:
+            self.cycle_lines[cycle] = self._assemble(cycle, tasks_ordered, performance_metrics)
+
+        self._data_version = data_version
+        self._file_version_read = file_version
+        self.polls += 1
+        return self.stat()
+
+    def _assemble(self, cycle, tasks_ordered, performance_metrics):
+        rows = [self.rows[theid] for theid in sorted(self.cycle_rows.get(cycle, ()))]
+        # a job id is only shown once, the first time it was entered
+        rows = [row for row in rows if row[1] != '-' and min(self.jobid_rows[row[1]]) == row[0]]
+        # in the order of the tasks
+        rows.sort(key=lambda row: self._task_positions.get(row[2], 0))
+        lines_in_cycle = [job_line(row, performance_metrics) for row in rows] or ['place holder']
+        return assemble_cycle(cycle, lines_in_cycle, tasks_ordered, self._task_in_cycle)
+
+    def stat(self):
+        """
+        Status lines of each cycle with tasks, in the order of the cycles
+        """
+        return [self.cycle_lines[cycle] for cycle in sorted(self.cycles) if len(self.cycle_lines.get(cycle, [])) != 0]
+
+
 def get_rocoto_stat(params, queue_stat):
     workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles = params
 
@@ -1034,13 +1393,10 @@ def get_rocoto_stat(params, queue_stat):
     else:
         aug_perf = None
 
-    info = collections.defaultdict(list)
-    cycles = set()
-
-    connection = sqlite3.connect(database_file)
-    c = connection.cursor()
-
     if use_performance_metrics:
+        connection = sqlite3.connect(database_file)
+        c = connection.cursor()
+
         c.execute("DROP TABLE IF EXISTS jobs_augment_tmp;")
         sql_create_augment_table = "CREATE TABLE jobs_augment_tmp AS SELECT * FROM jobs;"
         c.execute(sql_create_augment_table)
@@ -1065,120 +1421,13 @@ def get_rocoto_stat(params, queue_stat):
         c.execute("DROP TABLE IF EXISTS jobs_augment;")
         c.execute("ALTER TABLE jobs_augment_tmp RENAME TO jobs_augment;")
 
-    cycledifitions = []
-    q = c.execute('SELECT id, groupname, cycledef FROM cycledef')
-    for row in q:
-        (theid, groupname, cycledef) = row
-        cycledifitions.append((theid, groupname, cycledef))
-
-    cycle_done_stat = dict()
-    q = c.execute('SELECT id,cycle,done FROM cycles')
-    for row in q:
-        (theid, cycle, done) = row
-        cycles.add(cycle)
-        cycle_done_stat[cycle] = done
-
-    if use_performance_metrics:
-        q = c.execute('SELECT id,jobid,taskname,cycle,state,exit_status,duration,tries,qtime,cputime,runtime,slots FROM jobs_augment')
-    else:
-        q = c.execute('SELECT id,jobid,taskname,cycle,state,exit_status,duration,tries FROM jobs')
-
-    q_get = []
-    entered_jobids = []
-    last_task_index = 0
-    for row in q:
-        row = tuple('-' if x is None else x for x in row)
-        if use_performance_metrics:
-            (theid, jobid, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
-        else:
-            (theid, jobid, taskname, cycle, state, exit_status, duration, tries, ) = row
-        if jobid in entered_jobids:
-            continue
-        else:
-            if taskname in tasks_ordered:
-                task_index = [x[0] for x in task_ordered].index(taskname)
-                last_task_index = task_index
-            else:
-                task_index = last_task_index
-
-            if use_performance_metrics:
-                q_get.append((theid, jobid, task_index, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots))
-            else:
-                q_get.append((theid, jobid, task_index, taskname, cycle, state, exit_status, duration, tries))
-        entered_jobids.append(jobid)
-
-    q_get.sort(key=lambda x: x[2])
-
-    connection.commit()
-    c.close()
-
-    for row in q_get:
-        if use_performance_metrics:
-            (theid, jobid, task_order, taskname, cycle, state, exit_status, duration, tries, qtime, cputime, runtime, slots) = row
-        else:
-            (theid, jobid, task_order, taskname, cycle, state, exit_status, duration, tries) = row
-        if jobid != '-':
-            if use_performance_metrics:
-                line = (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
-                        f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
-                        f"{str(tries)} {str(duration).split('.')[0]} {str(slots)} "
-                        f"{str(qtime)} {str(cputime).split('.')[0]} {str(runtime)}")
-            else:
-                line = (f"{datetime.fromtimestamp(cycle).strftime('%Y%m%d%H%M')} "
-                        f"{taskname} {str(jobid)} {str(state)} {str(exit_status)} "
-                        f"{str(tries)} {str(duration).split('.')[0]}")
-            info[cycle].append(line)
-
-    for every_cycle in cycles:
-        if len(info[every_cycle]) == 0:
-            info[every_cycle].append('place holder')
-
-    new_info = collections.defaultdict(list)
-    job_ids = []
-    job_id = ''
-    for each_cycle, lines_in_cycle in info.items():
-        for task in tasks_ordered:
-            skip_task = False
-            for each_line in lines_in_cycle:
-                if task[0] == each_line.split()[1]:
-                    job_id = each_line.split()[2]
-                    if job_id in job_ids:
-                        break
-                    cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
-                    cycledefs = task[1].split(',')
-                    if len(cycledefs) > 1:
-                        for each_cycledef in cycledefs:
-                            if cycle_string in cycledef_group_cycles[each_cycledef]:
-                                new_info[each_cycle].append(each_line)
-                                job_ids.append(job_id)
-                                skip_task = True
-                                break
-                    elif cycle_string in cycledef_group_cycles[task[1]]:
-                        new_info[each_cycle].append(each_line)
-                        job_ids.append(job_id)
-                        skip_task = True
-                        break
-            if skip_task:
-                continue
-            line = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M') + ' ' * 7 + task[0] + ' - - - - -'
-            cycle_string = datetime.fromtimestamp(each_cycle).strftime('%Y%m%d%H%M')
-            cycledefs = task[1].split(',')
-            if len(cycledefs) > 1:
-                for each_cycledef in cycledefs:
-                    if cycle_string in cycledef_group_cycles[each_cycledef]:
-                        new_info[each_cycle].append(line)
-                        skip_task = True
-                        break
-            elif cycle_string in cycledef_group_cycles[task[1]]:
-                new_info[each_cycle].append(line)
-                skip_task = True
-            if skip_task:
-                continue
+        connection.commit()
+        c.close()
 
-    rocoto_stat = []
-    for cycle in sorted(cycles):
-        if len(new_info[cycle]) != 0:
-            rocoto_stat.append(new_info[cycle])
+    global rocoto_status
+    if rocoto_status is None or rocoto_status.database_file != database_file:
+        rocoto_status = RocotoStatus(database_file)
+    rocoto_stat = rocoto_status.update(tasks_ordered, cycledef_group_cycles, use_performance_metrics)
 
     if save_checkfile_path is not None:
         stat_update_time = str(datetime.now()).rsplit(':', 1)[0]
@@ -1188,8 +1437,10 @@ def get_rocoto_stat(params, queue_stat):
         if only_check_point:
             sys.exit(0)
 
-    if use_multiprocessing:
-        queue_stat.put((rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles))
+    if use_multiprocessing and queue_stat is not None:
+        # the status is only worth sending back when the next updates can read the changes only
+        status = None if use_performance_metrics else rocoto_status
+        queue_stat.put((rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, status))
     else:
         return (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles)
 
@@ -1265,6 +1516,7 @@ def main(screen):
     global PSLOT
     global PACKAGE
     global entity_values
+    global rocoto_status
 
     event = 10
 
@@ -1382,7 +1634,7 @@ def main(screen):
 
     tasks_ordered = []
     metatask_list = collections.defaultdict(list)
-    cycledef_group_cycles = collections.defaultdict(list)
+    cycledef_group_cycles = collections.defaultdict(CycleDefGroup)
 
     queue_stat = Queue()
     queue_check = Queue()
@@ -1491,7 +1743,7 @@ def main(screen):
                     sys.exit(1)
 
             if len(rocoto_stat_params) != 0:
-                (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = rocoto_stat_params
+                (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, rocoto_status) = rocoto_stat_params
                 if use_multiprocessing:
                     process_get_rocoto_stat.join()
                     process_get_rocoto_stat.terminate()
@@ -2031,7 +2283,7 @@ def main(screen):
                 except Exception:
                     rocoto_stat_tmp = ''
                 if len(rocoto_stat_tmp) != 0:
-                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = rocoto_stat_tmp
+                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles, rocoto_status) = rocoto_stat_tmp
                     process_get_rocoto_stat.join()
                     process_get_rocoto_stat.terminate()
                     update_pad = True
@@ -2457,9 +2709,10 @@ def main(screen):
             diff = current_time - start_time
             if diff > stat_read_time_delay and not loading_stat:
                 start_time = current_time
-                if not use_multiprocessing:
+                # an update that only reads the changes of the database is quick enough to wait for
+                if not use_multiprocessing or (rocoto_status is not None and rocoto_status.incremental(use_performance_metrics)):
                     params = (workflow_file, database_file, tasks_ordered, metatask_list, cycledef_group_cycles)
-                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = get_rocoto_stat(params, Queue())
+                    (rocoto_stat, tasks_ordered, metatask_list, cycledef_group_cycles) = get_rocoto_stat(params, None)
                     stat_update_time = str(datetime.now()).rsplit(':', 1)[0]
                     header = header_string
                     header = header.replace('t' * 16, stat_update_time)
@@ -4,6 +4,7 @@ Entry point for setting up Rocoto XML for all applications in global-workflow
 """
 
 import os
+import time
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
 from applications.application_factory import app_config_factory
@@ -36,6 +37,15 @@ def input_args(*argv):
                         default=25, required=False)
     parser.add_argument('--verbosity', help='verbosity level of Rocoto', type=int,
                         default=10, required=False)
+    parser.add_argument('--profile', help='print the time spent in each phase of the setup',
+                        action='store_true', required=False)
+    parser.add_argument('--diff', help='print the differences with the existing $PSLOT.xml without writing it',
+                        action='store_true', required=False)
+    parser.add_argument('--update', help='only replace the tasks that changed in the existing $PSLOT.xml',
+                        action='store_true', required=False)
+    parser.add_argument('--tasks', help='only replace these top level tasks or metatasks (names or shell patterns, '
+                        'e.g. "gdas_atmos_prod" "gfs_*") in the existing $PSLOT.xml', nargs='+', type=str,
+                        default=None, required=False)
 
     return parser.parse_args(argv[0][0] if len(argv[0]) else None)
 
@@ -49,6 +59,43 @@ def check_expdir(cmd_expdir, cfg_expdir):
         raise ValueError('Abort!')
 
 
+def print_profile(timings, app_config):
+    """
+    Print the wall time of each setup phase and the time spent sourcing the configs of each RUN
+    """
+
+    print('Setup profile (wall time):')
+    for phase, seconds in timings.items():
+        print(f'  {phase:<50} {seconds:8.2f} s')
+        if phase == 'configure application':
+            for app_phase, app_seconds in app_config.timings.items():
+                print(f'    {app_phase:<48} {app_seconds:8.2f} s')
+
+    cache = app_config.config_cache
+    print(f'Configurations sourced: {cache.misses}, read from the cache: {cache.hits}')
+    if app_config.source_times:
+        print('Time sourcing configs (summed over the worker processes):')
+        for run, times in app_config.source_times.items():
+            slowest = ', '.join(f'{config} {seconds:.2f} s'
+                                for config, seconds in sorted(times.items(), key=lambda item: -item[1])[:5])
+            print(f'  {run:<10} {len(times):4d} configs {sum(times.values()):8.2f} s  slowest: {slowest}')
+
+
+def print_diff(changes, text):
+    """
+    Print the tasks and metatasks that differ from the existing XML, then the differences
+    """
+
+    if not any(changes.values()):
+        print('The workflow XML is up to date')
+        return
+
+    for change, names in changes.items():
+        if names:
+            print(f"{change}: {' '.join(names)}")
+    print(text, end='')
+
+
 def main(*argv):
 
     user_inputs = input_args(argv)
@@ -57,9 +104,13 @@ def main(*argv):
                          'taskthrottle': user_inputs.taskthrottle,
                          'verbosity': user_inputs.verbosity}
 
+    timings = dict()
+    start = time.perf_counter()
+
     cfg = Configuration(user_inputs.expdir)
 
     base = cfg.parse_config('config.base')
+    timings['source config.base'] = time.perf_counter() - start
 
     check_expdir(user_inputs.expdir, base['EXPDIR'])
 
@@ -67,11 +118,31 @@ def main(*argv):
     mode = base['MODE']
 
     # Configure the application
+    start = time.perf_counter()
     app_config = app_config_factory.create(f'{net}_{mode}', cfg)
+    timings['configure application'] = time.perf_counter() - start
 
     # Create Rocoto Tasks and Assemble them into an XML
+    start = time.perf_counter()
     xml = rocoto_xml_factory.create(f'{net}_{mode}', app_config, rocoto_param_dict)
-    xml.write()
+    timings['create tasks and XML'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for warning in xml.validate():
+        print(f'WARNING: {warning}')
+    timings['validate XML'] = time.perf_counter() - start
+
+    if user_inputs.diff:
+        print_diff(*xml.diff())
+        return
+
+    start = time.perf_counter()
+    if not xml.write(update=user_inputs.update, tasks=user_inputs.tasks):
+        print('The workflow XML is up to date')
+    timings['write XML and crontab'] = time.perf_counter() - start
+
+    if user_inputs.profile:
+        print_profile(timings, app_config)
 
 
 if __name__ == '__main__':
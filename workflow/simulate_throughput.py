@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Simulate a retrospective run of a Rocoto workflow to choose its cyclethrottle and taskthrottle
+"""
+
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from critical_path import find_xml
+from rocoto.workflow_dag import WorkflowDAG, job_samples_from_rocoto_db
+from rocoto.workflow_sim import ThroughputSimulator, TimingModel, recommend
+
+
+def input_args(*argv):
+    """
+    Method to collect user arguments for `simulate_throughput.py`
+    """
+
+    description = """
+        Replays the tasks of a Rocoto workflow XML through the cycles of its cycledefs,
+        honouring dependencies, cyclethrottle and taskthrottle, and prints the cycles per
+        wall-clock day, the queue occupancy and the idle gaps of the run.
+        Run times and queue waits are sampled from a Rocoto database (queue waits when
+        rocoto_viewer recorded them), or are the walltimes and an exponential queue wait.
+        With --sweep-cyclethrottle/--sweep-taskthrottle every pair of throttles is simulated
+        and the smallest throttles within 2%% of the best rate are recommended.
+        """
+
+    parser = ArgumentParser(description=description,
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('xml', help='workflow XML, or experiment directory containing $PSLOT.xml', type=str)
+    parser.add_argument('--db', help='Rocoto database to sample run times and queue waits from', type=str,
+                        default=None, required=False)
+    parser.add_argument('--ncycles', help='number of cycles to simulate, default is every cycle', type=int,
+                        default=None, required=False)
+    parser.add_argument('--cyclethrottle', help='maximum number of concurrent cycles, default is the XML value',
+                        type=int, default=None, required=False)
+    parser.add_argument('--taskthrottle', help='maximum number of concurrent tasks, default is the XML value',
+                        type=int, default=None, required=False)
+    parser.add_argument('--sweep-cyclethrottle', help='cyclethrottle values to sweep', type=int, nargs='+',
+                        default=None, required=False)
+    parser.add_argument('--sweep-taskthrottle', help='taskthrottle values to sweep', type=int, nargs='+',
+                        default=None, required=False)
+    parser.add_argument('--queue-wait', help='mean queue wait in minutes of the tasks without samples', type=float,
+                        default=0., required=False)
+    parser.add_argument('--spread', help='lognormal spread of the run time of the tasks without samples', type=float,
+                        default=0., required=False)
+    parser.add_argument('--walltime-fraction', help='fraction of the walltime the tasks without samples run for',
+                        type=float, default=1., required=False)
+    parser.add_argument('--poll', help='minutes between two rocotorun, 0 to submit as soon as tasks are ready',
+                        type=float, default=0., required=False)
+    parser.add_argument('--repeats', help='random draws averaged for each pair of throttles', type=int,
+                        default=1, required=False)
+    parser.add_argument('--seed', help='seed of the random draws', type=int, default=0, required=False)
+
+    return parser.parse_args(argv[0][0] if len(argv[0]) else None)
+
+
+def print_summary(summary):
+
+    print(f"cyclethrottle={summary['cyclethrottle']} taskthrottle={summary['taskthrottle']}: "
+          f"{summary['cycles']:.0f} cycles in {summary['makespan_h']:.2f} h")
+    print(f"  {summary['cycles_per_day']:.2f} cycles per day ({summary['steady_cycles_per_day']:.2f} after the first cycle)")
+    print(f"  jobs queued {summary['mean_queued']:.1f}, running {summary['mean_running']:.1f} on average, "
+          f"{summary['max_in_flight']:.0f} at most, at taskthrottle {100. * summary['at_taskthrottle']:.0f}% of the time")
+    print(f"  mean queue wait {summary['mean_queue_wait_min']:.1f} min, "
+          f"idle {summary['idle_h']:.2f} h (longest gap {summary['longest_gap_h']:.2f} h)")
+    if summary['stalled']:
+        print(f"  WARNING: {summary['stalled']:.0f} cycles never completed, some dependencies can never be satisfied")
+
+
+def main(*argv):
+
+    user_inputs = input_args(argv)
+    dag = WorkflowDAG.from_xml(find_xml(user_inputs.xml))
+    samples = job_samples_from_rocoto_db(user_inputs.db) if user_inputs.db is not None else None
+    timing = TimingModel(samples, queue_wait=user_inputs.queue_wait * 60., spread=user_inputs.spread,
+                         walltime_fraction=user_inputs.walltime_fraction)
+    simulator = ThroughputSimulator(dag, timing, ncycles=user_inputs.ncycles, poll=user_inputs.poll * 60.)
+
+    cyclethrottle = user_inputs.cyclethrottle or int(dag.attributes.get('cyclethrottle', 1))
+    taskthrottle = user_inputs.taskthrottle or int(dag.attributes.get('taskthrottle', len(dag.tasks)))
+    cyclethrottles = user_inputs.sweep_cyclethrottle or [cyclethrottle]
+    taskthrottles = user_inputs.sweep_taskthrottle or [taskthrottle]
+
+    summaries = simulator.sweep(cyclethrottles, taskthrottles, repeats=user_inputs.repeats, seed=user_inputs.seed)
+    for summary in summaries:
+        print_summary(summary)
+
+    if len(summaries) > 1:
+        best = recommend(summaries)
+        print(f"Recommended: --cyclethrottle {best['cyclethrottle']} --taskthrottle {best['taskthrottle']} "
+              f"({best['cycles_per_day']:.2f} cycles per day)")
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Size the walltimes of the tasks of an experiment from its job history
+"""
+
+import os
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from typing import Dict
+
+from wxflow import Configuration, save_as_yaml
+
+from critical_path import find_xml
+from rocoto.walltime_history import apply_walltimes, load_walltimes, propose_walltimes, read_job_logs, read_rocoto_jobs
+from rocoto.workflow_dag import WorkflowDAG, hms_to_seconds
+
+
+def input_args(*argv):
+    """
+    Method to collect user arguments for `size_walltimes.py`
+    """
+
+    description = """
+        Reads the jobs of the Rocoto database of an experiment and the elapsed times of its
+        job logs, and proposes for every task with enough history a walltime covering a
+        percentile of its run times plus a margin. Tasks whose jobs were killed at their
+        walltime more than once are flagged and never get a shorter walltime.
+        With --accept the proposals are saved in the WALLTIME_HISTORY file of config.base,
+        which setup_xml.py uses instead of the walltimes of config.resources; with
+        --update-xml they are also written into the existing workflow XML.
+        """
+
+    parser = ArgumentParser(description=description,
+                            formatter_class=ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('expdir', help='full path to experiment directory containing config files and $PSLOT.xml',
+                        type=str)
+    parser.add_argument('--db', help='Rocoto database of the experiment, default is the XML with a .db extension',
+                        type=str, default=None, required=False)
+    parser.add_argument('--percentile', help='percentile of the run times the walltime covers', type=float,
+                        default=99., required=False)
+    parser.add_argument('--margin', help='fraction of the percentile added to it', type=float,
+                        default=0.1, required=False)
+    parser.add_argument('--min-samples', help='fewest run times to propose a walltime', type=int,
+                        default=5, required=False)
+    parser.add_argument('--granularity', help='proposed walltimes are multiples of this number of minutes', type=int,
+                        default=5, required=False)
+    parser.add_argument('--no-logs', help='do not read the elapsed times of the job logs', action='store_true',
+                        required=False)
+    parser.add_argument('--accept', help='save the proposed walltimes in the WALLTIME_HISTORY file',
+                        action='store_true', required=False)
+    parser.add_argument('--update-xml', help='with --accept, also write the accepted walltimes into the workflow XML',
+                        action='store_true', required=False)
+
+    return parser.parse_args(argv[0][0] if len(argv[0]) else None)
+
+
+def template_walltimes(dag: WorkflowDAG, proposals: Dict[str, Dict]) -> Dict[str, str]:
+    """
+    Walltime of each task as named in the XML: the tasks of a metatask share a walltime, the
+    longest proposal of its tasks. It is only shortened if every task of the metatask has a
+    proposal, since the tasks without history may run longer.
+    """
+
+    members = dict()
+    for name, task in dag.tasks.items():
+        members.setdefault(task.template, []).append(name)
+
+    walltimes = dict()
+    for template, names in members.items():
+        proposed = [proposals[name]['proposed'] for name in names if name in proposals]
+        if not proposed:
+            continue
+        walltime = max(proposed, key=hms_to_seconds)
+        if len(proposed) == len(names) or \
+                hms_to_seconds(walltime) > hms_to_seconds(dag.tasks[names[0]].resources['walltime']):
+            walltimes[template] = walltime
+    return walltimes
+
+
+def main(*argv):
+
+    user_inputs = input_args(argv)
+    xml_file = find_xml(user_inputs.expdir)
+    with open(xml_file, 'r') as fh:
+        xml = fh.read()
+    dag = WorkflowDAG.from_string(xml)
+    walltimes = {name: task.resources['walltime'] for name, task in dag.tasks.items() if 'walltime' in task.resources}
+
+    db_file = user_inputs.db or f'{os.path.splitext(xml_file)[0]}.db'
+    history = read_rocoto_jobs(db_file)
+    if not user_inputs.no_logs and 'ROTDIR' in dag.entities:
+        history = read_job_logs(dag.entities['ROTDIR'], history, list(walltimes))
+
+    proposals = propose_walltimes(history, walltimes, percentile=user_inputs.percentile, margin=user_inputs.margin,
+                                  min_samples=user_inputs.min_samples, granularity=user_inputs.granularity * 60)
+
+    print(f"{'task':<40} {'jobs':>5} {'p' + format(user_inputs.percentile, 'g'):>9} {'current':>9} {'proposed':>9} {'retries':>7}")
+    saved = 0
+    for name, proposal in proposals.items():
+        saved += hms_to_seconds(proposal['current']) - hms_to_seconds(proposal['proposed'])
+        print(f"{name:<40} {proposal['samples']:>5} {proposal['percentile'] / 60.:8.1f}m "
+              f"{proposal['current']:>9} {proposal['proposed']:>9} {proposal['retries']:>7} {proposal['flag']}")
+    flagged = [name for name, proposal in proposals.items() if proposal['flag']]
+    if flagged:
+        print(f"WARNING: {len(flagged)} tasks repeatedly hit their walltime: {', '.join(flagged)}")
+    print(f"{len(proposals)} of {len(walltimes)} tasks have enough history, "
+          f"the sum of their walltimes changes by {-saved / 3600.:+.1f} h")
+
+    if user_inputs.accept:
+        base = Configuration(user_inputs.expdir).parse_config('config.base')
+        path = base.get('WALLTIME_HISTORY') or os.path.join(user_inputs.expdir, 'walltimes.yaml')
+        accepted = dict(load_walltimes(path))
+        accepted.update(template_walltimes(dag, proposals))
+        save_as_yaml(accepted, path)
+        print(f'Accepted walltimes saved in {path}')
+
+        if user_inputs.update_xml:
+            with open(xml_file, 'w') as fh:
+                fh.write(apply_walltimes(xml, accepted))
+            print(f'Walltimes updated in {xml_file}')
+
+
+if __name__ == '__main__':
+
+    main()